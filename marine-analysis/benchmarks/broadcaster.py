@@ -0,0 +1,132 @@
+"""
+Benchmarks SSE fan-out with simulated subscribers.
+
+    python benchmarks/broadcaster.py --subscribers 10000 --emails 1000 --events 50
+    python benchmarks/broadcaster.py --redis-url redis://localhost:6379/0
+
+Registers the subscribers on an EventBroadcaster, keeps a share of them
+stalled (they never read), broadcasts events to every email and reports the
+time spent inside broadcast(), delivery latency percentiles of the live
+subscribers and the memory held by the broadcaster (tracemalloc). With
+--redis-url the events are published by a second broadcaster instance, so
+the latency covers the cross-worker hop through Redis pub/sub.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.Settings requires a database URL; the broadcaster never touches it.
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://unused/unused")
+
+from broadcaster import EventBroadcaster  # noqa: E402
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[int(pct * (len(values) - 1))] if values else 0.0
+
+async def run(args) -> dict:
+    tracemalloc.start()
+    receiver = EventBroadcaster(maxsize=args.queue_size, policy=args.policy)
+    publisher = receiver
+    if args.redis_url:
+        publisher = EventBroadcaster(maxsize=args.queue_size, policy=args.policy)
+        await receiver.start(args.redis_url)
+        await publisher.start(args.redis_url)
+        await asyncio.sleep(0.5)
+
+    emails = [f"user{i}@example.com" for i in range(args.emails)]
+    baseline = tracemalloc.get_traced_memory()[0]
+    subscriptions = []
+    for i in range(args.subscribers):
+        subscriptions.append(await receiver.subscribe(emails[i % len(emails)]))
+    subscribed_bytes = tracemalloc.get_traced_memory()[0] - baseline
+
+    stalled_count = int(args.subscribers * args.stalled)
+    live = subscriptions[stalled_count:]
+    latencies = []
+    expected = args.events * len(live)
+
+    async def consume(subscription):
+        # Coalesced or dropped events are skipped, so stop at the last one.
+        while True:
+            message = await subscription.get(timeout=30.0)
+            if message is None:
+                return
+            event = json.loads(message)
+            latencies.append(time.perf_counter() - event["sent"])
+            if event["event"] == args.events - 1:
+                return
+
+    consumers = [asyncio.create_task(consume(s)) for s in live]
+    await asyncio.sleep(0)
+
+    broadcast_times = []
+    start = time.perf_counter()
+    for event in range(args.events):
+        for email in emails:
+            message = json.dumps({"event": event, "sent": time.perf_counter()})
+            t0 = time.perf_counter()
+            await publisher.broadcast(email, message, key="progress")
+            broadcast_times.append(time.perf_counter() - t0)
+            # Events come from separate requests; yield like a real handler would.
+            await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*consumers), timeout=60.0)
+    elapsed = time.perf_counter() - start
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stalled_pending = sum(s.qsize() for s in subscriptions[:stalled_count])
+    dropped = sum(s.dropped for s in subscriptions)
+
+    if args.redis_url:
+        await publisher.stop()
+        await receiver.stop()
+
+    return {
+        "subscribers": args.subscribers,
+        "emails": args.emails,
+        "events_per_email": args.events,
+        "stalled_subscribers": stalled_count,
+        "policy": args.policy,
+        "queue_size": args.queue_size,
+        "redis": bool(args.redis_url),
+        "deliveries": len(latencies),
+        "expected_deliveries": expected,
+        "deliveries_per_s": round(len(latencies) / elapsed, 1),
+        "broadcast_call_p50_us": round(statistics.median(broadcast_times) * 1e6, 1),
+        "broadcast_call_p99_us": round(percentile(broadcast_times, 0.99) * 1e6, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "bytes_per_subscriber": round(subscribed_bytes / args.subscribers),
+        "stalled_pending_messages": stalled_pending,
+        "dropped_messages": dropped,
+        "memory_current_mb": round((current - baseline) / 2**20, 2),
+        "memory_peak_mb": round((peak - baseline) / 2**20, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SSE broadcaster with simulated subscribers.")
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=50, help="Events broadcast to each email.")
+    parser.add_argument("--stalled", type=float, default=0.1, help="Share of subscribers that never read.")
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--policy", choices=["drop_oldest", "coalesce"], default="drop_oldest")
+    parser.add_argument("--redis-url", help="Fan out through Redis pub/sub between two broadcasters.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
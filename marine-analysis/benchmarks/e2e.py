@@ -0,0 +1,332 @@
+"""
+End-to-end benchmark of the fingerprinting and matching pipeline on a
+synthetic corpus.
+
+    python benchmarks/e2e.py --sources 12 --duration 20 --catalogue-sizes 1000 100000 1000000 \
+        --output results/e2e-$(git rev-parse --short HEAD).json
+    python benchmarks/e2e.py --compare results/e2e-old.json results/e2e-new.json
+
+1. Generates `--sources` original videos from ffmpeg lavfi sources (life,
+   cellauto, mandelbrot, testsrc2 with a sine tone) plus re-encoded, cropped,
+   trimmed and watermarked variants of each; generated files are cached in
+   --corpus-dir and reused by later runs with the same parameters.
+2. Runs extract_keyframes (per sampling strategy), compute_phashes and
+   extract_audio + generate_audio_fingerprint on every video and reports
+   per-stage latency percentiles and throughput.
+3. Builds a VectorIndex per catalogue size from the originals plus random
+   distractor vectors and queries it with the variants: single-query latency,
+   batched throughput, and precision/recall at the similarity threshold and
+   at top-1.
+
+Peak RSS covers this process and its ffmpeg children. Requires the ffmpeg
+binary and the service's Python dependencies.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.Settings requires a database URL; nothing here touches the database.
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://unused/unused")
+
+import numpy as np  # noqa: E402
+
+from config import settings  # noqa: E402
+
+SIZE = "640x360"
+RATE = 25
+
+VARIANTS = {
+    "reencode": ["-vf", "scale=480:-2", "-c:v", "libx264", "-crf", "35", "-c:a", "aac", "-b:a", "64k"],
+    "crop": ["-vf", "crop=iw*0.8:ih*0.8,scale=640:360", "-c:v", "libx264", "-crf", "23", "-c:a", "copy"],
+    "trim": ["-ss", "2", "-c:v", "libx264", "-crf", "23", "-c:a", "aac"],
+    "watermark": [
+        "-vf", "drawbox=x=iw-170:y=ih-70:w=150:h=50:color=white@0.7:t=fill",
+        "-c:v", "libx264", "-crf", "23", "-c:a", "copy",
+    ],
+}
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+def peak_rss_mb() -> dict:
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self_mb": round(self_kb / 1024, 1), "children_mb": round(children_kb / 1024, 1)}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# --- Corpus ---
+
+def source_filter(i: int) -> str:
+    kind = i % 4
+    if kind == 0:
+        return f"life=size={SIZE}:rate={RATE}:seed={i + 1}:ratio=0.{1 + i % 8}:mold=10"
+    if kind == 1:
+        return f"cellauto=size={SIZE}:rate={RATE}:seed={i + 1}:rule={(18 + i * 37) % 256}"
+    if kind == 2:
+        return f"mandelbrot=size={SIZE}:rate={RATE}:start_x={-0.743643887 + i * 0.01:.9f}:start_y=0.131825904"
+    return f"testsrc2=size={SIZE}:rate={RATE},rotate={0.3 * i:.2f}:fillcolor=black"
+
+def run_ffmpeg(args: list):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+def generate_corpus(corpus_dir: str, sources: int, duration: int) -> list:
+    """
+    Returns [{"path", "source", "variant"}], generating missing files.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    videos = []
+    for i in range(sources):
+        original = os.path.join(corpus_dir, f"src{i:03d}_d{duration}_original.mp4")
+        if not os.path.exists(original):
+            run_ffmpeg([
+                "-f", "lavfi", "-i", source_filter(i),
+                "-f", "lavfi", "-i", f"sine=frequency={220 + 45 * i}:sample_rate=44100",
+                "-t", str(duration), "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(2 * RATE),
+                "-c:a", "aac", "-shortest", original,
+            ])
+        videos.append({"path": original, "source": i, "variant": "original"})
+        for variant, options in VARIANTS.items():
+            path = os.path.join(corpus_dir, f"src{i:03d}_d{duration}_{variant}.mp4")
+            if not os.path.exists(path):
+                extra = ["-t", str(max(duration - 4, 1))] if variant == "trim" else []
+                run_ffmpeg(["-i", original, *options, *extra, path])
+            videos.append({"path": path, "source": i, "variant": variant})
+    return videos
+
+# --- Fingerprinting stages ---
+
+def bench_stages(videos: list, strategies: list, skip_audio: bool, frames_dir: str) -> tuple:
+    from fingerprint.video import extract_keyframes, compute_phashes
+    from main import average_hash_vector, sampling_options
+
+    stages = {}
+    vectors = {}
+    for strategy in strategies:
+        extract_times, phash_times, frame_counts = [], [], []
+        started = time.perf_counter()
+        for n, video in enumerate(videos):
+            pattern = os.path.join(frames_dir, f"{strategy}_{n}_%d.jpg")
+            t0 = time.perf_counter()
+            frames = extract_keyframes(video["path"], pattern, **sampling_options(strategy))
+            extract_times.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            phashes = compute_phashes(frames)
+            phash_times.append(time.perf_counter() - t0)
+            frame_counts.append(len(frames))
+            for frame in frames:
+                os.remove(frame)
+            vectors[(strategy, video["source"], video["variant"])] = average_hash_vector(phashes)
+        elapsed = time.perf_counter() - started
+        stages[strategy] = {
+            "extract_keyframes": percentiles(extract_times),
+            "compute_phashes": percentiles(phash_times),
+            "frames_per_video": round(statistics.fmean(frame_counts), 1),
+            "videos_per_s": round(len(videos) / elapsed, 3),
+            "frames_per_s": round(sum(frame_counts) / elapsed, 1),
+        }
+        print(f"[stages] {strategy}: {json.dumps(stages[strategy])}")
+
+    if not skip_audio:
+        from fingerprint.audio import extract_audio, generate_audio_fingerprint
+
+        extract_times, fingerprint_times = [], []
+        started = time.perf_counter()
+        for n, video in enumerate(videos):
+            wav = os.path.join(frames_dir, f"audio_{n}.wav")
+            t0 = time.perf_counter()
+            extract_audio(video["path"], wav)
+            extract_times.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            generate_audio_fingerprint(wav)
+            fingerprint_times.append(time.perf_counter() - t0)
+            os.remove(wav)
+        stages["audio"] = {
+            "extract_audio": percentiles(extract_times),
+            "generate_audio_fingerprint": percentiles(fingerprint_times),
+            "videos_per_s": round(len(videos) / (time.perf_counter() - started), 3),
+        }
+        print(f"[stages] audio: {json.dumps(stages['audio'])}")
+    return stages, vectors
+
+# --- Matching ---
+
+def distractor_vectors(count: int, seed: int = 0, frames: int = 8, block: int = 100_000) -> np.ndarray:
+    """
+    Random stand-ins for unrelated catalogue videos: the average of `frames`
+    random 64-bit pHash bit patterns, laid out like hex_to_float_vector.
+    """
+    rng = np.random.default_rng(seed)
+    out = np.zeros((count, 128), dtype=np.float32)
+    for start in range(0, count, block):
+        n = min(block, count - start)
+        bits = rng.integers(0, 2, size=(n, frames, 64), dtype=np.uint8).mean(axis=1, dtype=np.float32)
+        out[start:start + n, :64] = bits
+    return out
+
+def bench_matching(vectors: dict, strategy: str, sizes: list, threshold: float, query_sample: int) -> list:
+    from index import VectorIndex, normalize_rows
+
+    originals = sorted((key[1], vec) for key, vec in vectors.items() if key[0] == strategy and key[2] == "original")
+    queries = [(key[1], key[2], vec) for key, vec in vectors.items() if key[0] == strategy and key[2] != "original"]
+    query_matrix = np.array([vec for _, _, vec in queries], dtype=np.float32)
+    results = []
+    for size in sizes:
+        size = max(size, len(originals))
+        index = VectorIndex("benchmark", "label")
+        distractors = distractor_vectors(size - len(originals))
+        index.matrix = normalize_rows(np.vstack([np.array([vec for _, vec in originals]), distractors]))
+        index.ids = np.arange(1, size + 1, dtype=np.int64)
+        index.labels = [f"source:{src}" for src, _ in originals] + [f"distractor:{i}" for i in range(len(distractors))]
+        index.max_id = size
+        del distractors
+
+        latencies = []
+        for row in query_matrix[:query_sample]:
+            t0 = time.perf_counter()
+            index.search(row[None, :], threshold=threshold)
+            latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        hits = index.search(query_matrix, threshold=threshold)
+        batch_elapsed = time.perf_counter() - t0
+        top1 = index.search(query_matrix, top_k=1, threshold=-100.0)
+
+        true_positives = false_positives = top1_correct = 0
+        for (source, _, _), query_hits, best in zip(queries, hits, top1):
+            labels = {hit[1] for hit in query_hits}
+            expected = f"source:{source}"
+            true_positives += expected in labels
+            false_positives += len(labels - {expected})
+            top1_correct += bool(best) and best[0][1] == expected
+        result = {
+            "strategy": strategy,
+            "catalogue_size": size,
+            "queries": len(queries),
+            "threshold": threshold,
+            "single_query": percentiles(latencies),
+            "batch_queries_per_s": round(len(queries) / batch_elapsed, 1) if batch_elapsed else None,
+            "precision": round(true_positives / (true_positives + false_positives), 4)
+            if true_positives + false_positives else None,
+            "recall": round(true_positives / len(queries), 4) if queries else None,
+            "top1_accuracy": round(top1_correct / len(queries), 4) if queries else None,
+            "index_mb": round(index.matrix.nbytes / 2**20, 1),
+            "peak_rss": peak_rss_mb(),
+        }
+        print(f"[matching] {json.dumps(result)}")
+        results.append(result)
+        del index
+    return results
+
+# --- Comparison ---
+
+def flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict) and "catalogue_size" in item:
+                flatten(f"{prefix}[{item['strategy']}@{item['catalogue_size']}]", item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = {}
+        flatten("", {k: v for k, v in json.load(f).items() if k != "meta"}, old)
+    with open(new_path) as f:
+        new = {}
+        flatten("", {k: v for k, v in json.load(f).items() if k != "meta"}, new)
+    for key in sorted(old.keys() & new.keys()):
+        if old[key]:
+            change = (new[key] - old[key]) / abs(old[key]) * 100
+            print(f"{key:80s} {old[key]:>12} -> {new[key]:>12} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end fingerprint/matching benchmark.")
+    parser.add_argument("--sources", type=int, default=12, help="Original videos to generate.")
+    parser.add_argument("--duration", type=int, default=20, help="Seconds per original video.")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "marine-bench-corpus"))
+    parser.add_argument("--strategies", nargs="+", default=["fps", "keyframes"])
+    parser.add_argument("--catalogue-sizes", nargs="+", type=int, default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--threshold", type=float, default=settings.SIMILARITY_THRESHOLD,
+                        help="Similarity threshold in percent (defaults to SIMILARITY_THRESHOLD).")
+    parser.add_argument("--query-sample", type=int, default=200, help="Queries timed one at a time.")
+    parser.add_argument("--skip-audio", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg is required to generate the corpus")
+
+    started = time.perf_counter()
+    videos = generate_corpus(args.corpus_dir, args.sources, args.duration)
+    corpus_s = time.perf_counter() - started
+    print(f"[corpus] {len(videos)} videos in {args.corpus_dir} ({corpus_s:.1f}s)")
+
+    frames_dir = tempfile.mkdtemp(prefix="marine-bench-frames-")
+    try:
+        stages, vectors = bench_stages(videos, args.strategies, args.skip_audio, frames_dir)
+    finally:
+        shutil.rmtree(frames_dir, ignore_errors=True)
+
+    matching = []
+    for strategy in args.strategies:
+        matching.extend(bench_matching(vectors, strategy, args.catalogue_sizes, args.threshold, args.query_sample))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "corpus": {"videos": len(videos), "variants": list(VARIANTS), "generation_s": round(corpus_s, 1)},
+        "stages": stages,
+        "matching": matching,
+        "peak_rss": peak_rss_mb(),
+    }
+    print(json.dumps(report["peak_rss"]))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
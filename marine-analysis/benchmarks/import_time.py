@@ -0,0 +1,92 @@
+"""
+Measures how long `import main` takes using `python -X importtime`.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 1.5 --top 15 --output import.json
+
+Runs the import in a fresh interpreter a few times and reports the best
+cumulative time of `main` together with the slowest modules. Exits non-zero
+when the import goes over --budget seconds or pulls in any of the lazily
+loaded fingerprint dependencies (--forbid), so it can guard cold-start time
+in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("librosa", "imagehash", "PIL", "cv2", "ffmpeg", "scipy", "numba")
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Returns (module, self_us, cumulative_us) for every line of -X importtime output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(python: str) -> list:
+    env = dict(os.environ)
+    # Settings requires a database URL; importing does not connect.
+    env.setdefault("DATABASE_URL", "postgresql+asyncpg://unused/unused")
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"`import main` failed with exit code {result.returncode}")
+    return parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the analysis service.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to try; the best run is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list.")
+    parser.add_argument("--budget", type=float, default=None, help="Fail when importing main takes longer (s).")
+    parser.add_argument("--forbid", nargs="*", default=list(HEAVY_MODULES),
+                        help="Top-level packages that must not be imported by `import main`.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        rows = measure(sys.executable)
+        total = next(cumulative for name, _, cumulative in rows if name == "main")
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+
+    imported = {name.split(".")[0] for name, _, _ in rows}
+    forbidden = sorted(imported.intersection(args.forbid))
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)
+    packages = [row for row in slowest if "." not in row[0] and row[0] != "main"][:args.top]
+    result = {
+        "import_main_seconds": round(total / 1e6, 3),
+        "modules_imported": len(rows),
+        "slowest_packages": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+            for name, self_us, cumulative in packages
+        ],
+        "forbidden_imported": forbidden,
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if forbidden:
+        failures.append(f"heavy dependencies imported at startup: {', '.join(forbidden)}")
+    if args.budget is not None and total / 1e6 > args.budget:
+        failures.append(f"import took {total / 1e6:.2f}s, budget {args.budget:.2f}s")
+    if failures:
+        raise SystemExit("; ".join(failures))
+
+if __name__ == "__main__":
+    main()
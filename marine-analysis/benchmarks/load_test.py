@@ -0,0 +1,341 @@
+"""
+Load test for the analysis HTTP API with local stand-ins for its storage.
+
+    pip install fakeredis aiosqlite
+    python benchmarks/load_test.py --duration 30 --uploaders 8 --ingesters 8 --sse-clients 200
+    python benchmarks/load_test.py --fake-fingerprint --frame-cost-ms 20 --output load.json
+
+Runs main.app on an in-process uvicorn server (so SSE streams behave as in
+production) with:
+  - Postgres replaced by SQLite through aiosqlite (pgvector columns are stored
+    as text; init_db skips CREATE EXTENSION),
+  - Redis replaced by fakeredis (pHash storage, job state) and the SSE
+    broadcaster kept process-local,
+  - no Kafka: the analysis service does not produce or consume Kafka itself.
+With --fake-fingerprint, ffmpeg/librosa work is replaced by stand-ins that
+block their calling thread for a configurable time per frame, so the
+harness runs without ffmpeg and still shows which stages block the loop.
+
+Concurrent virtual users drive /match-video (sync or async_job), chunked
+ingestion (/upload-video-chunk with total_chunks=0 followed by /analyze, as
+the streaming crawler does) and long-lived /sse subscribers. The report
+gives requests/s, p50/p95/p99 latency and errors per endpoint, SSE events
+received, and the server's event-loop lag sampled every --lag-interval.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.sse_events = 0
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            endpoint: {
+                "requests_per_s": round(len(values) / elapsed, 2),
+                "errors": self.errors.get(endpoint, 0),
+                **percentiles(values),
+            }
+            for endpoint, values in sorted(self.latencies.items())
+        }
+
+# --- Stand-ins ---
+
+def configure_environment(work_dir: str):
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(work_dir, 'load.db')}"
+    os.environ["BROADCAST_REDIS"] = "false"
+    os.environ["AUTO_MIGRATE"] = "true"
+    os.environ["FRAMES_DIR"] = os.path.join(work_dir, "frames")
+    # main.py creates video_chunks/ and temp files relative to the cwd.
+    os.chdir(work_dir)
+
+def install_stand_ins(main, args):
+    import fakeredis
+    import storage.redis_utils as redis_utils
+    from db import engine, Base
+
+    redis_utils.redis_client = fakeredis.FakeRedis(decode_responses=True)
+
+    async def init_sqlite_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    main.init_db = init_sqlite_db
+
+    if not args.fake_fingerprint:
+        return
+
+    frame_cost = args.frame_cost_ms / 1000.0
+
+    def fake_extract_keyframes(video_path, output_pattern, **kwargs):
+        frames = []
+        for i in range(args.frames_per_video):
+            time.sleep(frame_cost)
+            path = output_pattern.replace("%d", str(i + 1))
+            open(path, "wb").close()
+            frames.append(path)
+        return frames
+
+    def fake_compute_phashes(frame_paths):
+        time.sleep(frame_cost * len(frame_paths) / 4)
+        return ["%016x" % random.getrandbits(64) for _ in frame_paths]
+
+    def fake_compute_descriptors(frame_paths):
+        phashes = fake_compute_phashes(frame_paths)
+        frame_hashes = {"phash": phashes, "dhash": ["%016x" % random.getrandbits(64) for _ in frame_paths]}
+        return phashes, {"frame_hashes": frame_hashes, "signature": [random.random() for _ in range(128)]}
+
+    def fake_extract_audio(video_path, output_audio="temp_audio.wav"):
+        time.sleep(frame_cost * 2)
+        open(output_audio, "wb").close()
+        return output_audio
+
+    def fake_audio_fingerprint(audio_file, n_mfcc=20):
+        time.sleep(frame_cost * 2)
+        return [random.random() for _ in range(n_mfcc)]
+
+    def fake_reassemble_video(video_id, total_chunks):
+        chunk_dir = os.path.join(main.CHUNKS_DIR, video_id)
+        output = os.path.join(chunk_dir, f"{video_id}_reassembled.mp4")
+        with open(output, "wb") as out:
+            for idx in range(total_chunks):
+                with open(os.path.join(chunk_dir, f"chunk_{idx}.mp4"), "rb") as f:
+                    shutil.copyfileobj(f, out)
+        return output
+
+    main.extract_keyframes = fake_extract_keyframes
+    main.compute_phashes = fake_compute_phashes
+    main.compute_descriptors = fake_compute_descriptors
+    main.extract_audio = fake_extract_audio
+    main.generate_audio_fingerprint = fake_audio_fingerprint
+    main.reassemble_video = fake_reassemble_video
+
+def sample_video(work_dir: str, fake: bool, size_kb: int) -> bytes:
+    if not fake and shutil.which("ffmpeg"):
+        path = os.path.join(work_dir, "sample.mp4")
+        subprocess.run([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc2=size=320x180:rate=25",
+            "-f", "lavfi", "-i", "sine=frequency=440",
+            "-t", "5", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path,
+        ], check=True)
+        with open(path, "rb") as f:
+            return f.read()
+    return os.urandom(size_kb * 1024)
+
+# --- Virtual users ---
+
+async def uploader(client, recorder, stop, video: bytes, user: int, async_job: bool):
+    n = 0
+    while not stop.is_set():
+        n += 1
+        data = {
+            "user_email": f"user{user % 50}@example.com",
+            "name": f"load test {user}-{n}",
+            "description": "load test",
+            "async_job": "true" if async_job else "false",
+        }
+        files = {"video_file": (f"load_{user}_{n}.mp4", video, "video/mp4")}
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post("/match-video", data=data, files=files)
+            ok = resp.status_code in (200, 202)
+        except Exception:
+            resp, ok = None, False
+        recorder.record("POST /match-video", time.perf_counter() - t0, ok)
+        if not (async_job and resp is not None and resp.status_code == 202):
+            continue
+        job_id = resp.json()["job_id"]
+        while not stop.is_set():
+            t1 = time.perf_counter()
+            try:
+                poll = await client.get(f"/jobs/{job_id}")
+                status = poll.json().get("status") if poll.status_code == 200 else None
+            except Exception:
+                poll, status = None, None
+            recorder.record("GET /jobs/{id}", time.perf_counter() - t1, status is not None)
+            if status in ("succeeded", "failed"):
+                recorder.record("match-video job (end to end)", time.perf_counter() - t0, status == "succeeded")
+                break
+            await asyncio.sleep(0.2)
+
+async def ingester(client, recorder, stop, video: bytes, user: int, chunks: int):
+    n = 0
+    while not stop.is_set():
+        n += 1
+        video_id = f"load_{user}_{n}_{random.getrandbits(32):08x}"
+        chunk_size = max(len(video) // chunks, 1)
+
+        async def send(idx):
+            payload = video[idx * chunk_size:(idx + 1) * chunk_size] or video[:chunk_size]
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(
+                    "/upload-video-chunk",
+                    data={"video_id": video_id, "chunk_index": idx, "total_chunks": 0},
+                    files={"video_chunk": (f"chunk_{idx}.mp4", payload, "video/mp4")},
+                )
+                ok = resp.status_code == 200
+            except Exception:
+                ok = False
+            recorder.record("POST /upload-video-chunk", time.perf_counter() - t0, ok)
+
+        await asyncio.gather(*(send(idx) for idx in range(chunks)))
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post("/analyze", data={"video_id": video_id, "total_chunks": chunks})
+            ok = resp.status_code == 200
+        except Exception:
+            ok = False
+        recorder.record("POST /analyze", time.perf_counter() - t0, ok)
+
+async def sse_client(base_url, recorder, stop, user: int, connect_latencies: list):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        t0 = time.perf_counter()
+        try:
+            async with client.stream("GET", "/sse", params={"user_email": f"user{user % 50}@example.com"}) as resp:
+                connect_latencies.append(time.perf_counter() - t0)
+                async for line in resp.aiter_lines():
+                    if line.startswith("data:"):
+                        recorder.sse_events += 1
+                    if stop.is_set():
+                        break
+        except Exception:
+            recorder.errors["GET /sse"] = recorder.errors.get("GET /sse", 0) + 1
+
+async def loop_lag_monitor(stop, interval: float, samples: list):
+    """
+    Runs inside the server's event loop: how late each wake-up is shows how
+    long the loop was blocked.
+    """
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(time.perf_counter() - t0 - interval, 0.0))
+
+# --- Driver ---
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+
+    work_dir = tempfile.mkdtemp(prefix="marine-load-")
+    configure_environment(work_dir)
+    import main
+
+    install_stand_ins(main, args)
+    os.makedirs(os.environ["FRAMES_DIR"], exist_ok=True)
+    video = sample_video(work_dir, args.fake_fingerprint, args.video_kb)
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    recorder = Recorder()
+    stop = asyncio.Event()
+    lag_samples, sse_connect = [], []
+    limits = httpx.Limits(max_connections=args.uploaders + args.ingesters * args.chunks + 10)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            tasks = [asyncio.create_task(loop_lag_monitor(stop, args.lag_interval, lag_samples))]
+            tasks += [asyncio.create_task(sse_client(base_url, recorder, stop, i, sse_connect))
+                      for i in range(args.sse_clients)]
+            tasks += [asyncio.create_task(uploader(client, recorder, stop, video, i, args.async_jobs))
+                      for i in range(args.uploaders)]
+            tasks += [asyncio.create_task(ingester(client, recorder, stop, video, i, args.chunks))
+                      for i in range(args.ingesters)]
+            started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            stop.set()
+            elapsed = time.perf_counter() - started
+            # Let in-flight requests finish; SSE streams only notice stop on their next line.
+            await asyncio.wait(tasks, timeout=args.timeout)
+            for task in tasks:
+                task.cancel()
+    finally:
+        server.should_exit = True
+        await server_task
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(len(v) for k, v in recorder.latencies.items() if k.startswith(("POST", "GET")))
+    return {
+        "args": vars(args),
+        "duration_s": round(elapsed, 1),
+        "requests_per_s": round(total / elapsed, 2),
+        "endpoints": recorder.report(elapsed),
+        "sse": {
+            "clients": args.sse_clients,
+            "connect": percentiles(sse_connect),
+            "events_received": recorder.sse_events,
+            "errors": recorder.errors.get("GET /sse", 0),
+        },
+        "event_loop_lag": percentiles(lag_samples),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis API with local storage stand-ins.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load.")
+    parser.add_argument("--uploaders", type=int, default=4, help="Concurrent /match-video users.")
+    parser.add_argument("--async-jobs", action="store_true", help="Use async_job=true and poll /jobs/{id}.")
+    parser.add_argument("--ingesters", type=int, default=4, help="Concurrent chunked-ingestion users.")
+    parser.add_argument("--chunks", type=int, default=6, help="Chunks per ingested video.")
+    parser.add_argument("--sse-clients", type=int, default=50)
+    parser.add_argument("--fake-fingerprint", action="store_true", help="Replace ffmpeg/librosa with stand-ins.")
+    parser.add_argument("--frame-cost-ms", type=float, default=10.0, help="Blocking time per fake frame.")
+    parser.add_argument("--frames-per-video", type=int, default=20)
+    parser.add_argument("--video-kb", type=int, default=512, help="Payload size when no ffmpeg sample is made.")
+    parser.add_argument("--lag-interval", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Accuracy vs memory of the compact hash-vector layouts in quantize.py.
+
+    python benchmarks/quantization.py --catalogue 100000 --queries 500
+    python benchmarks/quantization.py --catalogue 1000000 --threshold 90 --output quant.json
+
+Builds a synthetic catalogue of averaged pHash vectors exactly as
+average_hash_vector does (checked against main.average_hash_vector on a
+sample): every video has its own per-bit probabilities and `--frames` frames
+drawn from them. Queries are near-duplicates of catalogue videos (bit
+probabilities perturbed by --noise, fresh frames) plus unrelated videos.
+
+The float32 index is the reference (its scores are checked against
+main.cosine_similarity). For float16, int8 and the packed median-hash bits it
+reports bytes per row, score error, recall@k and top-1 agreement with the
+reference, agreement of the flag decision at --threshold, and single-query
+latency and batched throughput. For bits it also reports the recall of the
+reference top-k within the top `--prefilter` Hamming candidates, i.e. how well
+it works as a pre-filter in front of an exact rescoring.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.Settings requires a database URL; nothing here touches the database.
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://unused/unused")
+
+import numpy as np  # noqa: E402
+
+import quantize  # noqa: E402
+from index import VectorIndex, normalize_rows  # noqa: E402
+
+def frame_bits(probabilities: np.ndarray, frames: int, rng) -> np.ndarray:
+    """
+    videos x frames x 64 random bits drawn from per-video bit probabilities.
+    """
+    return rng.random((len(probabilities), frames, quantize.HASH_BITS)) < probabilities[:, None, :]
+
+def average_vectors(bits: np.ndarray) -> np.ndarray:
+    """
+    Vectorised average_hash_vector: normalise each frame's bit vector, average
+    over frames, normalise, pad to 128 dims.
+    """
+    frames = bits.astype(np.float32)
+    norms = np.linalg.norm(frames, axis=2, keepdims=True)
+    frames = np.divide(frames, norms, out=np.zeros_like(frames), where=norms > 0)
+    return normalize_rows(frames.mean(axis=1))
+
+def to_hex(bits: np.ndarray) -> str:
+    return np.packbits(bits).tobytes().hex()
+
+def build_catalogue(size: int, frames: int, alpha: float, rng, chunk: int = 20000):
+    probabilities = rng.beta(alpha, alpha, size=(size, quantize.HASH_BITS)).astype(np.float32)
+    vectors = np.empty((size, 128), dtype=np.float32)
+    for start in range(0, size, chunk):
+        vectors[start:start + chunk] = average_vectors(frame_bits(probabilities[start:start + chunk], frames, rng))
+    return probabilities, vectors
+
+def check_against_main(probabilities: np.ndarray, frames: int, rng) -> float:
+    """
+    Largest difference between average_vectors and main.average_hash_vector
+    over a few videos.
+    """
+    from main import average_hash_vector
+
+    bits = frame_bits(probabilities[:20], frames, rng)
+    ours = average_vectors(bits)
+    theirs = np.array([average_hash_vector([to_hex(frame) for frame in video]) for video in bits])
+    return float(np.abs(ours - theirs).max())
+
+def make_index(vectors: np.ndarray, storage: str) -> VectorIndex:
+    index = VectorIndex("crawled_videos", "video_url")
+    index.storage = storage
+    index.ids = np.arange(1, len(vectors) + 1, dtype=np.int64)
+    index.labels = [str(i) for i in index.ids]
+    index.matrix = quantize.encode(vectors, storage)
+    return index
+
+def topk(scores: np.ndarray, k: int) -> np.ndarray:
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+def score_all(queries: np.ndarray, rows: np.ndarray, mode: str, block: int = 64) -> np.ndarray:
+    scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+    for start in range(0, len(queries), block):
+        chunk = queries[start:start + block]
+        if mode == "bits":
+            scores[start:start + block] = quantize.hamming_scores(chunk, rows)
+        else:
+            scores[start:start + block] = quantize.cosine_scores(chunk, rows)
+    return scores
+
+def timing(run, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs memory of compact hash-vector layouts.")
+    parser.add_argument("--catalogue", type=int, default=100000, help="Catalogue videos.")
+    parser.add_argument("--queries", type=int, default=500, help="Near-duplicate queries (plus as many unrelated).")
+    parser.add_argument("--frames", type=int, default=30, help="Frames averaged per video.")
+    parser.add_argument("--alpha", type=float, default=0.3, help="Beta(alpha, alpha) per-bit probabilities.")
+    parser.add_argument("--noise", type=float, default=0.1, help="Std-dev of the bit-probability perturbation.")
+    parser.add_argument("--k", type=int, default=10, help="k for recall@k.")
+    parser.add_argument("--prefilter", type=int, default=200, help="Hamming candidates kept for the bits pre-filter.")
+    parser.add_argument("--threshold", type=float, default=90.0, help="Similarity %% at which a pair is flagged.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    started = time.perf_counter()
+    probabilities, catalogue = build_catalogue(args.catalogue, args.frames, args.alpha, rng)
+    print(f"Built {args.catalogue} catalogue vectors in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    max_diff = check_against_main(probabilities, args.frames, rng)
+
+    sources = rng.choice(args.catalogue, size=args.queries, replace=False)
+    perturbed = np.clip(probabilities[sources] + rng.normal(0, args.noise, (args.queries, quantize.HASH_BITS)), 0, 1)
+    unrelated = rng.beta(args.alpha, args.alpha, size=(args.queries, quantize.HASH_BITS))
+    queries = average_vectors(frame_bits(np.concatenate([perturbed, unrelated]).astype(np.float32), args.frames, rng))
+    duplicates = slice(0, args.queries)
+
+    reference_index = make_index(catalogue, "float32")
+    reference = score_all(queries, reference_index.matrix, "float32")
+    reference_top = topk(reference, args.k)
+    reference_flags = reference >= args.threshold
+
+    from main import cosine_similarity
+
+    sample = [(int(q), int(r)) for q, r in zip(rng.integers(0, len(queries), 50), rng.integers(0, args.catalogue, 50))]
+    cosine_error = max(abs(cosine_similarity(queries[q].tolist(), catalogue[r].tolist()) - reference[q, r]) for q, r in sample)
+
+    results = {
+        "args": vars(args),
+        "synthetic_vs_average_hash_vector_max_diff": max_diff,
+        "index_vs_cosine_similarity_max_diff": round(float(cosine_error), 6),
+        "reference_flagged_pairs": int(reference_flags.sum()),
+        "modes": {},
+    }
+    query_bits = quantize.signature_bits(queries)
+    for mode in ("float32", "float16", "int8", "bits"):
+        if mode == "bits":
+            rows = quantize.signature_bits(catalogue)
+            batch_queries = query_bits
+        else:
+            rows = quantize.encode(catalogue, mode)
+            batch_queries = queries
+        scores = score_all(batch_queries, rows, mode)
+        top = topk(scores, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(top, reference_top)])
+        entry = {
+            "bytes_per_row": int(rows.nbytes // len(rows)),
+            "index_mb": round(rows.nbytes / 2**20, 1),
+            "memory_vs_float32": round(reference_index.matrix.nbytes / rows.nbytes, 1),
+            f"recall_at_{args.k}": round(float(recall), 4),
+            "top1_agreement": round(float(np.mean(top[:, 0] == reference_top[:, 0])), 4),
+            "duplicate_source_top1": round(float(np.mean(top[duplicates, 0] == sources)), 4),
+            "single_query_ms": round(timing(lambda: score_all(batch_queries[:1], rows, mode), 5) * 1000, 2),
+            "batch_queries_per_s": round(len(batch_queries) / timing(lambda: score_all(batch_queries, rows, mode), 2), 1),
+        }
+        if mode == "bits":
+            candidates = topk(scores, min(args.prefilter, args.catalogue))
+            prefilter_recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(candidates, reference_top)])
+            entry[f"prefilter_recall_at_{args.k}_in_{args.prefilter}"] = round(float(prefilter_recall), 4)
+        else:
+            error = np.abs(scores - reference)
+            flags = scores >= args.threshold
+            entry.update({
+                "score_error_max": round(float(error.max()), 4),
+                "score_error_mean": round(float(error.mean()), 5),
+                "flag_decisions_changed": int((flags != reference_flags).sum()),
+            })
+        results["modes"][mode] = entry
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,174 @@
 import asyncio
-from typing import Dict, List
+import json
+import uuid
+from collections import deque
+from typing import Dict, Optional, Set
+
+from loguru import logger
+
+from config import settings
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+
+class Subscription:
+    """
+    Bounded mailbox of one SSE client. offer() never blocks: when the mailbox
+    is full the oldest pending message is dropped. With the coalesce policy a
+    message carrying a key replaces the pending message with the same key
+    (e.g. successive progress updates of one job) before anything is dropped.
+    """
+    def __init__(self, user_email: str, maxsize: int, policy: str = DROP_OLDEST):
+        self.user_email = user_email
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._pending: deque = deque()
+        self._by_key: Dict[str, list] = {}
+        self._ready = asyncio.Event()
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def offer(self, message: str, key: Optional[str] = None):
+        if self.policy == COALESCE and key is not None and key in self._by_key:
+            self._by_key[key][1] = message
+            return
+        if len(self._pending) >= self.maxsize:
+            old_key, _ = self._pending.popleft()
+            if old_key is not None:
+                self._by_key.pop(old_key, None)
+            self.dropped += 1
+        entry = [key, message]
+        self._pending.append(entry)
+        if self.policy == COALESCE and key is not None:
+            self._by_key[key] = entry
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Returns the next message, or None if none arrived within timeout.
+        """
+        while not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        entry = self._pending.popleft()
+        if entry[0] is not None and self._by_key.get(entry[0]) is entry:
+            del self._by_key[entry[0]]
+        return entry[1]
 
 class EventBroadcaster:
-    def __init__(self):
-        self.connections: Dict[str, List[asyncio.Queue]] = {}
-
-    async def subscribe(self, user_email: str) -> asyncio.Queue:
-        queue = asyncio.Queue()
-        if user_email in self.connections:
-            self.connections[user_email].append(queue)
-        else:
-            self.connections[user_email] = [queue]
-        return queue
-
-    async def unsubscribe(self, user_email: str, queue: asyncio.Queue):
-        if user_email in self.connections:
-            self.connections[user_email].remove(queue)
-            if not self.connections[user_email]:
-                del self.connections[user_email]
-
-    async def broadcast(self, user_email: str, message: str):
-        if user_email in self.connections:
-            for queue in self.connections[user_email]:
-                await queue.put(message)
+    """
+    Fans SSE events out to the subscribers of a user email. Local delivery is
+    synchronous and bounded per subscriber, so a stalled client can neither
+    block broadcast() nor grow memory past BROADCAST_QUEUE_SIZE messages.
+    When Redis pub/sub is enabled every event is also published on
+    BROADCAST_CHANNEL and delivered by the listener of every other worker/pod;
+    events a worker published itself are skipped by its own listener.
+    """
+    def __init__(self, maxsize: int = None, policy: str = None, redis_url: str = None, channel: str = None):
+        self.maxsize = maxsize or settings.BROADCAST_QUEUE_SIZE
+        self.policy = policy or settings.BROADCAST_POLICY
+        self.redis_url = redis_url
+        self.channel = channel or settings.BROADCAST_CHANNEL
+        self.origin = uuid.uuid4().hex
+        self.connections: Dict[str, Set[Subscription]] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None and not self._listener.done()
+
+    async def start(self, redis_url: str = None):
+        """
+        Connects to Redis and starts the pub/sub listener. Without a Redis URL
+        the broadcaster stays process-local.
+        """
+        self.redis_url = redis_url or self.redis_url
+        if not self.redis_url:
+            return
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Broadcaster listening on Redis channel '{self.channel}'")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def subscribe(self, user_email: str) -> Subscription:
+        subscription = Subscription(user_email, self.maxsize, self.policy)
+        self.connections.setdefault(user_email, set()).add(subscription)
+        return subscription
+
+    async def unsubscribe(self, user_email: str, subscription: Subscription):
+        subscribers = self.connections.get(user_email)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.connections[user_email]
+        if subscription.dropped:
+            logger.info(f"SSE subscriber of {user_email} dropped {subscription.dropped} events")
+
+    def deliver(self, user_email: str, message: str, key: Optional[str] = None) -> int:
+        """
+        Offers the message to this worker's subscribers of user_email and
+        returns how many there were.
+        """
+        subscribers = self.connections.get(user_email, ())
+        for subscription in subscribers:
+            subscription.offer(message, key)
+        return len(subscribers)
+
+    async def broadcast(self, user_email: str, message: str, key: Optional[str] = None):
+        self.deliver(user_email, message, key)
+        if self._redis is None:
+            return
+        payload = json.dumps({"origin": self.origin, "user_email": user_email, "message": message, "key": key})
+        try:
+            await self._redis.publish(self.channel, payload)
+        except Exception as e:
+            logger.warning(f"Failed to publish event for {user_email}: {e}")
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                backoff = 1.0
+                async for item in pubsub.listen():
+                    try:
+                        event = json.loads(item["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    if event.get("origin") == self.origin:
+                        continue
+                    self.deliver(event["user_email"], event["message"], event.get("key"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Broadcaster pub/sub connection lost: {e}; retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
 
 broadcaster = EventBroadcaster()
@@ -6,6 +6,72 @@ class Settings(BaseSettings):
     REFERENCE_REDIS_KEY: str = os.getenv("REFERENCE_REDIS_KEY", "ref_phashes")
     FRAMES_DIR: str = os.getenv("FRAMES_DIR", "frames_temp")
     SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+    # Frame sampling (see fingerprint/video.py for the recall trade-offs)
+    UPLOADED_SAMPLING_STRATEGY: str = os.getenv("UPLOADED_SAMPLING_STRATEGY", "fps")
+    CRAWLED_SAMPLING_STRATEGY: str = os.getenv("CRAWLED_SAMPLING_STRATEGY", "keyframes")
+    SAMPLING_FPS: int = int(os.getenv("SAMPLING_FPS", "1"))
+    SCENE_THRESHOLD: float = float(os.getenv("SCENE_THRESHOLD", "0.3"))
+    FRAME_BUDGET: int = int(os.getenv("FRAME_BUDGET", "120"))
+    # Progressive (early-exit) matching of crawled chunks; thresholds are in
+    # percent. Stop with a match when the best final score (verified when
+    # MATCH_VERIFY is on) is at or above PROGRESSIVE_MATCH_THRESHOLD, stop
+    # without one when the best unverified pre-filter score is below
+    # PROGRESSIVE_NO_MATCH_THRESHOLD, keep downloading in between. The
+    # no-match test uses the pre-filter score because a verified score is
+    # either 0 or at least VERIFY_THRESHOLD: against it any no-match threshold
+    # up to VERIFY_THRESHOLD would stop every stream that has not verified yet.
+    # Sessions live in Redis and expire PROGRESSIVE_SESSION_TTL seconds after
+    # their last chunk.
+    PROGRESSIVE_MIN_CHUNKS: int = int(os.getenv("PROGRESSIVE_MIN_CHUNKS", "6"))
+    PROGRESSIVE_MATCH_THRESHOLD: float = float(os.getenv("PROGRESSIVE_MATCH_THRESHOLD", "90"))
+    PROGRESSIVE_NO_MATCH_THRESHOLD: float = float(os.getenv("PROGRESSIVE_NO_MATCH_THRESHOLD", "60"))
+    PROGRESSIVE_SESSION_TTL: int = int(os.getenv("PROGRESSIVE_SESSION_TTL", "3600"))
+    # Complete chunk sets are processed once across workers: the first trigger
+    # (last chunk upload or /analyze) claims the video in Redis and its result
+    # is kept for CHUNK_ANALYSIS_TTL seconds for later /analyze calls.
+    CHUNK_ANALYSIS_TTL: int = int(os.getenv("CHUNK_ANALYSIS_TTL", "3600"))
+    # SSE fan-out: bounded per-subscriber queues ("drop_oldest" or
+    # "coalesce") and Redis pub/sub across workers when BROADCAST_REDIS is on.
+    BROADCAST_QUEUE_SIZE: int = int(os.getenv("BROADCAST_QUEUE_SIZE", "100"))
+    BROADCAST_POLICY: str = os.getenv("BROADCAST_POLICY", "drop_oldest")
+    BROADCAST_CHANNEL: str = os.getenv("BROADCAST_CHANNEL", "marine:sse-events")
+    BROADCAST_REDIS: bool = os.getenv("BROADCAST_REDIS", "true").lower() == "true"
+    # Asynchronous /match-video jobs (async_job=true)
+    MATCH_JOB_WORKERS: int = int(os.getenv("MATCH_JOB_WORKERS", "2"))
+    MATCH_JOB_QUEUE_SIZE: int = int(os.getenv("MATCH_JOB_QUEUE_SIZE", "50"))
+    MATCH_JOB_RETENTION: int = int(os.getenv("MATCH_JOB_RETENTION", "86400"))
+    # In-memory vector index used for matching and /match-batch
+    INDEX_FULL_REFRESH_SECONDS: int = int(os.getenv("INDEX_FULL_REFRESH_SECONDS", "300"))
+    # Index row layout: "float32" (exact), "float16" or "int8" (see quantize.py)
+    INDEX_STORAGE: str = os.getenv("INDEX_STORAGE", "float32")
+    INDEX_QUERY_BLOCK: int = int(os.getenv("INDEX_QUERY_BLOCK", "256"))
+    # Memory-mapped index snapshots for O(new rows) warm starts; empty disables them.
+    INDEX_SNAPSHOT_DIR: str = os.getenv("INDEX_SNAPSHOT_DIR", "index_snapshots")
+    INDEX_SNAPSHOT_INTERVAL: int = int(os.getenv("INDEX_SNAPSHOT_INTERVAL", "600"))
+    # Sharding: this node indexes rows with id % INDEX_SHARD_COUNT == INDEX_SHARD_ID
+    # and queries the other shards at INDEX_SHARD_PEERS (comma-separated base
+    # URLs); INDEX_LOCAL_SHARDS splits the local index across threads.
+    INDEX_SHARD_ID: int = int(os.getenv("INDEX_SHARD_ID", "0"))
+    INDEX_SHARD_COUNT: int = int(os.getenv("INDEX_SHARD_COUNT", "1"))
+    INDEX_SHARD_PEERS: str = os.getenv("INDEX_SHARD_PEERS", "")
+    INDEX_SHARD_TIMEOUT: float = float(os.getenv("INDEX_SHARD_TIMEOUT", "10"))
+    INDEX_LOCAL_SHARDS: int = int(os.getenv("INDEX_LOCAL_SHARDS", str(min(os.cpu_count() or 1, 4))))
+    # Two-stage matching (see verify.py): the index scan keeps VERIFY_CANDIDATES
+    # candidates (per tenant for uploaded videos), which are rescored per
+    # frame and by colour signature.
+    MATCH_VERIFY: bool = os.getenv("MATCH_VERIFY", "true").lower() == "true"
+    VERIFY_CANDIDATES: int = int(os.getenv("VERIFY_CANDIDATES", "50"))
+    VERIFY_THRESHOLD: float = float(os.getenv("VERIFY_THRESHOLD", "80"))
+    VERIFY_SIGNATURE_WEIGHT: float = float(os.getenv("VERIFY_SIGNATURE_WEIGHT", "0.2"))
+    MATCH_BATCH_MAX_ITEMS: int = int(os.getenv("MATCH_BATCH_MAX_ITEMS", "10000"))
+    # Event-loop lag probe and blocking-call watchdog (see loop_monitor.py)
+    LOOP_MONITOR: bool = os.getenv("LOOP_MONITOR", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_BLOCK_THRESHOLD: float = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))
+    LOOP_STACK_SAMPLE_RATE: float = float(os.getenv("LOOP_STACK_SAMPLE_RATE", "1.0"))
+    # Create the extension and tables at startup (in the background); otherwise
+    # run `python migrate.py` once per deployment.
+    AUTO_MIGRATE: bool = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
     KAFKA_BROKER: str = os.getenv("KAFKA_BROKER", "4.240.103.202:9092")
     KAFKA_TOPIC: str = os.getenv("KAFKA_TOPIC", "alerts")
     REDIS_HOST: str = os.getenv("REDIS_HOST", "4.240.103.202")
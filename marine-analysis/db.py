@@ -24,7 +24,10 @@ else:
     if DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# SQL statement logging is verbose and slow; enable it with SQL_ECHO=true.
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
 Base = declarative_base()
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
@@ -40,6 +43,8 @@ class Video(Base):
     fingerprint = Column(String)                          # Optional: MD5 or other fingerprint of the video file
     hash_vector = Column(Vector(128))                     # 128-dimensional vector representation of the video hash
     audio_spectrum = Column(Vector(128))                  # 128-dimensional vector representation of the audio spectrum
+    signature_vector = Column(Vector(128))                # Temporal colour signature (fingerprint/descriptor.py)
+    frame_hashes = Column(JSON)                           # Per-frame pHash/dHash/wHash lists used to verify matches
     created_at = Column(DateTime, server_default=func.now())  # Timestamp when the video was uploaded
 
 # Table: crawled_videos (Videos obtained from external sources)
@@ -53,6 +58,8 @@ class CrawledVideo(Base):
     video_metadata = Column(JSON)                         # Additional metadata as JSON (renamed from "metadata")
     hash_vector = Column(Vector(128))                     # 128-dimensional vector representation of the crawled video's hash
     audio_spectrum = Column(Vector(128))                  # 128-dimensional vector representation of the crawled video's audio spectrum
+    signature_vector = Column(Vector(128))                # Temporal colour signature (fingerprint/descriptor.py)
+    frame_hashes = Column(JSON)                           # Per-frame pHash/dHash/wHash lists used to verify matches
     crawled_at = Column(DateTime, server_default=func.now())  # Timestamp when the video was crawled
 
 # Table: analyzed_videos
@@ -96,8 +103,19 @@ class AnalyzedVideo(Base):
         ),
     )
 
+# Columns added after the tables were first created; create_all does not
+# alter existing tables.
+ADDED_COLUMNS = (
+    ("videos", "signature_vector", "vector(128)"),
+    ("videos", "frame_hashes", "json"),
+    ("crawled_videos", "signature_vector", "vector(128)"),
+    ("crawled_videos", "frame_hashes", "json"),
+)
+
 # Initialize the database by creating all tables.
 async def init_db():
     async with engine.begin() as conn:
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
         await conn.run_sync(Base.metadata.create_all)
+        for table, column, column_type in ADDED_COLUMNS:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type};"))
@@ -1,7 +1,11 @@
 import subprocess
-import librosa
 import numpy as np
 
+# librosa (and the numba/scipy stack behind it) takes seconds to import, so it
+# is loaded on first use; preload() does it ahead of time.
+def preload():
+    import librosa  # noqa: F401
+
 def extract_audio(video_path: str, output_audio: str = "temp_audio.wav") -> str:
     command = [
         "ffmpeg", "-y",
@@ -17,6 +21,8 @@ def extract_audio(video_path: str, output_audio: str = "temp_audio.wav") -> str:
         return None
 
 def generate_audio_fingerprint(audio_file: str, n_mfcc: int = 20) -> np.ndarray:
+    import librosa
+
     try:
         y, sr = librosa.load(audio_file, sr=None)
         mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+
+# Video descriptor computed alongside the pHashes from the same decoded frames
+# (see compute_descriptors in video.py):
+#
+#   dhash/whash  per-frame difference and Haar-wavelet hashes (64 bits each),
+#                kept with the pHashes for per-frame verification of candidates
+#   signature    a 128-d temporal colour signature: per frame a 16-bin luma
+#                histogram plus 8-bin Cb and Cr histograms (square-rooted, so
+#                cosine similarity is the Bhattacharyya coefficient), averaged
+#                over the whole video and over TEMPORAL_SEGMENTS - 1 equal
+#                stretches of it, concatenated and L2-normalised.
+#
+# The whole-video block survives trimming and re-cutting; the segment blocks
+# separate videos whose overall colour mix is similar but ordered differently.
+FRAME_HASH_KINDS = ("phash", "dhash", "whash")
+LUMA_BINS = 16
+CHROMA_BINS = 8
+FRAME_HISTOGRAM_DIMS = LUMA_BINS + 2 * CHROMA_BINS
+TEMPORAL_SEGMENTS = 4
+SIGNATURE_DIMS = FRAME_HISTOGRAM_DIMS * TEMPORAL_SEGMENTS
+
+def frame_number(path: str) -> int:
+    """
+    Position of a frame written by extract_keyframes (`..._<n>.jpg`).
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return int(stem.rsplit("_", 1)[-1])
+    except ValueError:
+        return 0
+
+def frame_histogram(ycbcr_histogram: list) -> np.ndarray:
+    """
+    Square-rooted luma/chroma histogram of one frame from the 3 x 256 counts
+    of PIL's Image.convert("YCbCr").histogram().
+    """
+    counts = np.asarray(ycbcr_histogram, dtype=np.float32).reshape(3, 256)
+    luma = counts[0].reshape(LUMA_BINS, -1).sum(axis=1)
+    chroma = counts[1:].reshape(2, CHROMA_BINS, -1).sum(axis=2)
+    pixels = max(float(counts[0].sum()), 1.0)
+    return np.sqrt(np.concatenate([luma, chroma.ravel()]) / pixels)
+
+def temporal_signature(frame_histograms: list) -> list:
+    """
+    128-d signature from the frame histograms in temporal order: the mean
+    over all frames followed by the means of TEMPORAL_SEGMENTS - 1 segments.
+    """
+    if not frame_histograms:
+        return np.zeros(SIGNATURE_DIMS).tolist()
+    frames = np.asarray(frame_histograms, dtype=np.float32)
+    overall = frames.mean(axis=0)
+    blocks = [overall]
+    for segment in np.array_split(frames, TEMPORAL_SEGMENTS - 1):
+        # Videos with fewer frames than segments repeat the overall mean.
+        blocks.append(segment.mean(axis=0) if len(segment) else overall)
+    signature = np.concatenate(blocks)
+    norm = np.linalg.norm(signature)
+    if norm > 0:
+        signature = signature / norm
+    return signature.tolist()
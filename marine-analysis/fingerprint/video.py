@@ -1,22 +1,96 @@
 import os
 import glob
-try:
-    import ffmpeg
-except Exception as e:
-    raise ImportError(
-        "Failed to import ffmpeg. Ensure that you have installed ffmpeg-python "
-    ) from e
-
-from PIL import Image
-import imagehash
 from .common import hamming_similarity
+from .descriptor import FRAME_HASH_KINDS, frame_histogram, frame_number, temporal_signature
+
+# ffmpeg-python, PIL and imagehash are imported on first use so that importing
+# the service (and answering health checks) does not wait for them; call
+# preload() to pay the cost up front in a background thread instead.
+def _ffmpeg():
+    try:
+        import ffmpeg
+    except Exception as e:
+        raise ImportError(
+            "Failed to import ffmpeg. Ensure that you have installed ffmpeg-python "
+        ) from e
+    return ffmpeg
+
+def preload():
+    _ffmpeg()
+    from PIL import Image  # noqa: F401
+    import imagehash  # noqa: F401
+
+# Frame sampling strategies for extract_keyframes.
+#
+#   fps       Decode every frame and keep `fps` frames per second. Densest
+#             sampling and the reference for match recall; decode cost grows
+#             linearly with duration.
+#   keyframes Decode only I-frames (-skip_frame nokey), capped at `fps` frames
+#             per second. Typical GOPs are 2-10 s, so this decodes ~50-250x
+#             fewer frames. The averaged hash barely moves because I-frames are
+#             still spread evenly over the video; recall drops only for very
+#             short clips with a single GOP, and re-encodes that move I-frames
+#             still land on the same scenes.
+#   scene     Decode every frame but keep only frames whose scene-change score
+#             exceeds `scene_threshold`. Decode cost is unchanged; hashing and
+#             storage shrink. Biased towards cuts, so a static re-upload with
+#             few cuts contributes few frames and recall suffers on low-motion
+#             content (talking heads, slideshows).
+#   budget    Decode only I-frames and keep at most `frame_budget` of them,
+#             spread evenly over the probed duration. Constant cost per video
+#             regardless of length; recall equals "keyframes" for videos shorter
+#             than frame_budget GOPs and degrades gracefully beyond that since
+#             the average converges long before hundreds of samples.
+SAMPLING_STRATEGIES = ("fps", "keyframes", "scene", "budget")
+
+def _probe_duration(video_path: str) -> float:
+    ffmpeg = _ffmpeg()
+    try:
+        return float(ffmpeg.probe(video_path)["format"]["duration"])
+    except Exception as e:
+        print(f"FFprobe error: {e}")
+        return 0.0
+
+def _min_interval_select(interval: float) -> str:
+    # Keep a frame only if at least `interval` seconds passed since the last kept
+    # one. Unlike the fps filter this never duplicates frames to fill gaps.
+    return f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.6f})'"
+
+def extract_keyframes(
+    video_path: str,
+    output_pattern: str,
+    fps: int = 1,
+    strategy: str = "fps",
+    scene_threshold: float = 0.3,
+    frame_budget: int = 120,
+) -> list:
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy '{strategy}', expected one of {SAMPLING_STRATEGIES}")
+    ffmpeg = _ffmpeg()
+
+    input_kwargs = {}
+    output_kwargs = {"format": "image2", "vcodec": "mjpeg"}
+    if strategy == "fps":
+        output_kwargs["vf"] = f"fps={fps}"
+    elif strategy == "keyframes":
+        input_kwargs["skip_frame"] = "nokey"
+        output_kwargs["vf"] = _min_interval_select(1.0 / fps)
+        output_kwargs["vsync"] = "vfr"
+    elif strategy == "scene":
+        output_kwargs["vf"] = f"select='gt(scene\\,{scene_threshold})'"
+        output_kwargs["vsync"] = "vfr"
+    elif strategy == "budget":
+        input_kwargs["skip_frame"] = "nokey"
+        duration = _probe_duration(video_path)
+        interval = duration / frame_budget if duration > 0 and frame_budget > 0 else 1.0 / fps
+        output_kwargs["vf"] = _min_interval_select(interval)
+        output_kwargs["vsync"] = "vfr"
 
-def extract_keyframes(video_path: str, output_pattern: str, fps: int = 1) -> list:
     try:
         (
             ffmpeg
-            .input(video_path)
-            .output(output_pattern, vf=f"fps={fps}", format="image2", vcodec="mjpeg")
+            .input(video_path, **input_kwargs)
+            .output(output_pattern, **output_kwargs)
             .overwrite_output()
             .run(quiet=True)
         )
@@ -28,6 +102,9 @@ def extract_keyframes(video_path: str, output_pattern: str, fps: int = 1) -> lis
     return frame_files
 
 def compute_phashes(frame_paths: list) -> list:
+    from PIL import Image
+    import imagehash
+
     hashes = []
     for frame in frame_paths:
         try:
@@ -38,10 +115,39 @@ def compute_phashes(frame_paths: list) -> list:
             print(f"Error processing frame {frame}: {e}")
     return [str(h) for h in hashes]
 
+def compute_descriptors(frame_paths: list) -> tuple:
+    """
+    pHashes plus the multi-signature descriptor of descriptor.py, computed
+    from one read of each extracted frame. Returns (phashes, descriptor) with
+    descriptor = {"frame_hashes": {"phash": [...], "dhash": [...], "whash":
+    [...]}, "signature": [128 floats]}.
+    """
+    from PIL import Image
+    import imagehash
+
+    frame_hashes = {kind: [] for kind in FRAME_HASH_KINDS}
+    histograms = []
+    for frame in sorted(frame_paths, key=frame_number):
+        try:
+            with Image.open(frame) as img:
+                img.load()
+                hashes = (imagehash.phash(img), imagehash.dhash(img), imagehash.whash(img))
+                histogram = frame_histogram(img.convert("YCbCr").histogram())
+        except Exception as e:
+            print(f"Error processing frame {frame}: {e}")
+            continue
+        for kind, value in zip(FRAME_HASH_KINDS, hashes):
+            frame_hashes[kind].append(str(value))
+        histograms.append(histogram)
+    descriptor = {"frame_hashes": frame_hashes, "signature": temporal_signature(histograms)}
+    return frame_hashes["phash"], descriptor
+
 def compute_video_similarity(uploaded_hashes: list, reference_hashes: list) -> float:
     if not uploaded_hashes or not reference_hashes:
         return 0.0
 
+    import imagehash
+
     similarities = []
     for u_hash in uploaded_hashes:
         u = imagehash.hex_to_hash(u_hash)
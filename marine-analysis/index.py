@@ -0,0 +1,530 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import text
+
+import quantize
+from config import settings
+from db import async_session
+
+DIM = 128
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Pads/truncates rows to DIM and L2-normalises them as float32; all-zero
+    rows stay zero and therefore score 0 against everything.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    if matrix.shape[1] != DIM:
+        fixed = np.zeros((matrix.shape[0], DIM), dtype=np.float32)
+        width = min(DIM, matrix.shape[1])
+        fixed[:, :width] = matrix[:, :width]
+        matrix = fixed
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def _as_array(value) -> np.ndarray:
+    # Raw SQL returns pgvector values as their text form, e.g. "[0.1,0.2,...]".
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+class IndexState(NamedTuple):
+    """
+    One consistent view of an index. Searches run in threads while refresh()
+    and upsert() change the index on the event loop, so a search reads
+    VectorIndex.state once and every change builds a new state and publishes
+    it with a single assignment. The only in-place write is upsert()
+    re-encoding an existing row, which never changes any shape.
+    """
+    ids: np.ndarray
+    labels: List[str]
+    owners: List[Optional[str]]
+    matrix: np.ndarray
+    tenant_rows: Dict[str, np.ndarray]
+
+class VectorIndex:
+    """
+    In-memory copy of one table's hash vectors as a normalised matrix, so a
+    whole batch of query vectors is scored with one matrix product.
+
+    refresh() appends rows with an id above the high-water mark, and reloads
+    the whole table every INDEX_FULL_REFRESH_SECONDS to pick up vectors that
+    other workers rewrote in place. Rows rewritten by this worker are applied
+    immediately through upsert().
+
+    Rows are kept in the INDEX_STORAGE layout ("float32", "float16" or "int8",
+    see quantize.py); compact layouts are decoded block-wise while scoring.
+
+    With a tenant_column (user_email for uploaded videos) every row also
+    records its owner, and the row positions of each owner are kept grouped
+    so search(tenants=[...]) only scores those owners' rows: its cost follows
+    the size of the selected catalogues, not the number of tenants.
+
+    With INDEX_SHARD_COUNT > 1 the index only holds rows with
+    id % INDEX_SHARD_COUNT == INDEX_SHARD_ID; see shards.py for querying the
+    other shards.
+
+    With INDEX_SNAPSHOT_DIR set, the first refresh() memory-maps the last
+    snapshot of the index and only fetches rows above its high-water mark, so
+    startup costs O(new rows) instead of a scan of the whole table. Snapshots
+    are rewritten every INDEX_SNAPSHOT_INTERVAL seconds when the index changed
+    and on shutdown.
+    """
+    def __init__(self, table: str, label_column: str, tenant_column: Optional[str] = None):
+        self.table = table
+        self.label_column = label_column
+        self.tenant_column = tenant_column
+        self.storage = settings.INDEX_STORAGE
+        if self.storage not in quantize.STORAGE_MODES:
+            raise ValueError(f"Unknown INDEX_STORAGE '{self.storage}', expected one of {quantize.STORAGE_MODES}")
+        self.state = IndexState(np.empty(0, dtype=np.int64), [], [], self._empty_matrix(), {})
+        self.max_id = 0
+        self.loaded_at = 0.0
+        self.shard_id = settings.INDEX_SHARD_ID
+        self.shard_count = max(settings.INDEX_SHARD_COUNT, 1)
+        # Bumped on every change; a snapshot records the version it saved.
+        self.version = 0
+        self.snapshot_version = 0
+        self.snapshot_saved_at = time.monotonic()
+        self._saving: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.state.ids)
+
+    # Read-only views of the current state; assigning one (as the benchmarks
+    # do to build an index by hand) publishes a new state.
+    @property
+    def ids(self) -> np.ndarray:
+        return self.state.ids
+
+    @ids.setter
+    def ids(self, value: np.ndarray):
+        self.state = self.state._replace(ids=value)
+
+    @property
+    def labels(self) -> List[str]:
+        return self.state.labels
+
+    @labels.setter
+    def labels(self, value: List[str]):
+        self.state = self.state._replace(labels=value)
+
+    @property
+    def owners(self) -> List[Optional[str]]:
+        return self.state.owners
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.state.matrix
+
+    @matrix.setter
+    def matrix(self, value: np.ndarray):
+        self.state = self.state._replace(matrix=value)
+
+    @property
+    def tenant_rows(self) -> Dict[str, np.ndarray]:
+        return self.state.tenant_rows
+
+    def _empty_matrix(self) -> np.ndarray:
+        return np.empty((0, quantize.width(self.storage)), dtype=quantize.dtype(self.storage))
+
+    @property
+    def nbytes(self) -> int:
+        state = self.state
+        return state.matrix.nbytes + state.ids.nbytes
+
+    @property
+    def tenants(self) -> int:
+        return len(self.tenant_rows)
+
+    def rows_for(self, tenants: Optional[List[str]] = None) -> int:
+        """
+        Rows a search restricted to `tenants` scores (all rows for None).
+        """
+        state = self.state
+        if tenants is None:
+            return len(state.ids)
+        tenant_rows = state.tenant_rows
+        return sum(len(tenant_rows[t]) for t in set(tenants) if t in tenant_rows)
+
+    @property
+    def shard(self) -> str:
+        return f"{self.shard_id}/{self.shard_count}"
+
+    def owns(self, row_id: int) -> bool:
+        return row_id % self.shard_count == self.shard_id
+
+    async def refresh(self):
+        async with self._lock:
+            if not self.loaded_at and settings.INDEX_SNAPSHOT_DIR:
+                await asyncio.to_thread(self.load_snapshot, settings.INDEX_SNAPSHOT_DIR)
+            full = time.monotonic() - self.loaded_at >= settings.INDEX_FULL_REFRESH_SECONDS
+            after = 0 if full else self.max_id
+            shard_filter = " AND id % :shard_count = :shard_id" if self.shard_count > 1 else ""
+            owner = f", {self.tenant_column}" if self.tenant_column else ""
+            async with async_session() as session:
+                result = await session.execute(
+                    text(
+                        f"SELECT id, {self.label_column}, hash_vector{owner} FROM {self.table} "
+                        f"WHERE id > :after AND hash_vector IS NOT NULL{shard_filter} ORDER BY id"
+                    ),
+                    {"after": after, "shard_count": self.shard_count, "shard_id": self.shard_id},
+                )
+                rows = result.fetchall()
+            if full:
+                self._load(rows)
+                self.loaded_at = time.monotonic()
+                logger.info(f"Loaded {len(rows)} vectors from {self.table} into the index")
+            elif rows:
+                self._append(rows)
+        if self._snapshot_due():
+            self._saving = asyncio.create_task(self._save_in_background(settings.INDEX_SNAPSHOT_DIR))
+
+    def _rows_to_arrays(self, rows):
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        labels = [row[1] for row in rows]
+        owners = [row[3] if self.tenant_column else None for row in rows]
+        if not rows:
+            return ids, labels, owners, self._empty_matrix()
+        matrix = normalize_rows(np.stack([_as_array(row[2]) for row in rows]))
+        if self.storage != "float32" and np.any(matrix[:, quantize.HASH_BITS:]):
+            logger.warning(f"{self.table} has vectors with non-zero dims above {quantize.HASH_BITS}; "
+                           f"INDEX_STORAGE={self.storage} ignores them")
+        return ids, labels, owners, quantize.encode(matrix, self.storage)
+
+    def _load(self, rows):
+        ids, labels, owners, matrix = self._rows_to_arrays(rows)
+        tenant_rows = _group_positions(owners) if self.tenant_column else {}
+        self.state = IndexState(ids, labels, owners, matrix, tenant_rows)
+        self.max_id = int(ids.max()) if len(ids) else 0
+        self.version += 1
+
+    def _append(self, rows):
+        ids, labels, owners, matrix = self._rows_to_arrays(rows)
+        state = self.state
+        tenant_rows = state.tenant_rows
+        if self.tenant_column:
+            tenant_rows = dict(tenant_rows)
+            for owner, positions in _group_positions(owners, offset=len(state.ids)).items():
+                previous = tenant_rows.get(owner)
+                tenant_rows[owner] = positions if previous is None else np.concatenate([previous, positions])
+        self.state = IndexState(
+            np.concatenate([state.ids, ids]),
+            state.labels + labels,
+            state.owners + owners,
+            np.concatenate([state.matrix, matrix]),
+            tenant_rows,
+        )
+        self.max_id = max(self.max_id, int(ids.max()))
+        self.version += 1
+
+    # --- Snapshots ---
+    #
+    # <dir>/<table>.json holds max_id, the labels and the names of the .npy
+    # files with the ids and the vector matrix. Each save writes new .npy files
+    # and then atomically replaces the JSON, so a reader always sees a matching
+    # set; the files of the previous snapshot are removed afterwards.
+
+    def _snapshot_due(self) -> bool:
+        if not settings.INDEX_SNAPSHOT_DIR or not self.loaded_at:
+            return False
+        if self._saving is not None and not self._saving.done():
+            return False
+        return (
+            self.version != self.snapshot_version
+            and time.monotonic() - self.snapshot_saved_at >= settings.INDEX_SNAPSHOT_INTERVAL
+        )
+
+    async def _save_in_background(self, directory: str):
+        try:
+            await asyncio.to_thread(self.save_snapshot, directory)
+        except Exception as e:
+            logger.warning(f"Failed to save {self.table} index snapshot: {e}")
+
+    @property
+    def snapshot_name(self) -> str:
+        return self.table if self.shard_count == 1 else f"{self.table}.shard{self.shard_id}of{self.shard_count}"
+
+    def load_snapshot(self, directory: str) -> bool:
+        meta_path = os.path.join(directory, f"{self.snapshot_name}.json")
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # Copy-on-write mapping: pages are read lazily from the file and
+            # upsert() can still patch rows in memory.
+            matrix = np.load(os.path.join(directory, meta["vectors"]), mmap_mode="c")
+            ids = np.load(os.path.join(directory, meta["ids"]))
+            labels = meta["labels"]
+            owners = meta.get("owners") if self.tenant_column else [None] * len(ids)
+            if owners is None:
+                raise ValueError(f"snapshot has no {self.tenant_column} column")
+            expected = (len(ids), quantize.width(self.storage))
+            if matrix.dtype != quantize.dtype(self.storage) or matrix.shape != expected \
+                    or len(labels) != len(ids) or len(owners) != len(ids):
+                raise ValueError(f"shape {matrix.shape}/{matrix.dtype} for {len(ids)} ids, {len(labels)} labels")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable index snapshot {meta_path}: {e}")
+            return False
+        tenant_rows = _group_positions(owners) if self.tenant_column else {}
+        self.state = IndexState(ids, labels, owners, matrix, tenant_rows)
+        self.max_id = int(meta["max_id"])
+        # The snapshot stands in for a full load; rows above max_id are
+        # fetched by the caller and the next full reload is due as usual.
+        self.loaded_at = time.monotonic()
+        self.version += 1
+        self.snapshot_version = self.version
+        self.snapshot_saved_at = time.monotonic()
+        logger.info(f"Loaded {len(ids)} vectors of {self.table} from snapshot (max id {self.max_id})")
+        return True
+
+    def save_snapshot(self, directory: str):
+        version = self.version
+        state, max_id = self.state, self.max_id
+        ids, labels, owners, matrix = state.ids, list(state.labels), list(state.owners), state.matrix
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, f"{self.snapshot_name}.json")
+        previous = None
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path) as f:
+                    previous = json.load(f)
+            except Exception:
+                previous = None
+        suffix = uuid.uuid4().hex[:12]
+        meta = {
+            "table": self.table,
+            "dim": DIM,
+            "max_id": max_id,
+            "rows": len(ids),
+            "saved_at": time.time(),
+            "shard": self.shard,
+            "storage": self.storage,
+            "ids": f"{self.snapshot_name}-{suffix}.ids.npy",
+            "vectors": f"{self.snapshot_name}-{suffix}.vectors.npy",
+            "labels": labels,
+        }
+        if self.tenant_column:
+            meta["owners"] = owners
+        np.save(os.path.join(directory, meta["ids"]), np.ascontiguousarray(ids, dtype=np.int64))
+        np.save(os.path.join(directory, meta["vectors"]), np.ascontiguousarray(matrix))
+        partial = f"{meta_path}.{suffix}.tmp"
+        with open(partial, "w") as f:
+            json.dump(meta, f)
+        os.replace(partial, meta_path)
+        if previous:
+            for key in ("ids", "vectors"):
+                if previous.get(key) and previous[key] != meta[key]:
+                    try:
+                        os.remove(os.path.join(directory, previous[key]))
+                    except OSError:
+                        pass
+        self.snapshot_version = version
+        self.snapshot_saved_at = time.monotonic()
+        logger.info(f"Saved snapshot of {len(ids)} vectors of {self.table} (max id {max_id})")
+
+    async def close(self):
+        """
+        Waits for a snapshot in progress and writes a final one if the index
+        changed since.
+        """
+        if self._saving is not None:
+            await asyncio.gather(self._saving, return_exceptions=True)
+        if settings.INDEX_SNAPSHOT_DIR and self.loaded_at and self.version != self.snapshot_version:
+            await asyncio.to_thread(self.save_snapshot, settings.INDEX_SNAPSHOT_DIR)
+
+    def upsert(self, row_id: int, label: str, vector: list, owner: Optional[str] = None):
+        if not self.owns(row_id):
+            return
+        vector = normalize_rows(vector)
+        state = self.state
+        position = np.flatnonzero(state.ids == row_id)
+        if len(position):
+            position = int(position[0])
+            state.matrix[position] = quantize.encode(vector, self.storage)[0]
+            changed_owner = self.tenant_column and state.owners[position] != owner
+            if state.labels[position] != label or changed_owner:
+                labels = list(state.labels)
+                labels[position] = label
+                state = state._replace(labels=labels)
+                if changed_owner:
+                    state = _move_row(state, position, owner)
+                self.state = state
+            self.version += 1
+        elif row_id > self.max_id:
+            # Rows below the high-water mark can only be missing if they had no
+            # vector yet; the next full reload picks those up.
+            self._append([(row_id, label, vector[0], owner)])
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: Optional[int] = None,
+        threshold: float = None,
+        tenants: Optional[List[str]] = None,
+        per_tenant: bool = False,
+    ) -> list:
+        """
+        Scores every query vector against the whole index in blocks of
+        INDEX_QUERY_BLOCK rows (one matrix x matrix product each). Returns,
+        per query, up to top_k (row_id, label, similarity %, owner) tuples at
+        or above threshold, best first (ties by row id); top_k=None returns all
+        of them. `tenants` restricts the search to rows of those owners; with
+        per_tenant, top_k applies to each owner's rows instead of to all rows.
+
+        Large indexes are split into INDEX_LOCAL_SHARDS contiguous row ranges
+        scored on a thread pool (numpy releases the GIL) and merged.
+        """
+        threshold = settings.SIMILARITY_THRESHOLD if threshold is None else threshold
+        queries = normalize_rows(queries)
+        # Searches may run in a thread while refresh() appends on the event
+        # loop; read the published state once for a consistent view.
+        ids, labels, owners, matrix, tenant_rows = self.state
+        groups = list(tenant_rows.values())
+        if tenants is not None:
+            selected = [tenant_rows[t] for t in dict.fromkeys(tenants) if t in tenant_rows]
+            positions = np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype=np.int64)
+            ids, matrix = ids[positions], matrix[positions]
+            labels = [labels[p] for p in positions]
+            owners = [owners[p] for p in positions]
+            groups = [np.searchsorted(positions, rows) for rows in selected]
+        if not len(ids):
+            return [[] for _ in range(len(queries))]
+        if len(owners) != len(ids):
+            owners = [None] * len(ids)
+        if per_tenant and top_k is not None and self.tenant_column:
+            return _score_groups(ids, labels, owners, matrix, groups, queries, top_k, threshold)
+        partitions = min(settings.INDEX_LOCAL_SHARDS, max(len(ids) // MIN_PARTITION_ROWS, 1))
+        if partitions <= 1:
+            return _score_rows(ids, labels, owners, matrix, 0, len(ids), queries, top_k, threshold)
+        bounds = np.linspace(0, len(ids), partitions + 1, dtype=np.int64)
+        futures = [
+            _partition_pool().submit(
+                _score_rows, ids, labels, owners, matrix, int(lo), int(hi), queries, top_k, threshold
+            )
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        return merge_hits([future.result() for future in futures], top_k)
+
+# Below this many rows per partition the thread hand-off costs more than it saves.
+MIN_PARTITION_ROWS = 20000
+_pool: Optional[ThreadPoolExecutor] = None
+
+def _partition_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.INDEX_LOCAL_SHARDS, thread_name_prefix="index-shard")
+    return _pool
+
+def _group_positions(owners: list, offset: int = 0) -> Dict[str, np.ndarray]:
+    groups: Dict[str, list] = {}
+    for position, owner in enumerate(owners, start=offset):
+        groups.setdefault(owner, []).append(position)
+    return {owner: np.array(positions, dtype=np.int64) for owner, positions in groups.items()}
+
+def _move_row(state: IndexState, position: int, new_owner: Optional[str]) -> IndexState:
+    """
+    State with the row at `position` moved to another owner.
+    """
+    old_owner = state.owners[position]
+    tenant_rows = dict(state.tenant_rows)
+    remaining = tenant_rows.get(old_owner, np.empty(0, dtype=np.int64))
+    remaining = remaining[remaining != position]
+    if len(remaining):
+        tenant_rows[old_owner] = remaining
+    else:
+        tenant_rows.pop(old_owner, None)
+    tenant_rows[new_owner] = np.sort(np.append(tenant_rows.get(new_owner, np.empty(0, dtype=np.int64)), position))
+    owners = list(state.owners)
+    owners[position] = new_owner
+    return state._replace(owners=owners, tenant_rows=tenant_rows)
+
+def _rounded(scores: np.ndarray) -> np.ndarray:
+    # Reported scores; hits are also sorted on these so that re-sorting
+    # merged hits (merge_hits) gives the same order.
+    return np.round(scores.astype(np.float64), 2)
+
+def _score_rows(ids, labels, owners, matrix, lo: int, hi: int, queries: np.ndarray, top_k, threshold) -> list:
+    results = [[] for _ in range(len(queries))]
+    block = settings.INDEX_QUERY_BLOCK
+    rows = matrix[lo:hi]
+    for start in range(0, len(queries), block):
+        scores = quantize.cosine_scores(queries[start:start + block], rows)
+        for offset, row_scores in enumerate(scores):
+            if top_k is not None and top_k < len(row_scores):
+                candidates = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            else:
+                candidates = np.arange(len(row_scores))
+            candidates = candidates[row_scores[candidates] >= threshold]
+            # Best first on the reported (rounded) score, ties by row id, so
+            # merged shard results come out in the same order.
+            rounded = _rounded(row_scores[candidates])
+            order = np.lexsort((ids[lo + candidates], -rounded))
+            results[start + offset] = [
+                (int(ids[lo + i]), labels[lo + i], float(score), owners[lo + i])
+                for i, score in zip(candidates[order], rounded[order])
+            ]
+    return results
+
+def _score_groups(ids, labels, owners, matrix, groups: list, queries: np.ndarray, top_k: int, threshold) -> list:
+    """
+    As _score_rows over all rows, but top_k applies within each group of row
+    positions (one group per tenant), so every tenant keeps its best hits.
+    """
+    results = [[] for _ in range(len(queries))]
+    block = settings.INDEX_QUERY_BLOCK
+    for start in range(0, len(queries), block):
+        scores = quantize.cosine_scores(queries[start:start + block], matrix)
+        for offset, row_scores in enumerate(scores):
+            picked = []
+            for positions in groups:
+                group_scores = row_scores[positions]
+                if top_k < len(positions):
+                    best = np.argpartition(-group_scores, top_k - 1)[:top_k]
+                    positions, group_scores = positions[best], group_scores[best]
+                picked.append(positions[group_scores >= threshold])
+            candidates = np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+            rounded = _rounded(row_scores[candidates])
+            order = np.lexsort((ids[candidates], -rounded))
+            results[start + offset] = [
+                (int(ids[i]), labels[i], float(score), owners[i])
+                for i, score in zip(candidates[order], rounded[order])
+            ]
+    return results
+
+def merge_hits(parts: list, top_k: Optional[int] = None, per_tenant: bool = False) -> list:
+    """
+    Merges per-query hit lists from several partitions or shards into one
+    list per query, best first, cut to top_k (per owner with per_tenant).
+    """
+    merged = []
+    for per_query in zip(*parts):
+        hits = sorted((hit for hits in per_query for hit in hits), key=lambda hit: (-hit[2], hit[0]))
+        if top_k is None:
+            merged.append(hits)
+        elif per_tenant:
+            kept: Dict[Optional[str], int] = {}
+            cut = []
+            for hit in hits:
+                if kept.get(hit[3], 0) < top_k:
+                    kept[hit[3]] = kept.get(hit[3], 0) + 1
+                    cut.append(hit)
+            merged.append(cut)
+        else:
+            merged.append(hits[:top_k])
+    return merged
+
+crawled_index = VectorIndex("crawled_videos", "video_url")
+uploaded_index = VectorIndex("videos", "filename", tenant_column="user_email")
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from broadcaster import broadcaster
+from config import settings
+from storage.redis_utils import store_job, get_job
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit when MATCH_JOB_QUEUE_SIZE jobs are already waiting."""
+
+class Job:
+    """
+    State of one asynchronous /match-video request. Every progress update is
+    pushed to the user's SSE stream (coalesced per job) and mirrored to Redis
+    so GET /jobs/{id} works on any worker.
+    """
+    def __init__(self, user_email: str, run: Callable[["Job"], Awaitable[dict]], cleanup: Callable[[], None] = None):
+        self.id = uuid.uuid4().hex
+        self.user_email = user_email
+        self.run = run
+        self.cleanup = cleanup
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress: dict = {}
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    async def report(self, stage: str = None, **progress):
+        """
+        Records progress (e.g. frames_hashed, candidates_scored, matches_found)
+        and publishes it.
+        """
+        if stage:
+            self.stage = stage
+        self.progress.update(progress)
+        self.updated_at = time.time()
+        await self.publish()
+
+    async def publish(self):
+        snapshot = self.to_dict()
+        event = {"type": "job", "user_email": self.user_email, **snapshot}
+        await broadcaster.broadcast(self.user_email, json.dumps(event), key=f"job:{self.id}")
+        try:
+            await asyncio.to_thread(store_job, self.id, snapshot, settings.MATCH_JOB_RETENTION)
+        except Exception as e:
+            logger.warning(f"Failed to store state of job {self.id}: {e}")
+
+class JobManager:
+    """
+    Bounded queue of match jobs drained by MATCH_JOB_WORKERS workers, so at
+    most that many videos are analysed concurrently per process.
+    """
+    def __init__(self, workers: int = None, queue_size: int = None):
+        self.workers = workers or settings.MATCH_JOB_WORKERS
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.MATCH_JOB_QUEUE_SIZE)
+        self.jobs: Dict[str, Job] = {}
+        self.running = 0
+        self._tasks: list = []
+
+    def start(self):
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Match job manager started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if job.cleanup:
+                job.cleanup()
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def workers_alive(self) -> int:
+        return sum(not task.done() for task in self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "queue_capacity": self.queue.maxsize,
+            "running": self.running,
+            "workers": self.workers,
+        }
+
+    async def submit(self, job: Job) -> Job:
+        self._prune()
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.queue_depth()} match jobs already queued")
+        self.jobs[job.id] = job
+        await job.publish()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        # The job may have been accepted by another worker process.
+        return await asyncio.to_thread(get_job, job_id)
+
+    def _prune(self):
+        cutoff = time.time() - settings.MATCH_JOB_RETENTION
+        for job_id in [j.id for j in self.jobs.values() if j.status in (SUCCEEDED, FAILED) and j.updated_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            self.running += 1
+            job.status = RUNNING
+            try:
+                await job.report("started")
+                job.result = await job.run(job)
+                job.status = SUCCEEDED
+                await job.report("done")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Match job {job.id} failed: {e}")
+                job.status = FAILED
+                job.error = str(e)
+                await job.report("failed")
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+                if job.cleanup:
+                    job.cleanup()
+
+job_manager = JobManager()
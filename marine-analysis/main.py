@@ -1,24 +1,54 @@
 import os
+import shutil
 import subprocess
 import glob
 import math
 import json
 import asyncio
+import time
+import uuid
 from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 
 import numpy as np
-from fastapi import FastAPI, UploadFile, File, Form, Query, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, Query, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from pydantic import BaseModel
 import uvicorn
 
-from fingerprint.video import extract_keyframes, compute_phashes
+from fingerprint import video as fingerprint_video, audio as fingerprint_audio
+from fingerprint.video import extract_keyframes, compute_phashes, compute_descriptors
 from fingerprint.audio import extract_audio, generate_audio_fingerprint
-from storage.redis_utils import get_phashes, store_phashes
+from storage.redis_utils import (
+    get_phashes,
+    store_phashes,
+    claim_analysis,
+    store_analysis,
+    get_analysis,
+    release_analysis,
+    ANALYSIS_IN_PROGRESS,
+)
 from config import settings
 from db import async_session, Video, CrawledVideo, AnalyzedVideo, init_db
 from sqlalchemy import select, text
 from loguru import logger
 from broadcaster import broadcaster
+from progressive import progressive_tracker, CONTINUE
+from jobs import Job, QueueFull, job_manager
+from index import crawled_index, uploaded_index
+import shards
+import verify
+from loop_monitor import loop_monitor
+from metrics import (
+    stage_timer,
+    observe_stage,
+    record_matches,
+    FRAMES_PROCESSED,
+    CANDIDATES_SCORED,
+    CANDIDATES_VERIFIED,
+    CACHE_LOOKUPS,
+)
 
 # === Helper Functions ===
 
@@ -142,6 +172,17 @@ def cosine_similarity(vec1: list, vec2: list) -> float:
 def compute_video_similarity(uploaded_vector: list, reference_vector: list) -> float:
     return cosine_similarity(uploaded_vector, reference_vector)
 
+def sampling_options(strategy: str) -> dict:
+    """
+    Keyword arguments for extract_keyframes for the given sampling strategy.
+    """
+    return {
+        "fps": settings.SAMPLING_FPS,
+        "strategy": strategy,
+        "scene_threshold": settings.SCENE_THRESHOLD,
+        "frame_budget": settings.FRAME_BUDGET,
+    }
+
 def cleanup_files(file_list: list):
     for file_path in file_list:
         try:
@@ -149,83 +190,223 @@ def cleanup_files(file_list: list):
         except Exception as e:
             logger.warning(f"Failed to remove file {file_path}: {e}")
 
+async def _retry(step: str, action, state: dict):
+    delay = 1.0
+    while True:
+        try:
+            result = await action()
+            state["errors"].pop(step, None)
+            return result
+        except Exception as e:
+            state["errors"][step] = str(e)
+            logger.warning(f"Warm-up step '{step}' failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+async def check_database():
+    async with async_session() as session:
+        await session.execute(text("SELECT 1"))
+
+async def warm_up(state: dict):
+    """
+    Startup work deferred until after the server accepts connections, so
+    /healthz and /sse answer at once; /readyz reports ready once every step
+    in `state` is done. Schema creation only runs here with AUTO_MIGRATE,
+    otherwise it is left to `python migrate.py`.
+    """
+    async def fingerprint_backends():
+        try:
+            with stage_timer("startup", "fingerprint_import"):
+                await asyncio.to_thread(fingerprint_video.preload)
+                await asyncio.to_thread(fingerprint_audio.preload)
+            state["fingerprint_backends"] = True
+        except ImportError as e:
+            state["errors"]["fingerprint_backends"] = str(e)
+            logger.error(f"Fingerprint backends unavailable: {e}")
+
+    async def database_and_indexes():
+        await _retry("database", init_db if settings.AUTO_MIGRATE else check_database, state)
+        state["database"] = True
+        for name, index in (("crawled_index", crawled_index), ("uploaded_index", uploaded_index)):
+            with stage_timer("startup", name):
+                await _retry(name, index.refresh, state)
+            state[name] = True
+
+    await asyncio.gather(fingerprint_backends(), database_and_indexes())
+    logger.info("Warm-up complete.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up application...")
-    await init_db()
+    if settings.LOOP_MONITOR:
+        loop_monitor.start()
     if not os.path.exists(settings.FRAMES_DIR):
         os.makedirs(settings.FRAMES_DIR)
         logger.info(f"Created frames directory: {settings.FRAMES_DIR}")
+    if settings.BROADCAST_REDIS:
+        await broadcaster.start(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}")
+    job_manager.start()
+    app.state.started_at = time.time()
+    app.state.warmup = {
+        "database": False,
+        "crawled_index": False,
+        "uploaded_index": False,
+        "fingerprint_backends": False,
+        "errors": {},
+    }
+    warmup_task = asyncio.create_task(warm_up(app.state.warmup))
     yield
     logger.info("Shutting down application...")
+    warmup_task.cancel()
+    try:
+        await warmup_task
+    except asyncio.CancelledError:
+        pass
+    await job_manager.stop()
+    # Let videos whose chunks are complete finish before the clients close.
+    await asyncio.gather(*processing_tasks.values(), return_exceptions=True)
+    for index in (crawled_index, uploaded_index):
+        try:
+            await index.close()
+        except Exception as e:
+            logger.warning(f"Failed to save {index.table} index snapshot: {e}")
+    await shards.close_http_client()
+    await broadcaster.stop()
+    await loop_monitor.stop()
     logger.info("Shutdown complete.")
 
 # === FastAPI App ===
 app = FastAPI(lifespan=lifespan, title="Video AI Microservice")
 
+# --- Metrics Endpoint ---
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage timings, frame/candidate/match counters and
+    job and SSE queue gauges of this worker.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/debug/loop")
+async def debug_loop():
+    """
+    Event-loop lag and the most recent blocking events, with the stack of the
+    loop thread captured while it was blocked.
+    """
+    return loop_monitor.snapshot()
+
+# --- Health Endpoints ---
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process is up and its event loop answers.
+    """
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - getattr(app.state, "started_at", time.time()), 1),
+        "event_loop_lag_ms": round(loop_monitor.last_lag * 1000, 2),
+    }
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: the database answers, both match indexes are loaded, the
+    fingerprint backends are imported and the match job workers are running.
+    """
+    warmup = getattr(app.state, "warmup", {"errors": {}})
+    checks = {name: done for name, done in warmup.items() if name != "errors"}
+    checks["match_workers"] = job_manager.workers_alive() == job_manager.workers
+    if settings.BROADCAST_REDIS:
+        checks["broadcaster"] = broadcaster.listening
+    ready = bool(checks) and all(checks.values())
+    content = {
+        "status": "ready" if ready else "warming_up",
+        "checks": checks,
+        "indexed": {"crawled": len(crawled_index), "uploaded": len(uploaded_index)},
+        "errors": warmup["errors"],
+    }
+    return JSONResponse(content=content, status_code=200 if ready else 503)
+
 # --- SSE Endpoint ---
 @app.get("/sse")
 async def sse(request: Request, user_email: str = Query(...)):
-    async def event_generator(queue: asyncio.Queue):
+    async def event_generator(subscription):
         try:
             while True:
                 if await request.is_disconnected():
                     break
-                try:
-                    message = await asyncio.wait_for(queue.get(), timeout=15.0)
-                    yield f"data: {message}\n\n"
-                except asyncio.TimeoutError:
+                message = await subscription.get(timeout=15.0)
+                if message is None:
                     yield ": keep-alive\n\n"
+                else:
+                    yield f"data: {message}\n\n"
         finally:
-            await broadcaster.unsubscribe(user_email, queue)
-    queue = await broadcaster.subscribe(user_email)
-    return StreamingResponse(event_generator(queue), media_type="text/event-stream")
+            await broadcaster.unsubscribe(user_email, subscription)
+    subscription = await broadcaster.subscribe(user_email)
+    return StreamingResponse(event_generator(subscription), media_type="text/event-stream")
 
 # --- /match-video Endpoint for User-Uploaded Videos ---
-@app.post("/match-video")
-async def match_video(
-    video_file: UploadFile = File(...),
-    user_email: str = Form(...),
-    name: str = Form(...),
-    description: str = Form(...)
-):
-    filename = video_file.filename
-    custom_video_id = f"full_{filename}"
-    temp_path = f"temp_{filename}"
-    with open(temp_path, "wb") as f:
-        f.write(await video_file.read())
+async def _no_progress(stage: str = None, **progress):
+    pass
 
-    pattern = os.path.join(settings.FRAMES_DIR, f"uploaded_{filename}_%d.jpg")
+async def match_uploaded_video(
+    temp_path: str,
+    filename: str,
+    user_email: str,
+    name: str,
+    description: str,
+    work_id: str = "",
+    report=_no_progress,
+) -> dict:
+    """
+    Extract, hash and match an uploaded video and persist the results.
+    Blocking fingerprinting runs in threads; `report` receives progress
+    updates (frames_hashed, candidates_scored, matches_found).
+    """
+    custom_video_id = f"full_{filename}"
+    pattern = os.path.join(settings.FRAMES_DIR, f"uploaded_{work_id}{filename}_%d.jpg")
     frames = None
     try:
         # Extract keyframes from the uploaded video
-        frames = extract_keyframes(temp_path, pattern, fps=1)
-        if not frames:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Failed to extract keyframes from uploaded video."}
+        await report("extracting")
+        with stage_timer("upload", "frame_extraction"):
+            frames = await asyncio.to_thread(
+                extract_keyframes, temp_path, pattern, **sampling_options(settings.UPLOADED_SAMPLING_STRATEGY)
             )
-        # Compute perceptual hashes for the extracted frames
-        phash_hex_list = compute_phashes(frames)
+        if not frames:
+            raise ValueError("Failed to extract keyframes from uploaded video.")
+        # Compute perceptual hashes and the verification descriptor for the extracted frames
+        with stage_timer("upload", "phash"):
+            phash_hex_list, descriptor = await asyncio.to_thread(compute_descriptors, frames)
+        FRAMES_PROCESSED.labels("upload").inc(len(phash_hex_list))
         avg_vector = average_hash_vector(phash_hex_list)
+        await report("hashed", frames_hashed=len(phash_hex_list))
 
         # Extract audio fingerprint
-        audio_file = "temp_audio.wav"
+        audio_file = f"temp_audio_{work_id}.wav"
         try:
-            extracted_audio = extract_audio(temp_path, audio_file)
-            audio_fp = generate_audio_fingerprint(extracted_audio) if extracted_audio else None
+            with stage_timer("upload", "audio_fingerprint"):
+                extracted_audio = await asyncio.to_thread(extract_audio, temp_path, audio_file)
+                audio_fp = await asyncio.to_thread(generate_audio_fingerprint, extracted_audio) if extracted_audio else None
             if audio_fp:
                 audio_fp = parse_db_vector(audio_fp)  # Ensure 128 dimensions
         except Exception as e:
             logger.error(f"Error extracting audio: {e}")
             audio_fp = None
+        finally:
+            if os.path.exists(audio_file):
+                cleanup_files([audio_file])
 
         # Match against crawled videos
-        match_results = await match_against_crawled(avg_vector, custom_video_id)
+        await report("matching")
+        match_results = await match_against_crawled(avg_vector, custom_video_id, report=report, descriptor=descriptor)
+        record_matches("upload", match_results)
         flagged = True if match_results else False
         aggregate_score = max((match["similarity"] for match in match_results), default=0.0)
+        await report("persisting", matches_found=len(match_results))
 
         # Save the uploaded video record
+        persist_started = time.perf_counter()
         async with async_session() as session:
             stmt = select(Video).where(Video.filename == custom_video_id)
             result = await session.execute(stmt)
@@ -234,6 +415,8 @@ async def match_video(
             if existing:
                 existing.hash_vector = avg_vector
                 existing.audio_spectrum = audio_fp
+                existing.signature_vector = descriptor["signature"]
+                existing.frame_hashes = descriptor["frame_hashes"]
                 existing.fingerprint = custom_video_id
                 existing.user_email = user_email
                 existing.title = name
@@ -248,7 +431,9 @@ async def match_video(
                     description=description,
                     fingerprint=custom_video_id,
                     hash_vector=avg_vector,
-                    audio_spectrum=audio_fp
+                    audio_spectrum=audio_fp,
+                    signature_vector=descriptor["signature"],
+                    frame_hashes=descriptor["frame_hashes"]
                 )
                 session.add(new_record)
                 await session.commit()
@@ -280,8 +465,13 @@ async def match_video(
                 session.add(comparison)
             
             await session.commit()
+        observe_stage("upload", "db_persist", persist_started)
+        uploaded_index.upsert(video_record.id, custom_video_id, avg_vector, owner=user_email)
 
-        ai_response = {
+        status_message = f"Video '{filename}' processed. Flagged: {flagged}. Matches: {match_results}"
+        await broadcaster.broadcast(user_email, status_message)
+
+        return {
             "match_score": aggregate_score,
             "computed_hash": custom_video_id,
             "video_metadata": {
@@ -292,11 +482,53 @@ async def match_video(
                 "flagged": flagged
             }
         }
+    finally:
+        if frames:
+            cleanup_files(frames)
 
-        status_message = f"Video '{filename}' processed. Flagged: {flagged}. Matches: {match_results}"
-        await broadcaster.broadcast(user_email, status_message)
+def save_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
 
-        return JSONResponse(content=ai_response)
+@app.post("/match-video")
+async def match_video(
+    video_file: UploadFile = File(...),
+    user_email: str = Form(...),
+    name: str = Form(...),
+    description: str = Form(...),
+    async_job: bool = Form(False),
+):
+    filename = video_file.filename
+    # Concurrent uploads may share a filename, so temp files get a unique prefix.
+    work_id = f"{uuid.uuid4().hex[:12]}_"
+    temp_path = f"temp_{work_id}{filename}"
+    with stage_timer("upload", "upload_write"):
+        await asyncio.to_thread(save_upload, video_file, temp_path)
+
+    if async_job:
+        job = Job(
+            user_email,
+            run=lambda job: match_uploaded_video(
+                temp_path, filename, user_email, name, description, work_id, report=job.report
+            ),
+            cleanup=lambda: cleanup_files([temp_path]),
+        )
+        try:
+            await job_manager.submit(job)
+        except QueueFull as e:
+            cleanup_files([temp_path])
+            raise HTTPException(status_code=503, detail=f"Match queue is full: {e}")
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job.id, "status": job.status, **job_manager.stats()},
+        )
+
+    try:
+        return JSONResponse(
+            content=await match_uploaded_video(temp_path, filename, user_email, name, description, work_id)
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         logger.error(f"Error in /match-video: {e}")
         raise HTTPException(
@@ -305,47 +537,286 @@ async def match_video(
         )
     finally:
         cleanup_files([temp_path])
-        if frames:
-            cleanup_files(frames)
+
+# --- Match Job Endpoints ---
+@app.get("/jobs")
+async def job_stats():
+    return JSONResponse(content=job_manager.stats())
+
+@app.get("/jobs/{job_id}")
+async def get_match_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(content=job)
+
+# --- /match-batch Endpoint for Precomputed Fingerprints ---
+class FingerprintItem(BaseModel):
+    id: str
+    phashes: Optional[List[str]] = None   # pHash hex strings of the video's frames
+    vector: Optional[List[float]] = None  # or an already averaged 128-d hash vector
+
+class MatchBatchRequest(BaseModel):
+    items: List[FingerprintItem]
+    target: str = "crawled"               # "crawled" or "uploaded"
+    top_k: int = 5
+    threshold: Optional[float] = None     # defaults to SIMILARITY_THRESHOLD
+    tenants: Optional[List[str]] = None   # target "uploaded": only these owners' videos
+
+def item_vector(item: FingerprintItem) -> list:
+    if item.vector is not None:
+        return parse_db_vector(item.vector)
+    return average_hash_vector(item.phashes)
+
+def batch_queries(items: list) -> np.ndarray:
+    return np.array([item_vector(item) for item in items], dtype=np.float32)
+
+@app.post("/match-batch")
+async def match_batch(request: MatchBatchRequest):
+    if request.target not in ("crawled", "uploaded"):
+        raise HTTPException(status_code=400, detail="target must be 'crawled' or 'uploaded'.")
+    if len(request.items) > settings.MATCH_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MATCH_BATCH_MAX_ITEMS} items per batch.")
+    missing = [item.id for item in request.items if item.vector is None and not item.phashes]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Items without phashes or vector: {missing[:10]}")
+    if request.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1.")
+    if request.tenants is not None and request.target != "uploaded":
+        raise HTTPException(status_code=400, detail="tenants only applies to target 'uploaded'.")
+
+    index, id_field, label_field = (
+        (crawled_index, "crawled_video_id", "video_url") if request.target == "crawled"
+        else (uploaded_index, "uploaded_video_id", "filename")
+    )
+    queries = await asyncio.to_thread(batch_queries, request.items)
+    with stage_timer("batch", "match_scan"):
+        hits, failed_shards = await shards.search(
+            index, request.target, queries, request.top_k, request.threshold, request.tenants
+        )
+    CANDIDATES_SCORED.labels(request.target).inc(index.rows_for(request.tenants) * len(request.items))
+    results = [
+        {
+            "id": item.id,
+            "matches": [
+                match_entry(id_field, label_field, hit)
+                for hit in item_hits
+            ],
+        }
+        for item, item_hits in zip(request.items, hits)
+    ]
+    return JSONResponse(content={
+        "target": request.target,
+        "index_size": len(index),
+        "shards_failed": failed_shards,
+        "results": results,
+    })
+
+# --- Shard Search Endpoint (scatter-gather between analysis nodes) ---
+class ShardSearchRequest(BaseModel):
+    target: str = "crawled"
+    vectors: List[List[float]]
+    top_k: Optional[int] = None
+    threshold: Optional[float] = None
+    tenants: Optional[List[str]] = None
+    per_tenant: bool = False
+
+@app.post("/shard/search")
+async def shard_search(request: ShardSearchRequest):
+    """
+    Scores query vectors against this node's slice of the index only, without
+    fanning out further; called by peers from shards.search().
+    """
+    if request.target not in ("crawled", "uploaded"):
+        raise HTTPException(status_code=400, detail="target must be 'crawled' or 'uploaded'.")
+    if len(request.vectors) > settings.MATCH_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MATCH_BATCH_MAX_ITEMS} vectors per request.")
+    index = crawled_index if request.target == "crawled" else uploaded_index
+    queries = np.array(request.vectors, dtype=np.float32)
+    with stage_timer("shard", "match_scan"):
+        hits = await shards.search_local(
+            index, queries, request.top_k, request.threshold, request.tenants, request.per_tenant
+        )
+    CANDIDATES_SCORED.labels(request.target).inc(index.rows_for(request.tenants) * len(queries))
+    return JSONResponse(content={"shard": index.shard, "index_size": len(index), "results": hits})
 
 # --- Setup for Video Chunk Storage ---
 CHUNKS_DIR = os.path.join(os.getcwd(), "video_chunks")
 if not os.path.exists(CHUNKS_DIR):
     os.makedirs(CHUNKS_DIR)
 
-# --- Background Task Scheduling for Processing Video Chunks ---
-def schedule_process_chunks_and_match(video_id: str, total_chunks: int):
+# --- Processing of Complete Chunk Sets ---
+# Runs of process_chunks_and_match in progress on this worker. The last chunk
+# upload and /analyze both start processing through start_processing, so a
+# video they both trigger is processed once; across workers and retried
+# uploads the Redis claim of run_processing decides which trigger processes.
+processing_tasks: Dict[str, asyncio.Task] = {}
+
+async def run_processing(video_id: str, total_chunks: int) -> Optional[dict]:
+    """
+    Processes the video if this call claims it; otherwise returns the stored
+    result, or a "processing" status while another worker is still at it.
+    """
+    try:
+        claimed = await asyncio.to_thread(claim_analysis, video_id, settings.CHUNK_ANALYSIS_TTL)
+    except Exception as e:
+        # Never drop a video because Redis is unavailable.
+        logger.warning(f"Analysis claim unavailable for video_id {video_id}: {e}")
+        claimed = True
+    if not claimed:
+        stored = await asyncio.to_thread(get_analysis, video_id)
+        if stored == ANALYSIS_IN_PROGRESS:
+            logger.info(f"Video_id {video_id} is already being processed")
+            return {"video_id": video_id, "status": ANALYSIS_IN_PROGRESS}
+        if stored is not None:
+            logger.info(f"Video_id {video_id} was already processed; returning the stored result")
+            # Chunks re-sent after processing (retried uploads) are stale.
+            await asyncio.to_thread(shutil.rmtree, os.path.join(CHUNKS_DIR, video_id), True)
+            return stored
+        # The claim expired or was released in between; process it here.
+        return await run_processing(video_id, total_chunks)
+
+    result = None
+    try:
+        result = await process_chunks_and_match(video_id, total_chunks)
+    finally:
+        # The chunks (and the reassembled video next to them) are not needed
+        # once the video is analysed, and stale ones would break the chunk
+        # count of a later crawl of the same video_id.
+        await asyncio.to_thread(shutil.rmtree, os.path.join(CHUNKS_DIR, video_id), True)
+        try:
+            if result:
+                await asyncio.to_thread(store_analysis, video_id, result, settings.CHUNK_ANALYSIS_TTL)
+            else:
+                # Failed: let a retried /analyze process the video again.
+                await asyncio.to_thread(release_analysis, video_id)
+        except Exception as e:
+            logger.warning(f"Failed to record the analysis of video_id {video_id}: {e}")
+    return result
+
+def _processing_done(video_id: str, task: asyncio.Task):
+    processing_tasks.pop(video_id, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Processing of video_id {video_id} failed: {task.exception()}")
+
+def start_processing(video_id: str, total_chunks: int) -> asyncio.Task:
     """
-    In a background thread, there is no running event loop so we use asyncio.run
-    to execute the async process_chunks_and_match coroutine.
+    Starts processing a video as a task on the event loop (the broadcaster,
+    Redis, index and shard clients are bound to it), or returns the run
+    already in progress for the video.
     """
-    asyncio.run(process_chunks_and_match(video_id, total_chunks))
+    task = processing_tasks.get(video_id)
+    if task is None:
+        task = asyncio.create_task(run_processing(video_id, total_chunks))
+        processing_tasks[video_id] = task
+        task.add_done_callback(lambda done: _processing_done(video_id, done))
+    return task
 
 @app.post("/upload-video-chunk")
 async def upload_video_chunk(
-    background_tasks: BackgroundTasks,
     video_id: str = Form(...),
     chunk_index: int = Form(...),
     total_chunks: int = Form(...),
     video_chunk: UploadFile = File(...),
+    progressive: bool = Form(False),
 ):
     chunk_dir = os.path.join(CHUNKS_DIR, video_id)
     if not os.path.exists(chunk_dir):
         os.makedirs(chunk_dir)
     chunk_path = os.path.join(chunk_dir, f"chunk_{chunk_index}.mp4")
-    with open(chunk_path, "wb") as f:
-        f.write(await video_chunk.read())
+    # Chunks arrive concurrently (and may be retried), so write to a temporary
+    # name and rename: a chunk only becomes visible to the glob once complete.
+    partial_path = f"{chunk_path}.part"
+    with stage_timer("chunk", "upload_write"):
+        with open(partial_path, "wb") as f:
+            shutil.copyfileobj(video_chunk.file, f)
+        os.replace(partial_path, chunk_path)
     existing_chunks = glob.glob(os.path.join(chunk_dir, "chunk_*.mp4"))
-    if len(existing_chunks) == total_chunks:
-        # Schedule processing when all chunks have been uploaded.
-        background_tasks.add_task(schedule_process_chunks_and_match, video_id, total_chunks)
-    return JSONResponse({"message": f"Chunk {chunk_index} for video {video_id} uploaded successfully."})
+    # total_chunks <= 0 means the sender is still streaming and does not know the
+    # final count yet; it will call /analyze once the last chunk is out.
+    if total_chunks > 0 and len(existing_chunks) == total_chunks:
+        # Start processing when all chunks have been uploaded. Concurrent last
+        # chunks and retried uploads can all get here; only the one that
+        # claims the video in run_processing processes it.
+        start_processing(video_id, total_chunks)
+    response = {"message": f"Chunk {chunk_index} for video {video_id} uploaded successfully."}
+    if progressive:
+        response.update(await progressive_match_chunk(video_id, chunk_index, chunk_path))
+    return JSONResponse(response)
+
+def phash_descriptor(phashes: list) -> dict:
+    # Only pHashes are kept per chunk; verification uses those alone.
+    return {"frame_hashes": {"phash": phashes}, "signature": None}
+
+def fingerprint_chunk(video_id: str, chunk_index: int, chunk_path: str) -> list:
+    pattern = os.path.join(settings.FRAMES_DIR, f"{video_id}_c{chunk_index}_%d.jpg")
+    with stage_timer("chunk", "frame_extraction"):
+        frames = extract_keyframes(chunk_path, pattern, **sampling_options(settings.CRAWLED_SAMPLING_STRATEGY))
+    try:
+        with stage_timer("chunk", "phash"):
+            phashes = compute_phashes(frames)
+        FRAMES_PROCESSED.labels("chunk").inc(len(phashes))
+        return phashes
+    finally:
+        cleanup_files(frames)
+
+async def progressive_match_chunk(video_id: str, chunk_index: int, chunk_path: str) -> dict:
+    """
+    Fingerprint a freshly uploaded chunk, fold it into the running hash of the
+    video and match the result against uploaded videos. The returned decision
+    tells the crawler whether it can stop downloading.
+    """
+    phashes = await asyncio.to_thread(fingerprint_chunk, video_id, chunk_index, chunk_path)
+    try:
+        session = await asyncio.to_thread(progressive_tracker.add_chunk, video_id, chunk_index, phashes)
+    except Exception as e:
+        # Without the session the video is simply analysed in full.
+        logger.warning(f"Progressive session unavailable for {video_id}: {e}")
+        return {"decision": CONTINUE, "best_similarity": 0.0, "chunks_analyzed": 0}
+    all_phashes = session.phashes()
+    if not all_phashes:
+        return {"decision": session.decision, "best_similarity": 0.0, "chunks_analyzed": len(session.chunk_phashes)}
+
+    # A match is decided on verified scores, as /analyze does, so a download
+    # is not cut short for candidates that verification would reject; no match
+    # is decided on the pre-filter scores (see PROGRESSIVE_NO_MATCH_THRESHOLD).
+    verifying = settings.MATCH_VERIFY
+    candidates = await prefilter_uploaded(
+        average_hash_vector(all_phashes), "chunk", top_k=settings.VERIFY_CANDIDATES if verifying else None
+    )
+    matches = candidates
+    if verifying:
+        matches = await verify_candidates(
+            Video, "uploaded_video_id", phash_descriptor(all_phashes), candidates, "chunk", "uploaded"
+        )
+    prefilter_best = max((match["similarity"] for match in candidates), default=0.0)
+    best = max((match["similarity"] for match in matches), default=0.0)
+    try:
+        decision = await asyncio.to_thread(progressive_tracker.decide, session, best, prefilter_best)
+    except Exception as e:
+        logger.warning(f"Failed to record the progressive decision for {video_id}: {e}")
+        decision = CONTINUE
+    if decision != CONTINUE:
+        logger.info(
+            f"Progressive decision for {video_id} after {len(session.chunk_phashes)} chunks: "
+            f"{decision} ({best}, pre-filter {prefilter_best})"
+        )
+    return {
+        "decision": decision,
+        "best_similarity": best,
+        "prefilter_similarity": prefilter_best,
+        "chunks_analyzed": len(session.chunk_phashes),
+    }
 
 @app.post("/analyze")
 async def analyze(video_id: str = Form(...), total_chunks: int = Form(...)):
-    result = await process_chunks_and_match(video_id, total_chunks)
+    # Shielded: the run may be shared with the last chunk upload, so a
+    # dropped request must not cancel it.
+    result = await asyncio.shield(start_processing(video_id, total_chunks))
     if not result:
         raise HTTPException(status_code=400, detail="Processing failed.")
+    if result.get("status") == ANALYSIS_IN_PROGRESS:
+        return JSONResponse(content=result, status_code=202)
     return JSONResponse(content=result)
 
 def reassemble_video(video_id: str, total_chunks: int) -> str:
@@ -379,81 +850,181 @@ def reassemble_video(video_id: str, total_chunks: int) -> str:
     return output_video
 
 # --- Matching Helper Functions ---
-async def match_against_crawled(uploaded_vector: list, new_video_id: str):
-    matches = []
-    async with async_session() as session:
-        # Fetch id, video_url, and hash_vector from crawled_videos
-        stmt = text("SELECT id, video_url, hash_vector FROM crawled_videos")
-        result = await session.execute(stmt)
-        for row in result.fetchall():
-            crawled_video_id = row[0]
-            crawled_hash_vector = parse_db_vector(row[2])
-            if not crawled_hash_vector:
-                continue
-            similarity = compute_video_similarity(uploaded_vector, crawled_hash_vector)
-            if similarity >= settings.SIMILARITY_THRESHOLD:
-                matches.append({
-                    "crawled_video_id": crawled_video_id,
-                    "video_url": row[1],
-                    "similarity": round(similarity, 2)
-                })
+def match_entry(id_field: str, label_field: str, hit: tuple) -> dict:
+    row_id, label, similarity, owner = hit
+    entry = {id_field: row_id, label_field: label, "similarity": similarity}
+    if owner is not None:
+        entry["user_email"] = owner
+    return entry
+
+async def verify_candidates(model, id_field: str, descriptor: dict, matches: list, pipeline: str, target: str) -> list:
+    """
+    Loads the stored descriptors of the pre-filter matches and rescores them
+    with verify.verify_matches; only the candidates' rows are read.
+    """
+    if not matches:
+        return matches
+    with stage_timer(pipeline, "verify"):
+        ids = [match[id_field] for match in matches]
+        async with async_session() as session:
+            result = await session.execute(
+                select(model.id, model.signature_vector, model.frame_hashes).where(model.id.in_(ids))
+            )
+            candidates = {
+                row_id: (None if signature is None else parse_db_vector(signature), frame_hashes)
+                for row_id, signature, frame_hashes in result.all()
+            }
+        verified = await asyncio.to_thread(verify.verify_matches, descriptor, matches, candidates, id_field)
+    passed = sum(1 for match in verified if match["verified"])
+    unverified = len(verified) - passed
+    CANDIDATES_VERIFIED.labels(target, "passed").inc(passed)
+    CANDIDATES_VERIFIED.labels(target, "unverified").inc(unverified)
+    CANDIDATES_VERIFIED.labels(target, "rejected").inc(len(matches) - len(verified))
+    return verified
+
+async def match_against_crawled(
+    uploaded_vector: list,
+    new_video_id: str,
+    report=None,
+    pipeline: str = "upload",
+    descriptor: Optional[dict] = None,
+):
+    """
+    Matches against crawled videos. With a descriptor (and MATCH_VERIFY) the
+    index scan only pre-filters VERIFY_CANDIDATES candidates for verify.py.
+    """
+    verifying = descriptor is not None and settings.MATCH_VERIFY
+    top_k = settings.VERIFY_CANDIDATES if verifying else None
+    with stage_timer(pipeline, "match_scan"):
+        hits, _ = await shards.search(crawled_index, "crawled", np.array([uploaded_vector]), top_k)
+    hits = hits[0]
+    CANDIDATES_SCORED.labels("crawled").inc(len(crawled_index))
+    if report:
+        await report(candidates_scored=len(crawled_index))
+    matches = [match_entry("crawled_video_id", "video_url", hit) for hit in hits]
+    if verifying:
+        matches = await verify_candidates(CrawledVideo, "crawled_video_id", descriptor, matches, pipeline, "crawled")
     if matches:
         logger.info(f"match_against_crawled: Found match for {new_video_id}: {matches}")
     else:
         logger.info(f"match_against_crawled: No matches found for {new_video_id}.")
     return matches
 
-async def match_against_uploaded(uploaded_vector: list, new_video_id: str):
-    matches = []
-    async with async_session() as session:
-        stmt = text("SELECT id, filename, hash_vector FROM videos")
-        result = await session.execute(stmt)
-        for row in result.fetchall():
-            uploaded_video_id = row[0]
-            uploaded_hash_vector = parse_db_vector(row[2])
-            if not uploaded_hash_vector:
-                continue
-            similarity = compute_video_similarity(uploaded_vector, uploaded_hash_vector)
-            if similarity >= settings.SIMILARITY_THRESHOLD:
-                matches.append({
-                    "uploaded_video_id": uploaded_video_id,
-                    "filename": row[1],
-                    "similarity": round(similarity, 2)
-                })
+async def prefilter_uploaded(
+    uploaded_vector: list,
+    pipeline: str,
+    tenants: Optional[List[str]] = None,
+    top_k: Optional[int] = None,
+) -> list:
+    """
+    Index scan over uploaded videos: every hit at or above
+    SIMILARITY_THRESHOLD, or the top_k best of each tenant.
+    """
+    with stage_timer(pipeline, "match_scan"):
+        hits, _ = await shards.search(
+            uploaded_index, "uploaded", np.array([uploaded_vector]), top_k, tenants=tenants, per_tenant=True
+        )
+    CANDIDATES_SCORED.labels("uploaded").inc(uploaded_index.rows_for(tenants))
+    return [match_entry("uploaded_video_id", "filename", hit) for hit in hits[0]]
+
+async def match_against_uploaded(
+    uploaded_vector: list,
+    new_video_id: str,
+    pipeline: str = "crawled",
+    tenants: Optional[List[str]] = None,
+    descriptor: Optional[dict] = None,
+):
+    """
+    Matches against uploaded videos of every tenant, or only of `tenants`.
+    Each match carries the owning tenant's user_email. A descriptor enables
+    verification as in match_against_crawled; the VERIFY_CANDIDATES cap then
+    applies per tenant, so fanning out over all tenants still gives every
+    tenant its own candidates.
+    """
+    verifying = descriptor is not None and settings.MATCH_VERIFY
+    top_k = settings.VERIFY_CANDIDATES if verifying else None
+    matches = await prefilter_uploaded(uploaded_vector, pipeline, tenants, top_k)
+    if verifying:
+        matches = await verify_candidates(Video, "uploaded_video_id", descriptor, matches, pipeline, "uploaded")
     if matches:
         logger.info(f"match_against_uploaded: Found match for {new_video_id}: {matches}")
     else:
         logger.info(f"match_against_uploaded: No matches found for {new_video_id}.")
     return matches
 
+def group_by_tenant(matches: list) -> Dict[str, list]:
+    tenant_matches: Dict[str, list] = {}
+    for match in matches:
+        tenant_matches.setdefault(match.get("user_email"), []).append(match)
+    return tenant_matches
+
+async def notify_tenants(video_id: str, tenant_matches: Dict[str, list]):
+    """
+    Sends every tenant with a match one event listing only its own videos.
+    """
+    for user_email, owned in tenant_matches.items():
+        if user_email is None:
+            continue
+        best = max(match["similarity"] for match in owned)
+        status_message = f"Crawled video '{video_id}' matches your uploads. Best match: {best}. Matches: {owned}"
+        await broadcaster.broadcast(user_email, status_message, key=f"crawled:{video_id}")
+
 # --- Process Chunks, Analyze, and Save Crawled Video and Comparison Analysis ---
 async def process_chunks_and_match(video_id: str, total_chunks: int):
+    reassembled = None
+    frames = []
     try:
-        reassembled = reassemble_video(video_id, total_chunks)
+        progressive = await asyncio.to_thread(progressive_tracker.pop, video_id)
     except Exception as e:
-        logger.error(f"Error during reassembly for video_id {video_id}: {e}")
-        return None
+        logger.warning(f"Progressive session unavailable for {video_id}: {e}")
+        progressive = None
+    if progressive and progressive.covers(total_chunks):
+        # Every chunk was already fingerprinted on arrival; skip reassembly.
+        phash_hex_list = progressive.phashes()
+        descriptor = phash_descriptor(phash_hex_list)
+        CACHE_LOOKUPS.labels("progressive_hashes", "hit").inc()
+        logger.info(f"Reusing {len(phash_hex_list)} progressive hashes for video_id {video_id}")
+    else:
+        if progressive:
+            CACHE_LOOKUPS.labels("progressive_hashes", "miss").inc()
+        try:
+            with stage_timer("crawled", "reassembly"):
+                reassembled = await asyncio.to_thread(reassemble_video, video_id, total_chunks)
+        except Exception as e:
+            logger.error(f"Error during reassembly for video_id {video_id}: {e}")
+            return None
 
-    pattern = os.path.join(settings.FRAMES_DIR, f"{video_id}_%d.jpg")
-    frames = extract_keyframes(reassembled, pattern, fps=1)
-    if not frames:
-        logger.error(f"Failed to extract keyframes from reassembled video {video_id}")
-        return None
+        pattern = os.path.join(settings.FRAMES_DIR, f"{video_id}_%d.jpg")
+        with stage_timer("crawled", "frame_extraction"):
+            frames = await asyncio.to_thread(
+                extract_keyframes, reassembled, pattern, **sampling_options(settings.CRAWLED_SAMPLING_STRATEGY)
+            )
+        if not frames:
+            logger.error(f"Failed to extract keyframes from reassembled video {video_id}")
+            return None
 
-    phash_hex_list = compute_phashes(frames)
+        with stage_timer("crawled", "phash"):
+            phash_hex_list, descriptor = await asyncio.to_thread(compute_descriptors, frames)
+        FRAMES_PROCESSED.labels("crawled").inc(len(phash_hex_list))
     avg_vector = average_hash_vector(phash_hex_list)
 
-    # For chunked (crawled) videos, match against previously uploaded videos.
-    matches = await match_against_uploaded(avg_vector, video_id)
+    # For chunked (crawled) videos, match against previously uploaded videos of
+    # all tenants in one scan, then split the hits per owner.
+    matches = await match_against_uploaded(avg_vector, video_id, descriptor=descriptor)
+    tenant_matches = group_by_tenant(matches)
+    record_matches("crawled", matches)
     flagged = True if matches else False
     aggregate_score = max((match["similarity"] for match in matches), default=0.0)
 
+    persist_started = time.perf_counter()
     async with async_session() as session:
         stmt = select(CrawledVideo).where(CrawledVideo.video_url == video_id)
         result = await session.execute(stmt)
         existing = result.scalar_one_or_none()
         if existing:
             existing.hash_vector = avg_vector
+            existing.signature_vector = descriptor["signature"]
+            existing.frame_hashes = descriptor["frame_hashes"]
             session.add(existing)
             crawled_record = existing
         else:
@@ -463,13 +1034,16 @@ async def process_chunks_and_match(video_id: str, total_chunks: int):
                 description="",
                 video_metadata=None,
                 hash_vector=avg_vector,
-                audio_spectrum=None
+                audio_spectrum=None,
+                signature_vector=descriptor["signature"],
+                frame_hashes=descriptor["frame_hashes"]
             )
             session.add(new_record)
             await session.commit()
             await session.refresh(new_record)
             crawled_record = new_record
         await session.commit()
+        crawled_index.upsert(crawled_record.id, video_id, avg_vector)
 
         analysis = AnalyzedVideo(
             analysis_type="crawled",
@@ -493,17 +1067,24 @@ async def process_chunks_and_match(video_id: str, total_chunks: int):
             )
             session.add(comparison)
         await session.commit()
+    observe_stage("crawled", "db_persist", persist_started)
 
-    try:
-        os.remove(reassembled)
-    except Exception:
-        pass
+    if reassembled:
+        try:
+            os.remove(reassembled)
+        except Exception:
+            pass
     cleanup_files(frames)
+    await notify_tenants(video_id, tenant_matches)
 
     result_data = {
         "video_id": video_id,
         "match_score": aggregate_score,
         "active_matches": matches,
+        "tenant_matches": {
+            user_email: {"match_score": max(m["similarity"] for m in owned), "matches": owned}
+            for user_email, owned in tenant_matches.items() if user_email is not None
+        },
         "uploaded_frames": len(phash_hex_list)
     }
     logger.info(
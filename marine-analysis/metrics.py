@@ -0,0 +1,94 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from broadcaster import broadcaster
+from jobs import job_manager
+
+# Labels are limited to fixed sets (pipeline, stage, target, result) so the
+# series count does not grow with videos, users or URLs.
+#   pipeline: "upload" (/match-video), "crawled" (process_chunks_and_match),
+#             "chunk" (progressive chunk analysis), "batch" (/match-batch),
+#             "shard" (/shard/search from peers), "startup" (deferred warm-up)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds",
+    "Wall time of one pipeline stage",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+FRAMES_PROCESSED = Counter(
+    "analysis_frames_processed_total", "Frames extracted and pHashed", ["pipeline"]
+)
+CANDIDATES_SCORED = Counter(
+    "analysis_candidates_scored_total", "Index rows scored against query vectors", ["target"]
+)
+CACHE_LOOKUPS = Counter(
+    "analysis_cache_lookups_total",
+    "Reuse of previously computed fingerprints (progressive chunk hashes)",
+    ["cache", "result"],
+)
+CANDIDATES_VERIFIED = Counter(
+    "analysis_candidates_verified_total",
+    "Pre-filter candidates rescored by verify.py (passed, rejected, or unverified without a stored descriptor)",
+    ["target", "result"],
+)
+FLAGGED_MATCHES = Counter(
+    "analysis_flagged_matches_total", "Matches at or above the similarity threshold", ["pipeline"]
+)
+FLAGGED_VIDEOS = Counter(
+    "analysis_flagged_videos_total", "Analysed videos flagged with at least one match", ["pipeline"]
+)
+
+MATCH_JOBS_RUNNING = Gauge("analysis_match_jobs_running", "Asynchronous match jobs being processed")
+MATCH_JOBS_RUNNING.set_function(lambda: job_manager.running)
+MATCH_JOBS_QUEUED = Gauge("analysis_match_jobs_queued", "Asynchronous match jobs waiting for a worker")
+MATCH_JOBS_QUEUED.set_function(job_manager.queue_depth)
+
+def _pending_events() -> list:
+    return [s.qsize() for subscribers in broadcaster.connections.values() for s in subscribers]
+
+SSE_SUBSCRIBERS = Gauge("analysis_sse_subscribers", "Connected SSE subscribers on this worker")
+SSE_SUBSCRIBERS.set_function(lambda: len(_pending_events()))
+SSE_PENDING_EVENTS = Gauge("analysis_sse_pending_events", "Events queued for SSE subscribers on this worker")
+SSE_PENDING_EVENTS.set_function(lambda: sum(_pending_events()))
+SSE_MAX_PENDING_EVENTS = Gauge("analysis_sse_max_pending_events", "Deepest SSE subscriber queue on this worker")
+SSE_MAX_PENDING_EVENTS.set_function(lambda: max(_pending_events(), default=0))
+
+SHARD_REQUESTS = Counter(
+    "analysis_shard_requests_total", "Scatter-gather requests to peer index shards", ["result"]
+)
+SHARD_SECONDS = Histogram(
+    "analysis_shard_request_seconds", "Latency of successful peer shard searches", buckets=STAGE_BUCKETS
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "analysis_event_loop_lag_seconds",
+    "How late the event-loop probe woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "analysis_event_loop_blocked_total", "Times the event loop was blocked beyond LOOP_BLOCK_THRESHOLD"
+)
+
+def stage_timer(pipeline: str, stage: str):
+    """
+    Context manager observing the wall time of a stage:
+
+        with stage_timer("upload", "phash"):
+            ...
+    """
+    return STAGE_SECONDS.labels(pipeline, stage).time()
+
+def observe_stage(pipeline: str, stage: str, started: float):
+    """
+    Records a stage timed by hand (time.perf_counter() at its start), for
+    stages too long to wrap in stage_timer.
+    """
+    STAGE_SECONDS.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+def record_matches(pipeline: str, matches: list):
+    FLAGGED_MATCHES.labels(pipeline).inc(len(matches))
+    if matches:
+        FLAGGED_VIDEOS.labels(pipeline).inc()
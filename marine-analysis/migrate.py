@@ -0,0 +1,22 @@
+"""
+Creates the pgvector extension and the analysis tables.
+
+    python migrate.py
+
+Run once per deployment (e.g. as an init container or release step) before
+starting the service. With AUTO_MIGRATE=true each worker does the same in the
+background at startup instead.
+"""
+import asyncio
+
+from loguru import logger
+
+from db import engine, init_db
+
+async def migrate():
+    await init_db()
+    await engine.dispose()
+    logger.info("Database schema is up to date.")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,109 @@
+import json
+from typing import Dict, List, Optional
+
+from config import settings
+from storage import redis_utils
+
+CONTINUE = "continue"
+MATCH = "match"
+NO_MATCH = "no_match"
+
+SESSION_KEY_PREFIX = "progressive:"
+CHUNK_FIELD_PREFIX = "chunk:"
+DECISION_FIELD = "decision"
+
+class ProgressiveSession:
+    """
+    Running fingerprint state for a crawled video whose chunks are analysed as
+    they arrive instead of after reassembly.
+    """
+    def __init__(self, video_id: str, chunk_phashes: Dict[int, List[str]] = None, decision: str = CONTINUE):
+        self.video_id = video_id
+        self.chunk_phashes: Dict[int, List[str]] = chunk_phashes or {}
+        self.decision = decision
+
+    def phashes(self) -> List[str]:
+        hashes = []
+        for idx in sorted(self.chunk_phashes):
+            hashes.extend(self.chunk_phashes[idx])
+        return hashes
+
+    def covers(self, total_chunks: int) -> bool:
+        return all(idx in self.chunk_phashes for idx in range(total_chunks))
+
+    def decide(self, best_similarity: float, prefilter_similarity: float) -> str:
+        """
+        Decision after the latest incremental match. None is taken before
+        PROGRESSIVE_MIN_CHUNKS chunks have been seen; then the download stops
+        with a match when the best (verified) score is at or above
+        PROGRESSIVE_MATCH_THRESHOLD, and without one when even the best
+        pre-filter score is below PROGRESSIVE_NO_MATCH_THRESHOLD. A decision
+        once taken is sticky.
+        """
+        if self.decision != CONTINUE or len(self.chunk_phashes) < settings.PROGRESSIVE_MIN_CHUNKS:
+            return self.decision
+        if best_similarity >= settings.PROGRESSIVE_MATCH_THRESHOLD:
+            return MATCH
+        if prefilter_similarity < settings.PROGRESSIVE_NO_MATCH_THRESHOLD:
+            return NO_MATCH
+        return CONTINUE
+
+class ProgressiveTracker:
+    """
+    Keeps each session in a Redis hash (one field per chunk plus the
+    decision), so the chunks of a video uploaded to different workers meet in
+    one session. A session expires PROGRESSIVE_SESSION_TTL seconds after its
+    last chunk, so streams that abort or never reach /analyze do not leak.
+    The methods block on Redis; call them through asyncio.to_thread.
+    """
+    def __init__(self, ttl: int = None):
+        self.ttl = ttl or settings.PROGRESSIVE_SESSION_TTL
+
+    def _key(self, video_id: str) -> str:
+        return SESSION_KEY_PREFIX + video_id
+
+    def _session(self, video_id: str, fields: dict) -> ProgressiveSession:
+        chunk_phashes = {
+            int(field[len(CHUNK_FIELD_PREFIX):]): json.loads(value)
+            for field, value in fields.items()
+            if field.startswith(CHUNK_FIELD_PREFIX)
+        }
+        return ProgressiveSession(video_id, chunk_phashes, fields.get(DECISION_FIELD, CONTINUE))
+
+    def add_chunk(self, video_id: str, chunk_index: int, phashes: List[str]) -> ProgressiveSession:
+        """
+        Stores the pHashes of a chunk and returns the session with every chunk
+        seen so far by any worker.
+        """
+        key = self._key(video_id)
+        pipe = redis_utils.redis_client.pipeline()
+        pipe.hset(key, f"{CHUNK_FIELD_PREFIX}{chunk_index}", json.dumps(phashes))
+        pipe.expire(key, self.ttl)
+        pipe.hgetall(key)
+        fields = pipe.execute()[-1]
+        return self._session(video_id, fields)
+
+    def decide(self, session: ProgressiveSession, best_similarity: float, prefilter_similarity: float) -> str:
+        """
+        Records the session's decision; when workers race, the first decision
+        stored wins and is returned to both.
+        """
+        decision = session.decide(best_similarity, prefilter_similarity)
+        if decision == CONTINUE or session.decision != CONTINUE:
+            return decision
+        key = self._key(session.video_id)
+        pipe = redis_utils.redis_client.pipeline()
+        pipe.hsetnx(key, DECISION_FIELD, decision)
+        pipe.hget(key, DECISION_FIELD)
+        session.decision = pipe.execute()[-1] or decision
+        return session.decision
+
+    def pop(self, video_id: str) -> Optional[ProgressiveSession]:
+        key = self._key(video_id)
+        pipe = redis_utils.redis_client.pipeline()
+        pipe.hgetall(key)
+        pipe.delete(key)
+        fields = pipe.execute()[0]
+        return self._session(video_id, fields) if fields else None
+
+progressive_tracker = ProgressiveTracker()
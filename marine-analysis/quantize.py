@@ -0,0 +1,117 @@
+import numpy as np
+
+# Compact representations of the hash vectors and the kernels that score them.
+#
+# A pHash has 64 bits. hex_to_float_vector puts them in dims 0-63 of a 128-d
+# vector and leaves dims 64-127 at zero, so an averaged hash vector only carries
+# information in its first HASH_BITS dims and dropping the rest is lossless.
+#
+#   float32  128 dims, 512 bytes/row: the reference layout, exact
+#   float16  64 dims, 128 bytes/row: score error ~0.01 percentage points;
+#            widening float16 is slow in numpy, so scans are slower than float32
+#   int8     64 dims scaled per row to [-127, 127], 64 bytes/row: the scale is
+#            not stored because scoring renormalises every row; error ~0.2
+#            points and scans about as fast as float32
+#   bits     a video's median hash: dims above the row's median set to 1,
+#            packed into 8 bytes/row and compared by Hamming similarity. A
+#            different (coarser) score, used for pre-filtering rather than as
+#            a drop-in replacement.
+HASH_BITS = 64
+STORAGE_MODES = ("float32", "float16", "int8")
+# Rows widened to float32 at a time when scoring compact matrices (2 MiB).
+DECODE_BLOCK = 8192
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def encode(matrix: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Encodes L2-normalised float32 rows (n x 128) in the given storage mode.
+    """
+    if mode == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32)
+    head = np.asarray(matrix, dtype=np.float32)[:, :HASH_BITS]
+    if mode == "float16":
+        return np.ascontiguousarray(head, dtype=np.float16)
+    if mode == "int8":
+        peak = np.abs(head).max(axis=1, keepdims=True)
+        scaled = np.divide(head * 127.0, peak, out=np.zeros_like(head), where=peak > 0)
+        return np.rint(scaled).astype(np.int8)
+    raise ValueError(f"Unknown storage mode '{mode}', expected one of {STORAGE_MODES}")
+
+def width(mode: str) -> int:
+    return 128 if mode == "float32" else HASH_BITS
+
+def dtype(mode: str) -> np.dtype:
+    return np.dtype(mode)
+
+def decode(rows: np.ndarray) -> np.ndarray:
+    """
+    Encoded rows back to L2-normalised float32 (64 or 128 dims).
+    """
+    if rows.dtype == np.float32:
+        return rows
+    block = rows.astype(np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+
+def cosine_scores(queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity in percent between normalised float32 queries (q x 128)
+    and encoded rows, as a q x n float32 matrix. Compact rows are widened to
+    float32 DECODE_BLOCK rows at a time (small enough to stay in cache) and
+    scored with one BLAS matrix product per block, so the float32 matrix is
+    never materialised. int8 rows are renormalised by dividing the scores by
+    the row norms rather than rescaling every element.
+    """
+    queries = np.ascontiguousarray(queries[:, :rows.shape[1]], dtype=np.float32)
+    if rows.dtype == np.float32:
+        return (queries @ rows.T) * 100.0
+    scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+    for start in range(0, len(rows), DECODE_BLOCK):
+        block = rows[start:start + DECODE_BLOCK].astype(np.float32)
+        block_scores = queries @ block.T
+        if rows.dtype == np.int8:
+            norms = np.sqrt(np.einsum("ij,ij->i", block, block))
+            np.divide(block_scores, norms, out=block_scores, where=norms > 0)
+        scores[:, start:start + DECODE_BLOCK] = block_scores
+    return scores * 100.0
+
+def pack_hashes(hex_list: list) -> np.ndarray:
+    """
+    Raw pHash bits of each frame, 8 bytes per hash (n x 8 uint8), in the same
+    bit order as hex_to_float_vector.
+    """
+    if not hex_list:
+        return np.empty((0, HASH_BITS // 8), dtype=np.uint8)
+    raw = b"".join(bytes.fromhex(h.rjust(HASH_BITS // 4, "0")[-HASH_BITS // 4:]) for h in hex_list)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, HASH_BITS // 8)
+
+def signature_bits(vectors: np.ndarray) -> np.ndarray:
+    """
+    Median hash of averaged hash vectors: bit i is set where dim i is above
+    the row's median over the first 64 dims. Packed to n x 8 uint8.
+    """
+    head = np.asarray(vectors, dtype=np.float32)
+    if head.ndim == 1:
+        head = head[None, :]
+    head = head[:, :HASH_BITS]
+    median = np.median(head, axis=1, keepdims=True)
+    return np.packbits(head > median, axis=1)
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    # numpy >= 2.0 has a vectorised popcount; older versions use a byte table.
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+def hamming_scores(query_bits: np.ndarray, rows_bits: np.ndarray) -> np.ndarray:
+    """
+    Hamming similarity in percent between packed 64-bit hashes, q x n. Each
+    hash is compared as one uint64 (XOR + popcount).
+    """
+    rows = np.ascontiguousarray(rows_bits, dtype=np.uint8).view(np.uint64).ravel()
+    queries = np.ascontiguousarray(query_bits, dtype=np.uint8).view(np.uint64).ravel()
+    scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+    for i, query in enumerate(queries):
+        scores[i] = _popcount64(rows ^ query)
+    return (1.0 - scores / HASH_BITS) * 100.0
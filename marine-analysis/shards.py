@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+import numpy as np
+from loguru import logger
+
+from config import settings
+from index import VectorIndex, merge_hits
+from metrics import SHARD_REQUESTS, SHARD_SECONDS
+
+# Scatter-gather over index shards. Every analysis node indexes one slice of
+# each table (VectorIndex.owns) and answers POST /shard/search for it; the node
+# serving a request scores its own slice locally, sends the same query vectors
+# to the peers in INDEX_SHARD_PEERS and merges the hits. A peer that fails or
+# times out is left out of the result and reported in `failed`.
+
+http_client: Optional[httpx.AsyncClient] = None
+
+def peers() -> List[str]:
+    return [peer.strip().rstrip("/") for peer in settings.INDEX_SHARD_PEERS.split(",") if peer.strip()]
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.INDEX_SHARD_TIMEOUT),
+            limits=httpx.Limits(max_connections=max(len(peers()) * 4, 10)),
+        )
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+async def search_local(
+    index: VectorIndex,
+    queries: np.ndarray,
+    top_k: Optional[int],
+    threshold: Optional[float],
+    tenants: Optional[List[str]] = None,
+    per_tenant: bool = False,
+) -> list:
+    await index.refresh()
+    return await asyncio.to_thread(index.search, queries, top_k, threshold, tenants, per_tenant)
+
+async def _search_peer(
+    peer: str,
+    target: str,
+    queries: np.ndarray,
+    top_k: Optional[int],
+    threshold: Optional[float],
+    tenants: Optional[List[str]],
+    per_tenant: bool,
+):
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().post(
+            f"{peer}/shard/search",
+            json={
+                "target": target,
+                "vectors": queries.tolist(),
+                "top_k": top_k,
+                "threshold": threshold,
+                "tenants": tenants,
+                "per_tenant": per_tenant,
+            },
+        )
+        response.raise_for_status()
+        results = response.json()["results"]
+        if len(results) != len(queries):
+            raise ValueError(f"expected {len(queries)} result lists, got {len(results)}")
+    except Exception as e:
+        SHARD_REQUESTS.labels("error").inc()
+        logger.warning(f"Shard search on {peer} failed: {e}")
+        return None
+    SHARD_REQUESTS.labels("ok").inc()
+    SHARD_SECONDS.observe(time.perf_counter() - started)
+    return [[(row_id, label, similarity, owner) for row_id, label, similarity, owner in hits] for hits in results]
+
+async def search(
+    index: VectorIndex,
+    target: str,
+    queries: np.ndarray,
+    top_k: Optional[int] = None,
+    threshold: Optional[float] = None,
+    tenants: Optional[List[str]] = None,
+    per_tenant: bool = False,
+) -> Tuple[list, list]:
+    """
+    Searches this node's slice and every peer shard concurrently, optionally
+    restricted to the rows of `tenants` (top_k per tenant with per_tenant).
+    Returns the merged per-query hits (as VectorIndex.search) and the peers
+    that failed.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    remote = peers()
+    parts = await asyncio.gather(
+        search_local(index, queries, top_k, threshold, tenants, per_tenant),
+        *(_search_peer(peer, target, queries, top_k, threshold, tenants, per_tenant) for peer in remote),
+    )
+    failed = [peer for peer, part in zip(remote, parts[1:]) if part is None]
+    if not remote:
+        return parts[0], failed
+    return merge_hits([part for part in parts if part is not None], top_k, per_tenant), failed
@@ -21,3 +21,35 @@ def get_phashes(key: str) -> list:
     phash_strs = json.loads(data)
     import imagehash
     return [imagehash.hex_to_hash(ph_str) for ph_str in phash_strs]
+
+JOB_KEY_PREFIX = "match_job:"
+
+def store_job(job_id: str, state: dict, ttl: int):
+    redis_client.set(JOB_KEY_PREFIX + job_id, json.dumps(state), ex=ttl)
+
+def get_job(job_id: str):
+    data = redis_client.get(JOB_KEY_PREFIX + job_id)
+    return json.loads(data) if data else None
+
+# Claim and result of the analysis of a crawled video's chunk set, shared by
+# every worker: the first caller of claim_analysis processes the video and
+# replaces the claim with the result.
+ANALYSIS_KEY_PREFIX = "chunk_analysis:"
+ANALYSIS_IN_PROGRESS = "processing"
+
+def claim_analysis(video_id: str, ttl: int) -> bool:
+    """Sets the analysis key only if it does not exist yet; returns True if this call created it."""
+    return bool(redis_client.set(ANALYSIS_KEY_PREFIX + video_id, ANALYSIS_IN_PROGRESS, nx=True, ex=ttl))
+
+def store_analysis(video_id: str, result: dict, ttl: int):
+    redis_client.set(ANALYSIS_KEY_PREFIX + video_id, json.dumps(result), ex=ttl)
+
+def get_analysis(video_id: str):
+    """Returns the stored result, ANALYSIS_IN_PROGRESS, or None when the video is unclaimed."""
+    data = redis_client.get(ANALYSIS_KEY_PREFIX + video_id)
+    if not data or data == ANALYSIS_IN_PROGRESS:
+        return data or None
+    return json.loads(data)
+
+def release_analysis(video_id: str):
+    redis_client.delete(ANALYSIS_KEY_PREFIX + video_id)
@@ -0,0 +1,27 @@
+"""
+Startup import guard: `import main` must not pull in the fingerprint
+dependencies that fingerprint/video.py and fingerprint/audio.py load on first
+use (see benchmarks/import_time.py for the timing report).
+"""
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from benchmarks.import_time import HEAVY_MODULES, parse_importtime  # noqa: E402
+
+def test_import_main_skips_heavy_modules():
+    env = dict(os.environ)
+    # Settings requires a database URL; importing does not connect.
+    env.setdefault("DATABASE_URL", "postgresql+asyncpg://unused/unused")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr[-4000:]
+
+    imported = {name.split(".")[0] for name, _, _ in parse_importtime(result.stderr)}
+    assert "main" in imported
+    assert sorted(imported.intersection(HEAVY_MODULES)) == []
@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+import quantize
+from config import settings
+from fingerprint.descriptor import FRAME_HASH_KINDS
+
+# Second matching stage. The index scan over averaged hash vectors is the
+# cheap pre-filter: it keeps the VERIFY_CANDIDATES best videos at or above
+# SIMILARITY_THRESHOLD. Each candidate that has a stored descriptor is then
+# rescored precisely:
+#
+#   frame similarity      for every query frame, the best candidate frame by
+#                         Hamming similarity averaged over the pHash, dHash
+#                         and wHash of the pair, then averaged over the
+#                         query frames (so a clip of a longer video still
+#                         scores high)
+#   signature similarity  cosine of the temporal colour signatures
+#
+# combined as (1 - VERIFY_SIGNATURE_WEIGHT) * frame + weight * signature and
+# kept only at or above VERIFY_THRESHOLD. Unrelated frames agree on about half
+# of their bits, so the frame score of an unrelated video sits near 50-65%
+# where averaged vectors of unrelated videos often exceed 90%.
+
+def pack_frame_hashes(frame_hashes: dict) -> Dict[str, np.ndarray]:
+    return {
+        kind: quantize.pack_hashes(frame_hashes[kind])
+        for kind in FRAME_HASH_KINDS
+        if frame_hashes.get(kind)
+    }
+
+def frame_similarity(query: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray]) -> Optional[float]:
+    """
+    Mean over query frames of the best per-frame similarity (percent), using
+    the hash kinds both sides have; None when they share none.
+    """
+    kinds = [kind for kind in query if kind in candidate]
+    if not kinds:
+        return None
+    pair_scores = sum(quantize.hamming_scores(query[kind], candidate[kind]) for kind in kinds) / len(kinds)
+    return float(pair_scores.max(axis=1).mean())
+
+def signature_similarity(query: Optional[list], candidate: Optional[list]) -> Optional[float]:
+    if query is None or candidate is None:
+        return None
+    a = np.asarray(query, dtype=np.float32)
+    b = np.asarray(candidate, dtype=np.float32)
+    norms = np.linalg.norm(a) * np.linalg.norm(b)
+    if len(a) != len(b) or norms == 0:
+        return None
+    return float(a @ b / norms * 100.0)
+
+def verify_matches(descriptor: dict, matches: list, candidates: dict, id_field: str) -> list:
+    """
+    Rescores pre-filter matches against the candidates' stored descriptors
+    ({row id: (signature, frame_hashes)}) and returns the matches that pass
+    VERIFY_THRESHOLD, best first. Candidates without stored frame hashes (rows
+    from before descriptors were recorded) keep their pre-filter score.
+    """
+    query_hashes = pack_frame_hashes(descriptor.get("frame_hashes") or {})
+    query_signature = descriptor.get("signature")
+    weight = settings.VERIFY_SIGNATURE_WEIGHT
+    verified = []
+    for match in matches:
+        signature, frame_hashes = candidates.get(match[id_field], (None, None))
+        frames = frame_similarity(query_hashes, pack_frame_hashes(frame_hashes or {}))
+        if frames is None:
+            verified.append(dict(match, verified=False))
+            continue
+        colour = signature_similarity(query_signature, signature)
+        score = frames if colour is None else (1.0 - weight) * frames + weight * colour
+        if score < settings.VERIFY_THRESHOLD:
+            continue
+        verified.append(dict(
+            match,
+            similarity=round(score, 2),
+            prefilter_similarity=match["similarity"],
+            frame_similarity=round(frames, 2),
+            signature_similarity=None if colour is None else round(colour, 2),
+            verified=True,
+        ))
+    return sorted(verified, key=lambda match: -match["similarity"])
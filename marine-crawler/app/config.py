@@ -6,6 +6,8 @@ class Settings(BaseSettings):
     kafka_crawl_topic: str = os.getenv("KAFKA_CRAWL_TOPIC", "crawl-tasks")
     kafka_video_download_topic: str = os.getenv("KAFKA_VIDEO_DOWNLOAD_TOPIC", "video-download-tasks")
     kafka_video_chunks_topic: str = os.getenv("KAFKA_VIDEO_CHUNKS_TOPIC", "video-chunks")
+    kafka_crawl_group: str = os.getenv("KAFKA_CRAWL_GROUP", "crawler_frontier_group")
+    kafka_crawl_batch: int = int(os.getenv("KAFKA_CRAWL_BATCH", 100))
     
     max_concurrent_crawlers: int = int(os.getenv("MAX_CONCURRENT_CRAWLERS", 100))
     user_agent: str = os.getenv(
@@ -13,6 +15,12 @@ class Settings(BaseSettings):
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
     segment_duration: int = int(os.getenv("SEGMENT_DURATION", 10))
+    # Pipe yt-dlp straight into the ffmpeg segmenter instead of downloading first.
+    streaming_download: bool = os.getenv("STREAMING_DOWNLOAD", "true").lower() == "true"
+    stream_max_pending_chunks: int = int(os.getenv("STREAM_MAX_PENDING_CHUNKS", 8))
+    # Ask the analysis service to match streamed chunks as they arrive and stop
+    # the download once it reports a confident match or non-match.
+    progressive_analysis: bool = os.getenv("PROGRESSIVE_ANALYSIS", "true").lower() == "true"
     
     downstream_endpoint: str = os.getenv("DOWNSTREAM_ENDPOINT", "http://localhost:8000/upload-reference")
     
@@ -22,9 +30,37 @@ class Settings(BaseSettings):
     
     AI_MICROSERVICE_URL: str = os.getenv("AI_MICROSERVICE_URL", "http://localhost:8000")
 
+    # Pooled HTTP client used to ship chunks to the analysis service.
+    http2_enabled: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+    http_timeout: float = float(os.getenv("HTTP_TIMEOUT", 120))
+    chunk_upload_concurrency: int = int(os.getenv("CHUNK_UPLOAD_CONCURRENCY", 4))
+    chunk_upload_retries: int = int(os.getenv("CHUNK_UPLOAD_RETRIES", 3))
+    chunk_upload_backoff: float = float(os.getenv("CHUNK_UPLOAD_BACKOFF", 1.0))
+
     REDIS_HOST: str = os.getenv("REDIS_HOST", "4.240.103.202")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
+    # Bounds every Redis call so a slow Redis cannot stall downloads.
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+
+    # Skip videos already seen (by canonical URL / platform id) within the TTL.
+    dedup_enabled: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    dedup_ttl_seconds: int = int(os.getenv("DEDUP_TTL_SECONDS", 7 * 24 * 3600))
+    # Also HEAD direct file URLs and dedup on ETag + Content-Length.
+    dedup_probe_remote: bool = os.getenv("DEDUP_PROBE_REMOTE", "false").lower() == "true"
+    # Skip crawl tasks for pages (by canonical URL) crawled within this TTL,
+    # e.g. records delivered twice by a retried hand-off from discovery.
+    crawl_task_dedup_ttl_seconds: int = int(os.getenv("CRAWL_TASK_DEDUP_TTL_SECONDS", 3600))
+    
+    # Event-loop lag probe and blocking-call watchdog (see app/loop_monitor.py)
+    loop_monitor: bool = os.getenv("LOOP_MONITOR", "true").lower() == "true"
+    loop_monitor_interval: float = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.1))
+    loop_block_threshold: float = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.25))
+    loop_stack_sample_rate: float = float(os.getenv("LOOP_STACK_SAMPLE_RATE", 1.0))
+
+    # Distinct host label values on crawler metrics before falling back to "other".
+    metrics_max_hosts: int = int(os.getenv("METRICS_MAX_HOSTS", 50))
     
     class Config:
         env_file = ".env"
@@ -1,38 +1,36 @@
 import asyncio
 import json
-from urllib.parse import urljoin, urlparse, parse_qs
+import time
+from urllib.parse import urljoin, urlparse
 from aiohttp import ClientSession, ClientTimeout
 from bs4 import BeautifulSoup
-from app.kafka_client import get_kafka_producer
+from app.kafka_client import get_kafka_producer, get_kafka_consumer
+from app.dedup import extract_platform_id, filter_crawled, mark_crawled, KNOWN_VIDEO_HOSTS
 from app.config import settings
+from app.metrics import (
+    host_label,
+    observe_since,
+    record_consumer_lag,
+    PAGES_FETCHED,
+    FETCH_SECONDS,
+    LINKS_PER_PAGE,
+    FRONTIER_QUEUED,
+    CRAWL_WORKERS_BUSY,
+    KAFKA_PRODUCE_SECONDS,
+)
 from loguru import logger
 
+# Status counters reported by /status (the gauges carry the same values).
+busy_workers = 0
+urls_processed = 0
+
 VIDEO_EXTENSIONS = (".mp4", ".webm", ".mkv", ".avi")
 
 async def is_valid_video_url(url: str) -> bool:
-    parsed = urlparse(url)
-    netloc = parsed.netloc.lower()
-    path = parsed.path.lower()
-    query = parse_qs(parsed.query)
-
-
-    if "youtube.com" in netloc:
-        if "/watch" in path and "v" in query and query["v"]:
-            return True
-        if path.startswith("/embed/"):
-            return True
-        return False
-    if "youtu.be" in netloc:
+    if extract_platform_id(url):
         return True
-    if "vimeo.com" in netloc:
-        parts = path.lstrip("/").split("/")
-        if parts and parts[0].isdigit():
-            return True
-        return False
-    for ext in VIDEO_EXTENSIONS:
-        if url.lower().endswith(ext):
-            return True
-    return False
+    path = urlparse(url).path.lower()
+    return path.endswith(VIDEO_EXTENSIONS)
 
 def parse_video_links(html: str, base_url: str = None) -> list:
     soup = BeautifulSoup(html, "lxml")
@@ -53,7 +51,7 @@ def parse_video_links(html: str, base_url: str = None) -> list:
         src = embed.get("src")
         if src:
             links.add(urljoin(base_url, src) if base_url else src)
-    known_video_providers = ["youtube.com", "youtu.be", "vimeo.com"]
+    known_video_providers = KNOWN_VIDEO_HOSTS
     for a in soup.find_all("a", href=True):
         href = a["href"]
         full_href = urljoin(base_url, href) if base_url else href
@@ -75,14 +73,19 @@ async def filter_valid_links(links: list) -> list:
 
 async def fetch_page(url: str, session: ClientSession) -> str:
     headers = {"User-Agent": settings.user_agent}
+    started = time.perf_counter()
     try:
         async with session.get(url, headers=headers, timeout=ClientTimeout(total=30)) as response:
             response.raise_for_status()
             html = await response.text()
             logger.info(f"Fetched page: {url}")
+            observe_since(FETCH_SECONDS, started, "ok")
+            PAGES_FETCHED.labels(host_label(url), "ok").inc()
             return html
     except Exception as e:
         logger.error(f"Error fetching {url}: {e}")
+        observe_since(FETCH_SECONDS, started, "error")
+        PAGES_FETCHED.labels(host_label(url), "error").inc()
         return ""
 
 async def process_url(url: str, session: ClientSession):
@@ -100,6 +103,7 @@ async def process_url(url: str, session: ClientSession):
             return
         raw_links = parse_video_links(html, base_url=url)
         video_links = await filter_valid_links(raw_links)
+        LINKS_PER_PAGE.observe(len(video_links))
 
     if not video_links:
         logger.info(f"No valid video links found on {url}")
@@ -112,31 +116,154 @@ async def process_url(url: str, session: ClientSession):
             "video_url": video_url,
             "analysis_type": "crawled"
         }
+        started = time.perf_counter()
         await producer.send_and_wait(
             topic=settings.kafka_video_download_topic,
             value=json.dumps(message).encode("utf-8")
         )
+        observe_since(KAFKA_PRODUCE_SECONDS, started, settings.kafka_video_download_topic)
         logger.info(f"Produced video download task for {video_url}")
 
-async def crawl_worker(url_queue: asyncio.Queue):
+# Long-lived crawl frontier: URLs submitted to the service are crawled as soon
+# as they arrive by a fixed pool of workers started with the application.
+# Entries are (url, future); the future, when present, resolves once the URL
+# has been processed so Kafka offsets are only committed for finished work.
+frontier: asyncio.Queue = None
+frontier_workers: list = []
+
+async def frontier_worker(queue: asyncio.Queue):
+    global busy_workers, urls_processed
     async with ClientSession() as session:
         while True:
-            url = await url_queue.get()
+            url, done = await queue.get()
+            FRONTIER_QUEUED.dec()
+            busy_workers += 1
+            CRAWL_WORKERS_BUSY.inc()
             try:
                 await process_url(url, session)
             except Exception as e:
                 logger.error(f"Error processing URL {url}: {e}")
             finally:
-                url_queue.task_done()
+                busy_workers -= 1
+                urls_processed += 1
+                CRAWL_WORKERS_BUSY.dec()
+                if done is not None and not done.done():
+                    done.set_result(url)
+                queue.task_done()
 
-async def run_crawlers(urls: list):
-    url_queue = asyncio.Queue()
-    for url in urls:
-        url_queue.put_nowait(url)
-    tasks = []
-    num_workers = min(settings.max_concurrent_crawlers, len(urls))
+def start_frontier(num_workers: int = None):
+    global frontier
+    frontier = asyncio.Queue()
+    num_workers = num_workers or settings.max_concurrent_crawlers
     for _ in range(num_workers):
-        tasks.append(asyncio.create_task(crawl_worker(url_queue)))
-    await url_queue.join()
-    for task in tasks:
+        frontier_workers.append(asyncio.create_task(frontier_worker(frontier)))
+    logger.info(f"Crawl frontier started with {num_workers} workers")
+
+async def stop_frontier():
+    for task in frontier_workers:
         task.cancel()
+    await asyncio.gather(*frontier_workers, return_exceptions=True)
+    frontier_workers.clear()
+
+def enqueue_urls(urls: list) -> list:
+    """
+    Queues URLs on the frontier and returns one future per URL that resolves
+    when the URL has been crawled.
+    """
+    if frontier is None:
+        raise RuntimeError("Crawl frontier is not running")
+    loop = asyncio.get_running_loop()
+    futures = []
+    for url in urls:
+        done = loop.create_future()
+        frontier.put_nowait((url, done))
+        futures.append(done)
+    FRONTIER_QUEUED.inc(len(urls))
+    return futures
+
+async def wait_paused(consumer, futures: list):
+    """
+    Waits for the crawl futures of a fetched batch with the consumer's
+    partitions paused. Polling continues every second, so the consumer stays
+    within max_poll_interval_ms and keeps its partitions however long the
+    frontier takes, but no new records are taken meanwhile.
+    """
+    batch = asyncio.gather(*futures)
+    try:
+        while True:
+            # Re-pause on every round: a rebalance may have assigned new partitions.
+            consumer.pause(*consumer.assignment())
+            done, _ = await asyncio.wait({batch}, timeout=1.0)
+            if done:
+                return batch.result()
+            records = await consumer.getmany(timeout_ms=0)
+            for tp, partition_records in records.items():
+                # Fetched before the pause took effect; read them again later.
+                if partition_records:
+                    consumer.seek(tp, partition_records[0].offset)
+    finally:
+        if not batch.done():
+            batch.cancel()
+        consumer.resume(*consumer.assignment())
+
+async def crawl_task_consumer():
+    """
+    Feeds the frontier from the crawl-tasks topic. Offsets are committed
+    manually once every URL of a fetched batch has been crawled, so work is
+    not lost across restarts and replicas in the same consumer group split
+    the topic by partition. If the consumer fails (broker restart, commit
+    after a rebalance, ...) it is recreated with backoff; the uncommitted
+    batch is then delivered again. URLs crawled within
+    crawl_task_dedup_ttl_seconds are skipped, so tasks that discovery
+    delivered twice are crawled once.
+    """
+    backoff = 1.0
+    while True:
+        consumer = None
+        try:
+            consumer = await get_kafka_consumer(
+                settings.kafka_crawl_topic, group_id=settings.kafka_crawl_group, enable_auto_commit=False
+            )
+            while True:
+                records = await consumer.getmany(timeout_ms=1000, max_records=settings.kafka_crawl_batch)
+                urls = []
+                for tp, partition_records in records.items():
+                    if partition_records:
+                        record_consumer_lag(consumer, tp.topic, tp.partition, partition_records[-1].offset)
+                    for record in partition_records:
+                        try:
+                            message = json.loads(record.value.decode("utf-8"))
+                        except (ValueError, UnicodeDecodeError) as e:
+                            logger.error(f"Skipping malformed crawl task at offset {record.offset}: {e}")
+                            continue
+                        urls.extend(message.get("urls") or [message.get("url")])
+                urls = [u for u in urls if u]
+                fresh = await filter_crawled(urls)
+                if urls:
+                    logger.info(
+                        f"Received {len(urls)} URLs from {settings.kafka_crawl_topic} "
+                        f"({len(urls) - len(fresh)} already crawled)"
+                    )
+                if fresh:
+                    await wait_paused(consumer, enqueue_urls(fresh))
+                    # Marked once crawled, so a batch redelivered after a
+                    # failure is still crawled in full.
+                    await mark_crawled(fresh)
+                if records:
+                    await consumer.commit()
+                backoff = 1.0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in crawl_task_consumer, reconnecting in {backoff:.0f}s: {e}")
+        finally:
+            if consumer is not None:
+                try:
+                    await consumer.stop()
+                except Exception as e:
+                    logger.warning(f"Failed to stop crawl task consumer: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60.0)
+
+def frontier_size() -> int:
+    return frontier.qsize() if frontier is not None else 0
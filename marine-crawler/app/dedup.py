@@ -0,0 +1,204 @@
+import re
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+import httpx
+from app.config import settings
+from app.storage.redis_utils import claim_key, release_key, keys_exist, set_keys
+from loguru import logger
+
+SEEN_KEY_PREFIX = "seen:video:"
+CRAWLED_KEY_PREFIX = "seen:crawl:"
+
+# Click and campaign tracking parameters, dropped from every URL: they never
+# change which video a URL points to.
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "ref_src",
+}
+TRACKING_PREFIXES = ("utm_",)
+# Player and share parameters of the video platforms (t, list, index, si,
+# feature, ...) need no list of their own: extract_platform_id keeps only the
+# video id for those URLs. Elsewhere such names (index, list, start, t) often
+# select the video, so they are kept.
+
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+def _first_path_part(path: str, after: str = "") -> Optional[str]:
+    path = path.strip("/")
+    if after:
+        if not path.startswith(after + "/"):
+            return None
+        path = path[len(after) + 1:]
+    return path.split("/")[0] if path else None
+
+def _youtube_id(netloc: str, path: str, query: dict) -> Optional[str]:
+    if netloc.endswith("youtu.be"):
+        candidate = _first_path_part(path)
+    elif path.startswith("/watch"):
+        candidate = query.get("v", [None])[0]
+    else:
+        candidate = None
+        for prefix in ("embed", "shorts", "live", "v"):
+            candidate = _first_path_part(path, prefix)
+            if candidate:
+                break
+    return candidate if candidate and _YOUTUBE_ID.match(candidate) else None
+
+def _vimeo_id(netloc: str, path: str, query: dict) -> Optional[str]:
+    parts = [p for p in path.split("/") if p]
+    if netloc.startswith("player.") and len(parts) >= 2 and parts[0] == "video":
+        return parts[1] if parts[1].isdigit() else None
+    return parts[0] if parts and parts[0].isdigit() else None
+
+def _dailymotion_id(netloc: str, path: str, query: dict) -> Optional[str]:
+    if netloc.endswith("dai.ly"):
+        candidate = _first_path_part(path)
+    else:
+        candidate = _first_path_part(path, "video") or _first_path_part(path, "embed/video")
+    return candidate.split("_")[0] if candidate else None
+
+# (platform, host suffixes, id extractor, canonical watch URL template)
+PLATFORMS = [
+    ("youtube", ("youtube.com", "youtube-nocookie.com", "youtu.be"), _youtube_id,
+     "https://www.youtube.com/watch?v={id}"),
+    ("vimeo", ("vimeo.com",), _vimeo_id, "https://vimeo.com/{id}"),
+    ("dailymotion", ("dailymotion.com", "dai.ly"), _dailymotion_id,
+     "https://www.dailymotion.com/video/{id}"),
+]
+KNOWN_VIDEO_HOSTS = [host for _, hosts, _, _ in PLATFORMS for host in hosts]
+
+def _host_matches(netloc: str, suffixes: tuple) -> bool:
+    return any(netloc == s or netloc.endswith("." + s) for s in suffixes)
+
+def extract_platform_id(url: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns (platform, video_id) for URLs of known video platforms, covering
+    watch, embed, short-link and player variants of the same video.
+    """
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower().split(":")[0]
+    query = parse_qs(parsed.query)
+    for platform, hosts, extractor, _ in PLATFORMS:
+        if _host_matches(netloc, hosts):
+            video_id = extractor(netloc, parsed.path, query)
+            return (platform, video_id) if video_id else None
+    return None
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of a video URL: platform videos map to their watch URL;
+    other URLs get a lower-case host without www./m., no fragment, no default
+    port and no tracking parameters, with the remaining query sorted.
+    """
+    platform_id = extract_platform_id(url)
+    if platform_id:
+        platform, video_id = platform_id
+        template = next(t for name, _, _, t in PLATFORMS if name == platform)
+        return template.format(id=video_id)
+
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower() or "https"
+    netloc = parsed.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    for prefix in ("www.", "m."):
+        if netloc.startswith(prefix):
+            netloc = netloc[len(prefix):]
+    query = sorted(
+        (key, value)
+        for key, values in parse_qs(parsed.query, keep_blank_values=True).items()
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+        for value in values
+    )
+    return urlunparse((scheme, netloc, parsed.path or "/", "", urlencode(query), ""))
+
+def video_key(url: str) -> str:
+    platform_id = extract_platform_id(url)
+    if platform_id:
+        return f"{platform_id[0]}:{platform_id[1]}"
+    return f"url:{canonicalize_url(url)}"
+
+async def probe_content_key(url: str, client: httpx.AsyncClient) -> Optional[str]:
+    """
+    Cheap HEAD request for direct file URLs: the ETag plus Content-Length
+    identifies the same file served from mirrored CDNs. Returns None when the
+    server gives no ETag (length alone is too collision-prone).
+    """
+    try:
+        resp = await client.head(url, follow_redirects=True, timeout=10.0)
+    except httpx.HTTPError as e:
+        logger.debug(f"HEAD probe failed for {url}: {e}")
+        return None
+    etag = resp.headers.get("etag", "").strip().removeprefix("W/").strip('"')
+    length = resp.headers.get("content-length")
+    if resp.status_code >= 400 or not etag or not length:
+        return None
+    return f"content:{etag}:{length}"
+
+async def _claim(key: str) -> bool:
+    try:
+        return await claim_key(SEEN_KEY_PREFIX + key, settings.dedup_ttl_seconds)
+    except Exception as e:
+        # Never drop work because Redis is unavailable.
+        logger.warning(f"Dedup check unavailable for {key}: {e}")
+        return True
+
+async def _release(key: str):
+    try:
+        await release_key(SEEN_KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning(f"Failed to release dedup key {key}: {e}")
+
+async def claim_video(url: str, client: httpx.AsyncClient = None) -> Optional[list]:
+    """
+    Atomically marks a video as seen. Returns the claimed keys, or None when
+    the video (by URL/platform id, or by remote content probe) was already seen
+    within dedup_ttl_seconds and should be skipped.
+    """
+    key = video_key(url)
+    if not await _claim(key):
+        logger.info(f"Skipping already seen video {url} ({key})")
+        return None
+    claimed = [key]
+    if settings.dedup_probe_remote and client is not None and extract_platform_id(url) is None:
+        content_key = await probe_content_key(url, client)
+        if content_key:
+            if not await _claim(content_key):
+                logger.info(f"Skipping video {url}: same content as an already seen file ({content_key})")
+                return None
+            claimed.append(content_key)
+    return claimed
+
+async def release_video(keys: list):
+    """
+    Forgets claimed keys so a video whose processing failed can be retried.
+    """
+    for key in keys:
+        await _release(key)
+
+async def filter_crawled(urls: list) -> list:
+    """
+    Drops repeated URLs (by canonical form) and URLs whose page was crawled
+    within crawl_task_dedup_ttl_seconds (see mark_crawled).
+    """
+    unique = {}
+    for url in urls:
+        unique.setdefault(canonicalize_url(url), url)
+    if not unique:
+        return []
+    try:
+        crawled = await keys_exist([CRAWLED_KEY_PREFIX + key for key in unique])
+    except Exception as e:
+        # Never drop work because Redis is unavailable.
+        logger.warning(f"Crawl task dedup unavailable: {e}")
+        crawled = [False] * len(unique)
+    return [url for url, seen in zip(unique.values(), crawled) if not seen]
+
+async def mark_crawled(urls: list):
+    if not urls:
+        return
+    try:
+        await set_keys(
+            [CRAWLED_KEY_PREFIX + canonicalize_url(url) for url in urls], settings.crawl_task_dedup_ttl_seconds
+        )
+    except Exception as e:
+        logger.warning(f"Failed to mark {len(urls)} URLs as crawled: {e}")
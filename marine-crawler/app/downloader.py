@@ -4,14 +4,31 @@ import shlex
 import json
 import platform
 import glob
-from urllib.parse import urlparse, parse_qs
-import httpx
+import shutil
+import tempfile
+import time
+from urllib.parse import urlparse
 from aiokafka import AIOKafkaConsumer
 from app.kafka_client import get_kafka_producer, get_kafka_consumer
+from app.uploader import get_http_client, upload_chunk, upload_chunks, trigger_analysis
+from app.dedup import canonicalize_url, extract_platform_id, claim_video, release_video
 from app.config import settings
+from app.metrics import (
+    observe_exit,
+    record_consumer_lag,
+    VIDEOS_PROCESSED,
+    DOWNLOADS_ACTIVE,
+    TOOL_SECONDS,
+    BYTES_DOWNLOADED,
+)
 from loguru import logger
 
+# Status reported by /status (the gauges carry the same values).
+active_downloads = 0
+consumer_lag: dict = {}
+
 MIN_VIDEO_SIZE = 1024
+PIPE_READ_SIZE = 64 * 1024
 
 def shell_quote(arg: str) -> str:
     if platform.system() == "Windows":
@@ -27,7 +44,244 @@ async def run_command(cmd: str, stdin=None):
     )
     return process
 
+def cookies_args() -> list:
+    cookies_file = os.path.join(os.getcwd(), "cookies.json")
+    return ["--cookies", cookies_file] if os.path.exists(cookies_file) else []
+
+async def download_and_upload(video_url: str, video_id: str, work_dir: str) -> bool:
+    """
+    File mode: download the whole video, segment it with a second ffmpeg pass,
+    then upload every chunk. Everything is written inside work_dir.
+    """
+    video_template = os.path.join(work_dir, f"{video_id}.%(ext)s")
+    cookies_arg = " ".join(shell_quote(a) for a in cookies_args())
+
+    yt_dlp_cmd = f"yt-dlp {cookies_arg} -f best -o {shell_quote(video_template)} {shell_quote(video_url)}"
+    logger.info(f"Running yt-dlp command: {yt_dlp_cmd}")
+    started = time.perf_counter()
+    proc = await run_command(yt_dlp_cmd)
+    stdout, stderr = await proc.communicate()
+    TOOL_SECONDS.labels("yt-dlp", "file").observe(time.perf_counter() - started)
+    if proc.returncode != 0:
+        logger.error(f"yt-dlp failed: {stderr.decode('utf-8')}")
+        return False
+
+    # yt-dlp has exited, so the file is complete; no need to wait for it.
+    matching_files = glob.glob(os.path.join(work_dir, f"{video_id}.*"))
+    if not matching_files:
+        logger.error(f"Downloaded video file is missing for video_id '{video_id}'")
+        return False
+
+    video_file = matching_files[0]
+    file_size = os.path.getsize(video_file)
+    logger.info(f"Downloaded video file: {video_file}, size: {file_size} bytes")
+    BYTES_DOWNLOADED.labels("file").inc(file_size)
+    if file_size < MIN_VIDEO_SIZE:
+        logger.warning("Downloaded video file is too small; sending as a raw chunk.")
+        return await upload_chunk(video_id, 0, 1, video_file) is not None
+
+    output_pattern = os.path.join(work_dir, f"{video_id}_chunk_%03d.mp4")
+    ffmpeg_cmd = (
+        f"ffmpeg -hide_banner -loglevel error -i {shell_quote(video_file)} "
+        f"-c copy -map 0 -f segment -segment_time {settings.segment_duration} "
+        f"-reset_timestamps 1 {shell_quote(output_pattern)}"
+    )
+    logger.info(f"Running ffmpeg command: {ffmpeg_cmd}")
+    started = time.perf_counter()
+    proc_ffmpeg = await run_command(ffmpeg_cmd)
+    stdout_ff, stderr_ff = await proc_ffmpeg.communicate()
+    TOOL_SECONDS.labels("ffmpeg", "file").observe(time.perf_counter() - started)
+    if proc_ffmpeg.returncode != 0:
+        logger.error(f"ffmpeg failed: {stderr_ff.decode('utf-8')}")
+        return False
+    # The full download is no longer needed once it has been segmented.
+    os.remove(video_file)
+
+    chunk_files = sorted(glob.glob(os.path.join(work_dir, f"{video_id}_chunk_*.mp4")))
+    if not chunk_files:
+        logger.error("No video chunks produced, skipping further processing.")
+        return False
+
+    total_chunks = len(chunk_files)
+    logger.info(f"Found {total_chunks} chunks for video {video_id}")
+
+    # Send the chunks to the AI microservice, then trigger matching.
+    if not await upload_chunks(video_id, chunk_files):
+        logger.error(f"Skipping analysis for video {video_id}: not all chunks were uploaded.")
+        return False
+    await trigger_analysis(video_id, total_chunks)
+    return True
+
+async def stream_download_and_upload(video_url: str, video_id: str, work_dir: str):
+    """
+    Streaming mode: yt-dlp writes to stdout, ffmpeg segments from stdin and
+    reports every finished segment on its stdout (-segment_list pipe:1). Each
+    segment is uploaded as soon as it closes and deleted right after, and the
+    relay between the two processes pauses while stream_max_pending_chunks
+    segments are waiting, so disk usage stays bounded.
+
+    With progressive_analysis enabled every chunk is matched on arrival; once
+    the analysis service reports a confident match or non-match the download
+    is aborted and only the chunks sent so far are analysed.
+
+    Returns True/False for success/failure once any segment was produced, or
+    None when the source could not be streamed at all (caller falls back to
+    file mode).
+    """
+    output_pattern = os.path.join(work_dir, f"{video_id}_chunk_%05d.mp4")
+    yt_dlp_args = ["yt-dlp", *cookies_args(), "-f", "best", "-o", "-", "--quiet", video_url]
+    ffmpeg_args = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+        "-c", "copy", "-map", "0", "-f", "segment",
+        "-segment_time", str(settings.segment_duration), "-reset_timestamps", "1",
+        "-segment_list", "pipe:1", "-segment_list_type", "flat",
+        output_pattern,
+    ]
+    logger.info(f"Streaming {video_url} through ffmpeg segmenter into {work_dir}")
+    started = time.perf_counter()
+    yt_dlp = await asyncio.create_subprocess_exec(
+        *yt_dlp_args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    ffmpeg = await asyncio.create_subprocess_exec(
+        *ffmpeg_args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    tool_timers = [
+        asyncio.create_task(observe_exit(yt_dlp, "yt-dlp", "stream", started)),
+        asyncio.create_task(observe_exit(ffmpeg, "ffmpeg", "stream", started)),
+    ]
+
+    pending = 0
+    slot_freed = asyncio.Condition()
+    upload_slots = asyncio.Semaphore(settings.chunk_upload_concurrency)
+    upload_tasks = []
+    failed_chunks = []
+    uploaded_chunks = []
+    abort = asyncio.Event()
+
+    async def relay():
+        try:
+            while not abort.is_set():
+                async with slot_freed:
+                    await slot_freed.wait_for(
+                        lambda: pending < settings.stream_max_pending_chunks or abort.is_set()
+                    )
+                if abort.is_set():
+                    break
+                data = await yt_dlp.stdout.read(PIPE_READ_SIZE)
+                if not data:
+                    break
+                BYTES_DOWNLOADED.labels("stream").inc(len(data))
+                ffmpeg.stdin.write(data)
+                await ffmpeg.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"ffmpeg closed its input early for video {video_id}")
+        finally:
+            if abort.is_set() and yt_dlp.returncode is None:
+                yt_dlp.kill()
+            ffmpeg.stdin.close()
+
+    async def upload_segment(chunk_index: int, chunk_path: str):
+        nonlocal pending
+        try:
+            async with upload_slots:
+                if abort.is_set():
+                    return
+                # total_chunks is unknown while streaming; /analyze supplies it.
+                reply = await upload_chunk(
+                    video_id, chunk_index, 0, chunk_path, progressive=settings.progressive_analysis
+                )
+                if reply is None:
+                    failed_chunks.append(chunk_index)
+                    return
+                uploaded_chunks.append(chunk_index)
+                decision = reply.get("decision", "continue")
+                if decision != "continue" and not abort.is_set():
+                    logger.info(
+                        f"Analysis returned '{decision}' for video {video_id} after chunk {chunk_index}; "
+                        f"aborting download"
+                    )
+                    abort.set()
+                    async with slot_freed:
+                        slot_freed.notify_all()
+        finally:
+            try:
+                os.remove(chunk_path)
+            except OSError:
+                pass
+            async with slot_freed:
+                pending -= 1
+                slot_freed.notify_all()
+
+    async def collect_segments():
+        nonlocal pending
+        chunk_index = 0
+        while True:
+            line = await ffmpeg.stdout.readline()
+            if not line:
+                break
+            name = line.decode("utf-8").strip()
+            if not name:
+                continue
+            async with slot_freed:
+                pending += 1
+            if chunk_index == 0:
+                logger.info(f"First chunk of video {video_id} ready: {name}")
+            upload_tasks.append(
+                asyncio.create_task(upload_segment(chunk_index, os.path.join(work_dir, name)))
+            )
+            chunk_index += 1
+        return chunk_index
+
+    relay_task = asyncio.create_task(relay())
+    try:
+        total_chunks = await collect_segments()
+        await relay_task
+        await asyncio.gather(*upload_tasks)
+        _, yt_dlp_err = await yt_dlp.communicate()
+        _, ffmpeg_err = await ffmpeg.communicate()
+    finally:
+        relay_task.cancel()
+        for proc in (yt_dlp, ffmpeg):
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        await asyncio.gather(*tool_timers, return_exceptions=True)
+
+    if total_chunks == 0:
+        logger.warning(
+            f"Streaming produced no chunks for video {video_id} "
+            f"(yt-dlp: {yt_dlp_err.decode('utf-8', 'ignore').strip()}, "
+            f"ffmpeg: {ffmpeg_err.decode('utf-8', 'ignore').strip()})"
+        )
+        return None
+    if abort.is_set():
+        # Chunks are stored by index, so only a gap-free prefix can be analysed.
+        uploaded = set(uploaded_chunks)
+        total_chunks = 0
+        while total_chunks in uploaded:
+            total_chunks += 1
+        logger.info(f"Download of video {video_id} stopped early; analysing the first {total_chunks} chunks")
+        await trigger_analysis(video_id, total_chunks)
+        return True
+    if yt_dlp.returncode != 0 or ffmpeg.returncode != 0:
+        logger.error(
+            f"Streaming pipeline failed for video {video_id} after {total_chunks} chunks "
+            f"(yt-dlp exit {yt_dlp.returncode}, ffmpeg exit {ffmpeg.returncode})"
+        )
+        return False
+    if failed_chunks:
+        logger.error(f"Skipping analysis for video {video_id}: chunks {sorted(failed_chunks)} were not uploaded.")
+        return False
+
+    logger.info(f"Streamed {total_chunks} chunks for video {video_id}")
+    await trigger_analysis(video_id, total_chunks)
+    return True
+
 async def process_video_task(message_value: bytes):
+    global active_downloads
     try:
         msg = json.loads(message_value.decode("utf-8"))
         video_url = msg.get("video_url")
@@ -35,20 +289,22 @@ async def process_video_task(message_value: bytes):
             logger.error("No video_url found in the message")
             return
 
-        # Normalize YouTube embed URLs to standard watch URLs.
-        if "youtube.com/embed/" in video_url:
-            video_url = video_url.replace("youtube.com/embed/", "youtube.com/watch?v=")
-
-        # Derive a filename-friendly video identifier.
-        parsed_url = urlparse(video_url)
-        if "youtube.com" in parsed_url.netloc or "youtu.be" in parsed_url.netloc:
-            query = parse_qs(parsed_url.query)
-            if "v" in query and query["v"]:
-                video_id = query["v"][0]
-            else:
-                video_id = os.path.basename(parsed_url.path)
+        # Platform videos are fetched from their canonical watch URL (embed and
+        # short-link variants collapse to it) and named by their platform id.
+        # Other URLs are downloaded as given; dedup still uses their canonical form.
+        platform_id = extract_platform_id(video_url)
+        if platform_id:
+            video_url = canonicalize_url(video_url)
+            video_id = platform_id[1]
         else:
-            video_id = os.path.basename(video_url).split("?")[0] or "video"
+            video_id = os.path.basename(urlparse(video_url).path) or "video"
+
+        claimed = []
+        if settings.dedup_enabled:
+            claimed = await claim_video(video_url, get_http_client())
+            if claimed is None:
+                VIDEOS_PROCESSED.labels("duplicate").inc()
+                return
 
         logger.info(f"Processing video: {video_url}")
 
@@ -57,82 +313,27 @@ async def process_video_task(message_value: bytes):
             os.makedirs(downloads_dir)
             logger.info(f"Created downloads directory: {downloads_dir}")
 
-        video_template = os.path.join(downloads_dir, f"{video_id}.%(ext)s")
-
-        cookies_file = os.path.join(os.getcwd(), "cookies.json")
-        cookies_arg = f"--cookies {shell_quote(cookies_file)}" if os.path.exists(cookies_file) else ""
-
-        yt_dlp_cmd = f"yt-dlp {cookies_arg} -f best -o {shell_quote(video_template)} {shell_quote(video_url)}"
-        logger.info(f"Running yt-dlp command: {yt_dlp_cmd}")
-        proc = await run_command(yt_dlp_cmd)
-        stdout, stderr = await proc.communicate()
-        if proc.returncode != 0:
-            logger.error(f"yt-dlp failed: {stderr.decode('utf-8')}")
-            return
-
-        await asyncio.sleep(2)
-        matching_files = glob.glob(os.path.join(downloads_dir, f"{video_id}.*"))
-        if not matching_files:
-            logger.error(f"Downloaded video file is missing for video_id '{video_id}'")
-            return
-
-        video_file = matching_files[0]
-        file_size = os.path.getsize(video_file)
-        logger.info(f"Downloaded video file: {video_file}, size: {file_size} bytes")
-        if file_size < MIN_VIDEO_SIZE:
-            logger.warning("Downloaded video file is too small; sending as a raw chunk.")
-            async with httpx.AsyncClient() as client:
-                with open(video_file, "rb") as f:
-                    chunk_data = f.read()
-                data = {"video_id": video_id, "chunk_index": 0, "total_chunks": 1}
-                files = {"video_chunk": (f"{video_id}.mp4", chunk_data, "video/mp4")}
-                resp = await client.post(f"{settings.AI_MICROSERVICE_URL}/upload-video-chunk", data=data, files=files)
-                logger.info(f"Sent raw chunk for video {video_id} (status: {resp.status_code})")
-            return
-
-        output_pattern = os.path.join(downloads_dir, f"{video_id}_chunk_%03d.mp4")
-        ffmpeg_cmd = (
-            f"ffmpeg -hide_banner -loglevel error -i {shell_quote(video_file)} "
-            f"-c copy -map 0 -f segment -segment_time {settings.segment_duration} "
-            f"-reset_timestamps 1 {shell_quote(output_pattern)}"
-        )
-        logger.info(f"Running ffmpeg command: {ffmpeg_cmd}")
-        proc_ffmpeg = await run_command(ffmpeg_cmd)
-        stdout_ff, stderr_ff = await proc_ffmpeg.communicate()
-        if proc_ffmpeg.returncode != 0:
-            logger.error(f"ffmpeg failed: {stderr_ff.decode('utf-8')}")
-            return
-
-        chunk_files = sorted([
-            os.path.join(downloads_dir, f) for f in os.listdir(downloads_dir)
-            if f.startswith(f"{video_id}_chunk_") and f.endswith(".mp4")
-        ])
-        if not chunk_files:
-            logger.error("No video chunks produced, skipping further processing.")
-            return
-
-        total_chunks = len(chunk_files)
-        logger.info(f"Found {total_chunks} chunks for video {video_id}")
-
-        # Send each chunk to the AI microservice.
-        async with httpx.AsyncClient() as client:
-            for idx, chunk_file in enumerate(chunk_files):
-                with open(chunk_file, "rb") as f:
-                    chunk_data = f.read()
-                data = {
-                    "video_id": video_id,
-                    "chunk_index": idx,
-                    "total_chunks": total_chunks
-                }
-                files = {"video_chunk": (f"chunk_{idx}.mp4", chunk_data, "video/mp4")}
-                resp = await client.post(f"{settings.AI_MICROSERVICE_URL}/upload-video-chunk", data=data, files=files)
-                logger.info(f"Sent chunk {idx} for video {video_id} (status: {resp.status_code})")
-
-            # After all chunks are sent, trigger matching.
-            match_data = {"video_id": video_id, "total_chunks": total_chunks}
-            resp = await client.post(f"{settings.AI_MICROSERVICE_URL}/analyze", data=match_data)
-            logger.info(f"Triggered match processing for video {video_id} (status: {resp.status_code})")
-            logger.info(f"Match response: {resp.text}")
+        # Each task gets its own scratch directory, removed when the task ends.
+        work_dir = tempfile.mkdtemp(prefix=f"{video_id}_", dir=downloads_dir)
+        succeeded = False
+        active_downloads += 1
+        DOWNLOADS_ACTIVE.inc()
+        try:
+            streamed = None
+            if settings.streaming_download:
+                streamed = await stream_download_and_upload(video_url, video_id, work_dir)
+            if streamed is None:
+                succeeded = await download_and_upload(video_url, video_id, work_dir)
+            else:
+                succeeded = streamed
+        finally:
+            active_downloads -= 1
+            DOWNLOADS_ACTIVE.dec()
+            VIDEOS_PROCESSED.labels("succeeded" if succeeded else "failed").inc()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if not succeeded:
+                # Let a later crawl retry a video we failed to process.
+                await release_video(claimed)
 
     except Exception as e:
         logger.error(f"Error processing video task: {e}")
@@ -142,6 +343,7 @@ async def video_downloader_worker():
     try:
         async for msg in consumer:
             logger.info(f"Received video download task: {msg.value}")
+            consumer_lag[msg.partition] = record_consumer_lag(consumer, msg.topic, msg.partition, msg.offset)
             await process_video_task(msg.value)
     except Exception as e:
         logger.error(f"Error in video_downloader_worker: {e}")
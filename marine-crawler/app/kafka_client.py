@@ -45,13 +45,14 @@ async def close_kafka_producer():
         await producer.stop()
         logger.info("Kafka producer stopped")
 
-async def get_kafka_consumer(topic: str, group_id: str) -> AIOKafkaConsumer:
+async def get_kafka_consumer(topic: str, group_id: str, enable_auto_commit: bool = True) -> AIOKafkaConsumer:
     await ensure_topic(topic)
     consumer = AIOKafkaConsumer(
         topic,
         bootstrap_servers=settings.kafka_bootstrap_servers,
         group_id=group_id,
-        auto_offset_reset="earliest"
+        auto_offset_reset="earliest",
+        enable_auto_commit=enable_auto_commit
     )
     await consumer.start()
     logger.info(f"Kafka consumer started for topic '{topic}'")
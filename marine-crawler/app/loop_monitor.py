@@ -0,0 +1,117 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from loguru import logger
+
+from app.config import settings
+from app.metrics import EVENT_LOOP_LAG, EVENT_LOOP_BLOCKED
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and reports calls that block the loop.
+
+    A probe task sleeps `interval` seconds and records how late it wakes up
+    (EVENT_LOOP_LAG). A watchdog thread watches the probe's heartbeat: once
+    the loop has not run the probe for `threshold` seconds it captures the
+    loop thread's stack, which points at the blocking call while it is still
+    running. `stack_sample_rate` is the fraction of blocking events whose
+    stack is captured and logged; all of them are counted.
+    """
+    def __init__(self, interval: float, threshold: float, stack_sample_rate: float, keep: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_sample_rate = stack_sample_rate
+        self.blocks = deque(maxlen=keep)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._pending: Optional[dict] = None
+        self._loop_thread: Optional[int] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._probe_task is not None and not self._probe_task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._probe_task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event-loop monitor started (interval {self.interval}s, threshold {self.threshold}s)")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._probe_task:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def _probe(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - started - self.interval, 0.0)
+            self._beat = now
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG.observe(lag)
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                # The watchdog only saw a lower bound; now the loop is back we know the total.
+                pending["blocked_seconds"] = round(lag, 3)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            EVENT_LOOP_BLOCKED.inc()
+            stack = None
+            if random.random() < self.stack_sample_rate:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    stack = "".join(traceback.format_stack(frame, limit=25))
+            block = {"detected_at": time.time(), "blocked_seconds": round(stalled, 3), "stack": stack}
+            self.blocks.append(block)
+            self._pending = block
+            if stack:
+                logger.warning(f"Event loop blocked for {stalled:.3f}s+; loop thread stack:\n{stack}")
+            else:
+                logger.warning(f"Event loop blocked for {stalled:.3f}s+")
+
+    def snapshot(self, stacks: bool = True) -> dict:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "recent_blocks": [
+                block if stacks else {k: v for k, v in block.items() if k != "stack"}
+                for block in reversed(self.blocks)
+            ],
+        }
+
+loop_monitor = LoopMonitor(
+    settings.loop_monitor_interval, settings.loop_block_threshold, settings.loop_stack_sample_rate
+)
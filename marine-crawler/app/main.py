@@ -1,59 +1,126 @@
 import os
+import time
 import asyncio
 from contextlib import asynccontextmanager
+from typing import List
 
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 import uvicorn
 
-from app.crawler import run_crawlers
+from app import crawler, downloader
+from app.crawler import start_frontier, stop_frontier, enqueue_urls, frontier_size, crawl_task_consumer
 from app.downloader import video_downloader_worker
 from app.kafka_client import close_kafka_producer
+from app.uploader import close_http_client
+from app.storage.redis_utils import close_async_redis
+from app.loop_monitor import loop_monitor
 from app.config import settings
 from loguru import logger
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up application...")
+    if settings.loop_monitor:
+        loop_monitor.start()
     if not os.path.exists(settings.FRAMES_DIR):
         os.makedirs(settings.FRAMES_DIR)
         logger.info(f"Created frames directory: {settings.FRAMES_DIR}")
+    start_frontier()
+    crawl_consumer_task = asyncio.create_task(crawl_task_consumer())
+    logger.info(f"Crawl task consumer launched for topic '{settings.kafka_crawl_topic}'.")
     downloader_task = asyncio.create_task(video_downloader_worker())
     logger.info("Video downloader worker launched.")
+    app.state.started_at = time.time()
+    app.state.workers = {"crawl_consumer": crawl_consumer_task, "video_downloader": downloader_task}
     
     yield
     
     logger.info("Shutting down application...")
+    crawl_consumer_task.cancel()
     downloader_task.cancel()
-    try:
-        await downloader_task
-    except asyncio.CancelledError:
-        logger.info("Video downloader worker task cancelled.")
+    for task in (crawl_consumer_task, downloader_task):
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    logger.info("Crawl task consumer and video downloader worker cancelled.")
+    await stop_frontier()
     await close_kafka_producer()
+    await close_http_client()
+    await close_async_redis()
+    await loop_monitor.stop()
     logger.info("Shutdown complete.")
 
 app = FastAPI(lifespan=lifespan, title="Video Crawler Microservice")
 
-url_list = []
-
 class URLRequest(BaseModel):
     url: str
 
+class URLBatchRequest(BaseModel):
+    urls: List[str]
+
 @app.post("/submit")
 async def submit_url(request: URLRequest):
-    url_list.append(request.url)
+    enqueue_urls([request.url])
     return {"message": f"URL {request.url} submitted for crawling."}
 
+@app.post("/submit-batch")
+async def submit_batch(request: URLBatchRequest):
+    """
+    Accepts many URLs in one request; crawling starts as soon as they are queued.
+    """
+    urls = list(dict.fromkeys(u for u in request.urls if u))
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs submitted.")
+    enqueue_urls(urls)
+    return {"message": f"{len(urls)} URLs submitted for crawling.", "queued": frontier_size()}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: fetch rate and latency per host, links per page, Kafka
+    produce latency and consumer lag, yt-dlp/ffmpeg wall time, bytes downloaded
+    and chunk upload latency.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/status")
+async def status():
+    """
+    Snapshot of the workers and queues of this crawler instance.
+    """
+    workers = getattr(app.state, "workers", {})
+    return {
+        "uptime_seconds": round(time.time() - getattr(app.state, "started_at", time.time()), 1),
+        "workers": {name: ("running" if not task.done() else "stopped") for name, task in workers.items()},
+        "frontier": {
+            "queued": frontier_size(),
+            "workers": len(crawler.frontier_workers),
+            "busy": crawler.busy_workers,
+            "processed": crawler.urls_processed,
+        },
+        "downloader": {
+            "active_downloads": downloader.active_downloads,
+            "consumer_lag": {str(partition): lag for partition, lag in sorted(downloader.consumer_lag.items())},
+        },
+        "event_loop": loop_monitor.snapshot(stacks=False),
+    }
+
+@app.get("/debug/loop")
+async def debug_loop():
+    """
+    Event-loop lag and the most recent blocking events, with the stack of the
+    loop thread captured while it was blocked.
+    """
+    return loop_monitor.snapshot()
+
 @app.get("/start_crawling")
 async def start_crawling():
-    if not url_list:
-        raise HTTPException(status_code=400, detail="No URLs submitted.")
-    urls_to_crawl = url_list.copy()
-    url_list.clear()
-    # Schedule the crawling tasks in the background.
-    asyncio.create_task(run_crawlers(urls_to_crawl))
-    return {"message": f"Started crawling {len(urls_to_crawl)} URLs."}
+    # Kept for older callers: submitted URLs are now crawled on arrival.
+    return {"message": f"Crawling runs continuously; {frontier_size()} URLs queued."}
 
 @app.on_event("shutdown")
 async def shutdown_event():
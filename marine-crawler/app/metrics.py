@@ -0,0 +1,79 @@
+import time
+from urllib.parse import urlparse
+from aiokafka import TopicPartition
+from prometheus_client import Counter, Gauge, Histogram
+from app.config import settings
+
+# Host labels are capped at metrics_max_hosts distinct values (the rest are
+# reported as "other") so crawling the open web cannot explode the series count.
+_host_labels: set = set()
+
+def host_label(url: str) -> str:
+    host = urlparse(url).netloc.lower().split(":")[0]
+    if host.startswith("www."):
+        host = host[4:]
+    if host in _host_labels:
+        return host
+    if len(_host_labels) < settings.metrics_max_hosts:
+        _host_labels.add(host)
+        return host
+    return "other"
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOOL_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+# Crawling
+PAGES_FETCHED = Counter("crawler_pages_fetched_total", "Pages fetched", ["host", "result"])
+FETCH_SECONDS = Histogram("crawler_fetch_seconds", "Page fetch latency", ["result"], buckets=LATENCY_BUCKETS)
+LINKS_PER_PAGE = Histogram(
+    "crawler_links_per_page", "Valid video links extracted per fetched page",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+FRONTIER_QUEUED = Gauge("crawler_frontier_queued", "URLs waiting in the crawl frontier")
+CRAWL_WORKERS_BUSY = Gauge("crawler_workers_busy", "Frontier workers currently processing a URL")
+
+# Kafka
+KAFKA_PRODUCE_SECONDS = Histogram(
+    "crawler_kafka_produce_seconds", "Latency of acknowledged Kafka produces", ["topic"], buckets=LATENCY_BUCKETS
+)
+CONSUMER_LAG = Gauge("crawler_consumer_lag", "Records behind the partition high-water mark", ["topic", "partition"])
+
+# Downloading and uploading
+VIDEOS_PROCESSED = Counter("crawler_videos_total", "Video download tasks by outcome", ["result"])
+DOWNLOADS_ACTIVE = Gauge("crawler_downloads_active", "Video download tasks in progress")
+TOOL_SECONDS = Histogram(
+    "crawler_tool_seconds", "Wall time of yt-dlp / ffmpeg per video", ["tool", "mode"], buckets=TOOL_BUCKETS
+)
+BYTES_DOWNLOADED = Counter("crawler_bytes_downloaded_total", "Video bytes downloaded", ["mode"])
+CHUNK_UPLOAD_SECONDS = Histogram(
+    "crawler_chunk_upload_seconds", "Chunk upload latency to the analysis service (per attempt)",
+    ["result"], buckets=LATENCY_BUCKETS,
+)
+
+# Event loop (see app/loop_monitor.py)
+EVENT_LOOP_LAG = Histogram(
+    "crawler_event_loop_lag_seconds", "How late the event-loop probe woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "crawler_event_loop_blocked_total", "Times the event loop was blocked beyond loop_block_threshold"
+)
+
+def observe_since(histogram, started: float, *labels):
+    histogram.labels(*labels).observe(time.perf_counter() - started)
+
+async def observe_exit(process, tool: str, mode: str, started: float):
+    """
+    Waits for a subprocess and records its wall time since `started`.
+    """
+    await process.wait()
+    TOOL_SECONDS.labels(tool, mode).observe(time.perf_counter() - started)
+
+def record_consumer_lag(consumer, topic: str, partition: int, offset: int) -> int:
+    """
+    Lag after consuming `offset`: records between it and the high-water mark.
+    """
+    highwater = consumer.highwater(TopicPartition(topic, partition))
+    lag = max(highwater - offset - 1, 0) if highwater is not None else 0
+    CONSUMER_LAG.labels(topic, str(partition)).set(lag)
+    return lag
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 import json
 from app.config import settings
 
@@ -6,7 +7,19 @@ redis_client = redis.Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     db=settings.REDIS_DB,
-    decode_responses=True
+    decode_responses=True,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
+
+# Used from the crawler's event loop (dedup claims in the downloader).
+async_redis_client = aioredis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    decode_responses=True,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
 )
 
 def store_phashes(key: str, phashes: list):
@@ -20,3 +33,23 @@ def get_phashes(key: str) -> list:
     phash_strs = json.loads(data)
     import imagehash
     return [imagehash.hex_to_hash(ph_str) for ph_str in phash_strs]
+
+async def claim_key(key: str, ttl: int) -> bool:
+    """Sets key only if it does not exist yet; returns True if this call created it."""
+    return bool(await async_redis_client.set(key, "1", nx=True, ex=ttl))
+
+async def release_key(key: str):
+    await async_redis_client.delete(key)
+
+async def keys_exist(keys: list) -> list:
+    """Returns for each key whether it is set."""
+    return [value is not None for value in await async_redis_client.mget(keys)]
+
+async def set_keys(keys: list, ttl: int):
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.set(key, "1", ex=ttl)
+        await pipe.execute()
+
+async def close_async_redis():
+    await async_redis_client.aclose()
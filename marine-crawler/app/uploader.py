@@ -0,0 +1,105 @@
+import asyncio
+import time
+import httpx
+from app.config import settings
+from app.metrics import observe_since, CHUNK_UPLOAD_SECONDS
+from loguru import logger
+
+http_client: httpx.AsyncClient = None
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled client used to talk to the analysis service.
+    Connections are kept alive and shared by every download task.
+    """
+    global http_client
+    if http_client is None:
+        http2 = settings.http2_enabled and _http2_available()
+        if settings.http2_enabled and not http2:
+            logger.warning("HTTP/2 requested but the 'h2' package is missing; falling back to HTTP/1.1")
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(settings.http_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_connections,
+            ),
+        )
+        logger.info(f"HTTP client started (http2={http2}, max_connections={settings.http_max_connections})")
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+        logger.info("HTTP client closed")
+
+async def upload_chunk(video_id: str, chunk_index: int, total_chunks: int, chunk_path: str, progressive: bool = False):
+    """
+    Uploads a single chunk, retrying with exponential backoff.
+    The file is streamed from disk rather than read into memory.
+    Returns the service's JSON reply (which carries the early-exit decision when
+    progressive is set), or None if the chunk could not be delivered.
+    """
+    client = get_http_client()
+    url = f"{settings.AI_MICROSERVICE_URL}/upload-video-chunk"
+    data = {"video_id": video_id, "chunk_index": chunk_index, "total_chunks": total_chunks}
+    if progressive:
+        data["progressive"] = "true"
+    attempts = settings.chunk_upload_retries + 1
+    for attempt in range(1, attempts + 1):
+        started = time.perf_counter()
+        try:
+            with open(chunk_path, "rb") as f:
+                files = {"video_chunk": (f"chunk_{chunk_index}.mp4", f, "video/mp4")}
+                resp = await client.post(url, data=data, files=files)
+            resp.raise_for_status()
+            observe_since(CHUNK_UPLOAD_SECONDS, started, "ok")
+            logger.info(f"Sent chunk {chunk_index} for video {video_id} (status: {resp.status_code})")
+            return resp.json()
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            observe_since(CHUNK_UPLOAD_SECONDS, started, "error")
+            if attempt == attempts:
+                logger.error(f"Giving up on chunk {chunk_index} for video {video_id} after {attempt} attempts: {e}")
+                return None
+            delay = settings.chunk_upload_backoff * (2 ** (attempt - 1))
+            logger.warning(
+                f"Chunk {chunk_index} for video {video_id} failed (attempt {attempt}/{attempts}): {e}; retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+    return None
+
+async def upload_chunks(video_id: str, chunk_files: list) -> bool:
+    """
+    Uploads all chunks of a video with bounded concurrency.
+    Each chunk is retried on its own; returns True only if every chunk arrived.
+    """
+    total_chunks = len(chunk_files)
+    semaphore = asyncio.Semaphore(settings.chunk_upload_concurrency)
+
+    async def _bounded(idx: int, chunk_file: str) -> bool:
+        async with semaphore:
+            return await upload_chunk(video_id, idx, total_chunks, chunk_file) is not None
+
+    results = await asyncio.gather(*(_bounded(idx, cf) for idx, cf in enumerate(chunk_files)))
+    failed = [idx for idx, ok in enumerate(results) if not ok]
+    if failed:
+        logger.error(f"{len(failed)} of {total_chunks} chunks failed for video {video_id}: {failed}")
+        return False
+    return True
+
+async def trigger_analysis(video_id: str, total_chunks: int):
+    client = get_http_client()
+    match_data = {"video_id": video_id, "total_chunks": total_chunks}
+    resp = await client.post(f"{settings.AI_MICROSERVICE_URL}/analyze", data=match_data)
+    logger.info(f"Triggered match processing for video {video_id} (status: {resp.status_code})")
+    logger.info(f"Match response: {resp.text}")
+    return resp
@@ -0,0 +1,151 @@
+"""
+Benchmarks the dork search backends against a local stub results page.
+
+    python benchmarks/search_backends.py --queries 200 --backends http playwright
+
+Starts a threaded HTTP server that answers every query with a DuckDuckGo-like
+HTML page, runs each backend through SearchExecutor with the rate limit
+lifted, and reports queries per minute, latency percentiles and peak RSS of
+the process tree (psutil when installed, otherwise getrusage).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import (  # noqa: E402
+    SearchExecutor,
+    TokenBucket,
+    HttpSearchBackend,
+    PlaywrightSearchBackend,
+)
+
+RESULTS_PER_PAGE = 20
+
+class StubResultsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        links = "".join(
+            f'<div class="result"><a class="result__a" '
+            f'href="//duckduckgo.com/l/?uddg=https%3A%2F%2Fexample{i}.com%2Fwatch%3Fq%3D{i}">r{i}</a></div>'
+            for i in range(RESULTS_PER_PAGE)
+        )
+        body = f"<html><body>{links}</body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubResultsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def tree_rss_bytes() -> int:
+    try:
+        import psutil
+    except ImportError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    proc = psutil.Process()
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def make_backend(name: str, template: str, concurrency: int):
+    if name == "http":
+        return HttpSearchBackend(url_template=template, max_connections=concurrency)
+    if name == "playwright":
+        return PlaywrightSearchBackend(pool_size=concurrency, url_template=template, headless=True)
+    raise ValueError(name)
+
+async def bench_backend(name: str, template: str, queries: list, concurrency: int) -> dict:
+    latencies = []
+    peak_rss = tree_rss_bytes()
+    stop = asyncio.Event()
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while not stop.is_set():
+            peak_rss = max(peak_rss, tree_rss_bytes())
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_rss())
+    start_up = time.perf_counter()
+    executor = SearchExecutor(
+        backend=make_backend(name, template, concurrency),
+        concurrency=concurrency,
+        rate_limiter=TokenBucket(rate=1e9, capacity=10**9),
+    )
+    async with executor:
+        startup_s = time.perf_counter() - start_up
+        original_search = executor.backend.search
+
+        async def timed_search(query):
+            t0 = time.perf_counter()
+            try:
+                return await original_search(query)
+            finally:
+                latencies.append(time.perf_counter() - t0)
+
+        executor.backend.search = timed_search
+        t0 = time.perf_counter()
+        results = await executor.run(queries)
+        elapsed = time.perf_counter() - t0
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    return {
+        "backend": name,
+        "queries": len(queries),
+        "startup_s": round(startup_s, 3),
+        "queries_per_minute": round(len(queries) / elapsed * 60, 1),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+        "urls_per_query": round(sum(len(u) for u in results.values()) / max(len(results), 1), 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark dork search backends against a local stub.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["http", "playwright"])
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    template = f"http://127.0.0.1:{server.server_address[1]}/html/?q={{query}}"
+    queries = [f'site:example{i}.com "stub query {i}"' for i in range(args.queries)]
+    report = []
+    try:
+        for name in args.backends:
+            # Each backend runs in isolation so peak RSS is attributable.
+            result = await bench_backend(name, template, queries, args.concurrency)
+            print(json.dumps(result))
+            report.append(result)
+    finally:
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import re
+
+import redis
+import redis.asyncio as aioredis
+from prometheus_client import Counter, Gauge
+
+import config
+
+# Called from the dorking coroutines, so the client is the asyncio one.
+redis_client = aioredis.Redis(
+    host=config.REDIS_HOST,
+    port=config.REDIS_PORT,
+    db=config.REDIS_DB,
+    decode_responses=True,
+    socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=config.REDIS_SOCKET_TIMEOUT,
+)
+
+QUERY_KEY_PREFIX = "dork:query:"
+URL_KEY_PREFIX = "dork:url:"
+
+QUERY_CACHE_LOOKUPS = Counter(
+    "discovery_query_cache_lookups_total", "Dork query cache lookups", ["result"]
+)
+QUERY_CACHE_HIT_RATIO = Gauge(
+    "discovery_query_cache_hit_ratio", "Share of dork query lookups served from the cache"
+)
+URLS_FORWARDED = Counter(
+    "discovery_urls_total", "Result URLs seen by the dorking pipeline", ["result"]
+)
+
+# A quoted phrase stays one token, including its operator prefix and a
+# leading - or + (intitle:"Foo Bar", -"foo bar").
+_TOKEN = re.compile(r'[-+]?(?:[\w.-]+:)?"[^"]*"|\S+')
+_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+# Binary operators change how the neighbouring terms group, so queries using
+# them are never reordered.
+_BINARY_OPERATORS = {"OR", "AND", "|"}
+
+def _is_operator(token: str) -> bool:
+    return token in _BINARY_OPERATORS or (len(token) > 1 and token[0] in "-+")
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key form of a dork. Operator tokens (OR, AND, |, -term, +term) keep
+    their case and position; plain terms are case-folded, with smart quotes
+    straightened and whitespace collapsed (quoted phrases, also after an
+    operator such as intitle:, stay one term). In a
+    query without binary operators, which is a plain conjunction, the plain
+    terms are also sorted, so "Movie site:x.com" and "site:X.com  movie"
+    share a cache entry. Lower-case "or" is an ordinary search term.
+    """
+    text = query.translate(_QUOTES).strip()
+    tokens = [" ".join(token.split()) for token in _TOKEN.findall(text)]
+    plain = [i for i, token in enumerate(tokens) if not _is_operator(token)]
+    for i in plain:
+        tokens[i] = tokens[i].casefold()
+    if not _BINARY_OPERATORS.intersection(tokens):
+        for i, token in zip(plain, sorted(tokens[i] for i in plain)):
+            tokens[i] = token
+    return " ".join(tokens)
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+_lookup_totals = {"hit": 0, "miss": 0}
+
+def _record_lookups(hits: int, misses: int):
+    QUERY_CACHE_LOOKUPS.labels("hit").inc(hits)
+    QUERY_CACHE_LOOKUPS.labels("miss").inc(misses)
+    _lookup_totals["hit"] += hits
+    _lookup_totals["miss"] += misses
+    total = _lookup_totals["hit"] + _lookup_totals["miss"]
+    if total:
+        QUERY_CACHE_HIT_RATIO.set(_lookup_totals["hit"] / total)
+
+async def get_cached_results(queries: list) -> dict:
+    """
+    Returns {query: urls} for the queries whose normalized form is cached.
+    """
+    if not queries:
+        return {}
+    try:
+        values = await redis_client.mget([QUERY_KEY_PREFIX + _digest(normalize_query(q)) for q in queries])
+    except redis.RedisError as e:
+        print(f"[Cache] Query cache unavailable: {e}")
+        values = [None] * len(queries)
+    cached = {q: json.loads(v) for q, v in zip(queries, values) if v is not None}
+    _record_lookups(len(cached), len(queries) - len(cached))
+    return cached
+
+async def cache_results(query: str, urls: list):
+    try:
+        await redis_client.set(
+            QUERY_KEY_PREFIX + _digest(normalize_query(query)),
+            json.dumps(urls),
+            ex=config.QUERY_CACHE_TTL,
+        )
+    except redis.RedisError as e:
+        print(f"[Cache] Failed to cache results for '{query}': {e}")
+
+async def filter_new_urls(urls: list) -> list:
+    """
+    Marks URLs as seen and returns only those not seen within URL_SEEN_TTL.
+    The claim is released again (release_urls) if the URLs cannot be
+    delivered to the crawler.
+    """
+    if not urls:
+        return []
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for url in urls:
+            pipe.set(URL_KEY_PREFIX + _digest(url), "1", nx=True, ex=config.URL_SEEN_TTL)
+        created = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Cache] URL seen-set unavailable: {e}")
+        created = [True] * len(urls)
+    new_urls = [url for url, is_new in zip(urls, created) if is_new]
+    URLS_FORWARDED.labels("new").inc(len(new_urls))
+    URLS_FORWARDED.labels("duplicate").inc(len(urls) - len(new_urls))
+    return new_urls
+
+async def mark_seen(urls: list):
+    """
+    Marks URLs as forwarded for URL_SEEN_TTL (used when a released URL is
+    finally delivered).
+    """
+    if not urls:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for url in urls:
+            pipe.set(URL_KEY_PREFIX + _digest(url), "1", ex=config.URL_SEEN_TTL)
+        await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Cache] Failed to mark {len(urls)} URLs as seen: {e}")
+
+async def release_urls(urls: list):
+    """
+    Forgets URLs claimed by filter_new_urls whose delivery to the crawler
+    failed, so they are not suppressed for URL_SEEN_TTL.
+    """
+    if not urls:
+        return
+    try:
+        await redis_client.delete(*[URL_KEY_PREFIX + _digest(url) for url in urls])
+    except redis.RedisError as e:
+        print(f"[Cache] Failed to release {len(urls)} URLs: {e}")
+
+async def close_redis():
+    await redis_client.aclose()
@@ -8,11 +8,14 @@ load_dotenv()
 KAFKA_BROKER = os.getenv("KAFKA_BROKER", "localhost:9092")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "piracy_links")
 KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "piracy_detector")
+KAFKA_CRAWL_TOPIC = os.getenv("KAFKA_CRAWL_TOPIC", "crawl-tasks")
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", 50))
 
 # Redis Configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2.0))
 
 # Playwright Configuration
 HEADLESS = os.getenv("HEADLESS", "True").lower() == "true"
@@ -23,3 +26,33 @@ USER_AGENT = os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
 # FastAPI Settings
 API_HOST = os.getenv("API_HOST", "127.0.0.1")
 API_PORT = int(os.getenv("API_PORT", 8000))
+
+# Dork search executor
+# SEARCH_BACKEND: "http" (HTML endpoint over httpx), "playwright" (headless
+# Chromium) or "auto" (http, switching to playwright once blocked).
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+SEARCH_URL_TEMPLATE = os.getenv("SEARCH_URL_TEMPLATE", "https://duckduckgo.com/?q={query}&ia=web")
+SEARCH_HTML_URL_TEMPLATE = os.getenv("SEARCH_HTML_URL_TEMPLATE", "https://html.duckduckgo.com/html/?q={query}")
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 4))
+SEARCH_RATE_PER_SEC = float(os.getenv("SEARCH_RATE_PER_SEC", 0.5))
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", 2))
+
+# Keyframe analysis for /discover
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+DORK_MODEL_CONCURRENCY = int(os.getenv("DORK_MODEL_CONCURRENCY", 4))
+DORK_FRAMES_PER_CALL = int(os.getenv("DORK_FRAMES_PER_CALL", 4))
+DORK_DEDUP_DISTANCE = int(os.getenv("DORK_DEDUP_DISTANCE", 6))
+
+# Dork query result cache and URL seen-set (seconds)
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", 7 * 24 * 3600))
+URL_SEEN_TTL = int(os.getenv("URL_SEEN_TTL", 30 * 24 * 3600))
+
+# Hand-off of discovered URLs to the crawler: "kafka" produces to
+# KAFKA_CRAWL_TOPIC, "http" posts to the crawler's /submit-batch.
+CRAWLER_HANDOFF = os.getenv("CRAWLER_HANDOFF", "kafka")
+CRAWLER_URL = os.getenv("CRAWLER_URL", "http://localhost:8001")
+SUBMIT_BATCH_SIZE = int(os.getenv("SUBMIT_BATCH_SIZE", 50))
+SUBMIT_MAX_WAIT = float(os.getenv("SUBMIT_MAX_WAIT", 2.0))
+SUBMIT_RETRIES = int(os.getenv("SUBMIT_RETRIES", 3))
+# Pause before a batch that failed all retries is queued again.
+SUBMIT_REQUEUE_DELAY = float(os.getenv("SUBMIT_REQUEUE_DELAY", 30.0))
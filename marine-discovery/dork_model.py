@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+PROMPT = """
+You are an advanced image analysis engine. Your task is to analyze the provided images (keyframes extracted from one video)
+and deduce the context, theme, and visual cues that could be used to locate related content on the web.
+Based on your analysis, generate Google dork queries using specific keywords and search operators (such as site:, intext:, intitle:, etc.).
+If it's a popular video, you can also use the title of the video to generate dork queries.
+
+Instructions:
+1. Analyze the images and extract key visual and contextual elements.
+2. Construct one or more detailed Google dork query strings that incorporate these elements.
+3. Return only a JSON array containing the Google dork query strings. Each element of the array must be a string.
+4. Do not include any additional text, commentary, or extra fields.
+
+Additional Context: {description}
+
+Return only the JSON array.
+"""
+
+def clean_output(raw_text: str) -> str:
+    """
+    Cleans the output text by removing markdown code block formatting if present.
+    """
+    raw_text = raw_text.strip()
+    if raw_text.startswith("```"):
+        lines = raw_text.splitlines()
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].strip().endswith("```"):
+            lines = lines[:-1]
+        raw_text = "\n".join(lines).strip()
+    return raw_text
+
+def parse_dork_array(raw_text: str) -> list:
+    cleaned_text = clean_output(raw_text)
+    try:
+        output_array = json.loads(cleaned_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse JSON from model output: {cleaned_text}") from e
+
+    if not isinstance(output_array, list):
+        raise ValueError("The model output is not a JSON array as expected.")
+
+    return output_array
+
+class DorkModel(ABC):
+    """
+    Turns a batch of keyframes into dork queries. Calls are blocking and are
+    run on a thread pool by analyze_keyframes; swap in a fake by overriding
+    the get_dork_model dependency.
+    """
+    @abstractmethod
+    def generate_dorks(self, image_paths: list, description: str) -> list:
+        ...
+
+class GeminiDorkModel(DorkModel):
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or config.GEMINI_MODEL
+
+    def generate_dorks(self, image_paths: list, description: str) -> list:
+        import google.generativeai as genai
+
+        for image_path in image_paths:
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(f"Image not found: {image_path}")
+
+        # All frames of the batch go into a single model call.
+        uploaded = [genai.upload_file(image_path) for image_path in image_paths]
+        model = genai.GenerativeModel(self.model_name)
+        result = model.generate_content([*uploaded, "\n\n", PROMPT.format(description=description)])
+        return parse_dork_array(result.text)
+
+def dedup_frames(frame_paths: list, max_distance: int = None) -> list:
+    """
+    Drops frames whose pHash is within max_distance bits of a frame already
+    kept, so near-identical shots are only sent to the model once.
+    """
+    from PIL import Image
+    import imagehash
+
+    max_distance = config.DORK_DEDUP_DISTANCE if max_distance is None else max_distance
+    kept, kept_hashes = [], []
+    for path in frame_paths:
+        try:
+            with Image.open(path) as img:
+                frame_hash = imagehash.phash(img)
+        except Exception as e:
+            print(f"[Discover] Could not hash frame {path}: {e}")
+            kept.append(path)
+            continue
+        if all(frame_hash - other > max_distance for other in kept_hashes):
+            kept.append(path)
+            kept_hashes.append(frame_hash)
+    return kept
+
+_model_pool = ThreadPoolExecutor(max_workers=config.DORK_MODEL_CONCURRENCY, thread_name_prefix="dork-model")
+
+async def analyze_keyframes(
+    frame_paths: list,
+    description: str,
+    model: DorkModel,
+    batch_size: int = None,
+    concurrency: int = None,
+) -> list:
+    """
+    Deduplicates the frames by pHash, groups the survivors into batches of
+    batch_size and runs at most `concurrency` model calls at a time on the
+    model thread pool. Returns the unique queries in first-seen order; a
+    failing batch is skipped unless every batch fails.
+    """
+    batch_size = batch_size or config.DORK_FRAMES_PER_CALL
+    semaphore = asyncio.Semaphore(concurrency or config.DORK_MODEL_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+
+    unique_frames = await loop.run_in_executor(_model_pool, dedup_frames, frame_paths)
+    print(f"[Discover] {len(unique_frames)} of {len(frame_paths)} keyframes left after pHash dedup.")
+    batches = [unique_frames[i:i + batch_size] for i in range(0, len(unique_frames), batch_size)]
+
+    async def run_batch(batch: list) -> list:
+        async with semaphore:
+            return await loop.run_in_executor(_model_pool, model.generate_dorks, batch, description)
+
+    results = await asyncio.gather(*(run_batch(batch) for batch in batches), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if batches and len(errors) == len(batches):
+        raise errors[0]
+    for error in errors:
+        print(f"[Discover] Keyframe batch failed: {error}")
+
+    queries = []
+    for result in results:
+        if not isinstance(result, Exception):
+            queries.extend(result)
+    return list(dict.fromkeys(queries))
+
+_default_model: DorkModel = None
+
+def get_dork_model() -> DorkModel:
+    global _default_model
+    if _default_model is None:
+        _default_model = GeminiDorkModel()
+    return _default_model
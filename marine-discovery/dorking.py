@@ -1,25 +1,9 @@
 import asyncio
-import random
 import argparse
 import os
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
 import httpx
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-}
-
-def extract_urls_from_results(html: str) -> list:
-    """Extracts URLs from DuckDuckGo search results."""
-    soup = BeautifulSoup(html, "html.parser")
-    urls = []
-    
-    for link in soup.select("a"):
-        href = link.get("href", "")
-        if href.startswith("https://") and "duckduckgo" not in href:
-            urls.append(href)
-    return urls
+from search import SearchExecutor
 
 async def search_duckduckgo_dorks(queries: list) -> dict:
     """
@@ -28,25 +12,8 @@ async def search_duckduckgo_dorks(queries: list) -> dict:
     :param queries: A list of dork query strings.
     :return: A dictionary mapping each query to a list of result URLs.
     """
-    results = {}
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(user_agent=HEADERS["User-Agent"])
-        page = await context.new_page()
-
-        for query in queries:
-            print(f"Searching DuckDuckGo for: {query}")
-            search_url = f"https://duckduckgo.com/?q={query}&ia=web"
-            await page.goto(search_url, timeout=60000)
-            await page.wait_for_selector("a", timeout=5000)
-            html = await page.content()
-            urls = extract_urls_from_results(html)
-            results[query] = urls
-
-            await asyncio.sleep(random.uniform(5, 10))  # Delay to avoid triggering bot detection
-        
-        await browser.close()
-    return results
+    async with SearchExecutor() as executor:
+        return await executor.run(queries)
 
 async def submit_url(url: str):
     """Submits a URL to the server's /submit endpoint."""
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+
+from aiokafka import AIOKafkaProducer
+
+import config
+
+producer: AIOKafkaProducer = None
+
+async def get_kafka_producer() -> AIOKafkaProducer:
+    global producer
+    if producer is None:
+        candidate = AIOKafkaProducer(
+            bootstrap_servers=config.KAFKA_BROKER,
+            client_id="discovery_url_producer",
+            compression_type="gzip",
+            linger_ms=config.KAFKA_LINGER_MS,
+            acks="all",
+        )
+        # Only keep a producer that started, so a failed start is retried.
+        await candidate.start()
+        producer = candidate
+        print("[Kafka] Producer started")
+    return producer
+
+async def close_kafka_producer():
+    global producer
+    if producer is not None:
+        await producer.stop()
+        producer = None
+        print("[Kafka] Producer stopped")
+
+async def produce_urls(urls: list) -> bool:
+    """
+    Produces one crawl task per URL to KAFKA_CRAWL_TOPIC. Records are keyed by
+    URL so they spread over partitions, batched by the producer (linger_ms),
+    and the call returns once the whole batch is acknowledged. A failed batch
+    is sent again with backoff (SUBMIT_RETRIES times); records acknowledged
+    before the failure may then be delivered twice. The crawler's consumer
+    skips crawl tasks for pages it crawled within CRAWL_TASK_DEDUP_TTL_SECONDS,
+    so such a page is not fetched again. Returns False when every attempt
+    failed.
+    """
+    discovered_at = time.time()
+    for attempt in range(1, config.SUBMIT_RETRIES + 2):
+        try:
+            kafka = await get_kafka_producer()
+            pending = [
+                await kafka.send(
+                    config.KAFKA_CRAWL_TOPIC,
+                    key=url.encode("utf-8"),
+                    value=json.dumps({"url": url, "source": "discovery", "discovered_at": discovered_at}).encode("utf-8"),
+                )
+                for url in urls
+            ]
+            for delivery in pending:
+                await delivery
+            print(f"[Kafka] Produced {len(urls)} URLs to {config.KAFKA_CRAWL_TOPIC}")
+            return True
+        except Exception as e:
+            print(f"[Kafka] Failed to produce {len(urls)} URLs (attempt {attempt}): {str(e)}")
+        if attempt <= config.SUBMIT_RETRIES:
+            await asyncio.sleep(2 ** (attempt - 1))
+    print(f"[Kafka] Giving up on {len(urls)} URLs after {config.SUBMIT_RETRIES + 1} attempts")
+    return False
@@ -1,23 +1,34 @@
 import os
+import shutil
 import subprocess
-import json
 import tempfile
 import threading
 import time
 import argparse
-import sys
-import random
 import asyncio
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from pydantic import BaseModel
 import uvicorn
 
 import google.generativeai as genai
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
 import httpx
 
+import config
+from search import SearchExecutor
+from dork_model import DorkModel, analyze_keyframes, get_dork_model
+from kafka_handoff import produce_urls, close_kafka_producer
+from cache import (
+    normalize_query,
+    get_cached_results,
+    cache_results,
+    filter_new_urls,
+    mark_seen,
+    release_urls,
+    close_redis,
+)
+
 os.environ["GRPC_VERBOSITY"] = "ERROR"
 os.environ["GRPC_TRACE"] = ""
 
@@ -52,61 +63,6 @@ def extract_keyframes(video_path: str, output_dir: str, frame_interval: int = 30
             keyframe_paths.append(os.path.join(output_dir, file))
     return keyframe_paths
 
-def clean_output(raw_text: str) -> str:
-    """
-    Cleans the output text by removing markdown code block formatting if present.
-    """
-    raw_text = raw_text.strip()
-    if raw_text.startswith("```"):
-        lines = raw_text.splitlines()
-        if lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].strip().endswith("```"):
-            lines = lines[:-1]
-        raw_text = "\n".join(lines).strip()
-    return raw_text
-
-def analyze_image_for_dork(image_path: str, description: str) -> list:
-    """
-    Uploads the image (a keyframe) to the Gemini API and returns a JSON array of Google dork queries.
-    """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image not found: {image_path}")
-    
-    # Upload the image file to the Gemini API
-    myfile = genai.upload_file(image_path)
-    
-    prompt = f"""
-You are an advanced image analysis engine. Your task is to analyze the provided image (a keyframe extracted from a video)
-and deduce the context, theme, and visual cues that could be used to locate related content on the web.
-Based on your analysis, generate Google dork queries using specific keywords and search operators (such as site:, intext:, intitle:, etc.).
-If it's a popular video, you can also use the title of the video to generate dork queries.
-
-Instructions:
-1. Analyze the image and extract key visual and contextual elements.
-2. Construct one or more detailed Google dork query strings that incorporate these elements.
-3. Return only a JSON array containing the Google dork query strings. Each element of the array must be a string.
-4. Do not include any additional text, commentary, or extra fields.
-
-Additional Context: {description}
-
-Return only the JSON array.
-"""
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    result = model.generate_content([myfile, "\n\n", prompt])
-    
-    # Remove any markdown formatting
-    cleaned_text = clean_output(result.text)
-    try:
-        output_array = json.loads(cleaned_text)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON from model output: {cleaned_text}") from e
-
-    if not isinstance(output_array, list):
-        raise ValueError("The model output is not a JSON array as expected.")
-
-    return output_array
-
 url_list = []
 
 class URLRequest(BaseModel):
@@ -122,37 +78,40 @@ async def submit_url(request: URLRequest):
     print(f"[Submit] URL {request.url} submitted.")
     return {"message": f"URL {request.url} submitted for crawling."}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics, including the dork query cache hit ratio.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/discover")
 async def discover(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     name: str = Form(""),
-    description: str = Form("")
+    description: str = Form(""),
+    model: DorkModel = Depends(get_dork_model)
 ):
     """
     /discover endpoint:
       - Accepts a video file along with optional name and description.
       - Extracts keyframes from the video.
-      - Sends each keyframe to the Gemini API to obtain Google dork queries.
+      - Drops near-identical keyframes and sends the rest, batched and concurrently, to the model.
       - Returns a JSON array of unique dork queries.
       - Immediately schedules background processing of these queries.
     """
     try:
         with tempfile.TemporaryDirectory() as tmpdir:
             video_path = os.path.join(tmpdir, file.filename)
-            contents = await file.read()
             with open(video_path, "wb") as f:
-                f.write(contents)
+                shutil.copyfileobj(file.file, f)
             keyframes_output_dir = os.path.join(tmpdir, "keyframes")
             
-            keyframe_paths = extract_keyframes(video_path, keyframes_output_dir, frame_interval=30)
-            all_dork_queries = []
-            
-            for keyframe in keyframe_paths:
-                queries = analyze_image_for_dork(keyframe, description)
-                all_dork_queries.extend(queries)
-            
-            unique_dork_queries = list(set(all_dork_queries))
+            keyframe_paths = await asyncio.to_thread(
+                extract_keyframes, video_path, keyframes_output_dir, frame_interval=30
+            )
+            unique_dork_queries = await analyze_keyframes(keyframe_paths, description, model)
             
             background_tasks.add_task(run_dorking_from_queries, unique_dork_queries)
             
@@ -161,61 +120,43 @@ async def discover(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-}
-
-def extract_urls_from_results(html: str) -> list:
+async def search_duckduckgo_dorks(queries: list, on_result=None) -> dict:
     """
-    Extracts URLs from DuckDuckGo search results using BeautifulSoup.
+    For each Google dork query, search DuckDuckGo and return a dictionary mapping the query to a list of result URLs.
+    Queries run concurrently on the configured search backend behind a global rate limit;
+    `on_result(query, urls)` is awaited as soon as each query finishes.
     """
-    soup = BeautifulSoup(html, "html.parser")
-    urls = []
-    for link in soup.select("a"):
-        href = link.get("href", "")
-        if href.startswith("https://") and "duckduckgo" not in href:
-            urls.append(href)
-    return urls
-
-async def search_duckduckgo_dorks(queries: list) -> dict:
+    async with SearchExecutor() as executor:
+        return await executor.run(queries, on_result=on_result)
+
+crawler_client: httpx.AsyncClient = None
+
+def get_crawler_client() -> httpx.AsyncClient:
     """
-    For each Google dork query, search DuckDuckGo and return a dictionary mapping the query to a list of result URLs.
+    Pooled keep-alive client shared by every submission to the crawler.
     """
-    results = {}
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(user_agent=HEADERS["User-Agent"])
-        page = await context.new_page()
-        for query in queries:
-            print(f"[Dorking] Searching DuckDuckGo for: {query}")
-            search_url = f"https://duckduckgo.com/?q={query}&ia=web"
-            try:
-                await page.goto(search_url, timeout=60000)
-                await page.wait_for_selector("a", timeout=5000)
-                html = await page.content()
-                urls = extract_urls_from_results(html)
-                results[query] = urls
-            except Exception as e:
-                print(f"[Dorking] Error processing query '{query}': {str(e)}")
-                results[query] = []
-            # Random delay to avoid bot detection
-            await asyncio.sleep(random.uniform(5, 10))
-        await browser.close()
-    return results
-
-async def submit_url_to_server(url: str):
+    global crawler_client
+    if crawler_client is None:
+        crawler_client = httpx.AsyncClient(base_url=config.CRAWLER_URL, timeout=httpx.Timeout(30.0))
+    return crawler_client
+
+async def submit_batch_to_server(urls: list) -> bool:
     """
-    Submits a single URL to the /submit endpoint.
+    Submits a batch of URLs to the crawler's /submit-batch endpoint, retrying with backoff.
     """
-    async with httpx.AsyncClient() as client:
+    for attempt in range(1, config.SUBMIT_RETRIES + 2):
         try:
-            response = await client.post("http://localhost:8001/submit", json={"url": url})
+            response = await get_crawler_client().post("/submit-batch", json={"urls": urls})
             if response.status_code == 200:
-                print(f"[Dorking] Submitted URL: {url}")
-            else:
-                print(f"[Dorking] Failed to submit URL: {url}. Status: {response.status_code}")
+                print(f"[Batch Submit] Submitted {len(urls)} URLs")
+                return True
+            print(f"[Batch Submit] Failed to submit {len(urls)} URLs. Status: {response.status_code}")
         except Exception as e:
-            print(f"[Dorking] Error submitting URL: {url}. Error: {str(e)}")
+            print(f"[Batch Submit] Error submitting {len(urls)} URLs: {str(e)}")
+        if attempt <= config.SUBMIT_RETRIES:
+            await asyncio.sleep(2 ** (attempt - 1))
+    print(f"[Batch Submit] Giving up on {len(urls)} URLs after {config.SUBMIT_RETRIES + 1} attempts")
+    return False
 
 async def run_dorking_from_queries(queries: list):
     """
@@ -226,68 +167,95 @@ async def run_dorking_from_queries(queries: list):
         print("[Dorking] No queries received. Exiting dorking pipeline.")
         return
 
-    print(f"[Dorking] Running dorking pipeline with {len(queries)} queries.")
-    search_results = await search_duckduckgo_dorks(queries)
-    
-    for query, urls in search_results.items():
-        print(f"\n[Dorking] Results for query: {query}")
-        if urls:
-            for url in urls:
+    # Collapse queries that only differ in case, spacing or term order.
+    unique_queries = list({normalize_query(q): q for q in queries}.values())
+    cached = await get_cached_results(unique_queries)
+    to_search = [q for q in unique_queries if q not in cached]
+    print(
+        f"[Dorking] Running dorking pipeline with {len(queries)} queries "
+        f"({len(unique_queries)} unique, {len(cached)} cached, {len(to_search)} to search)."
+    )
+
+    async def forward_results(query: str, urls: list):
+        # Only URLs never forwarded before go on to the crawler.
+        new_urls = await filter_new_urls(urls)
+        print(f"\n[Dorking] Results for query: {query} ({len(new_urls)} new of {len(urls)})")
+        if new_urls:
+            for url in new_urls:
                 print(f" - {url}")
                 await url_queue.put(url)
         else:
-            print("⚠ No results found for this query.")
+            print("⚠ No new results found for this query.")
         print("-" * 50)
 
-async def batch_submit_worker():
+    async def cache_and_forward(query: str, urls: list):
+        if urls:
+            await cache_results(query, urls)
+        await forward_results(query, urls)
+
+    for query, urls in cached.items():
+        await forward_results(query, urls)
+    if to_search:
+        await search_duckduckgo_dorks(to_search, on_result=cache_and_forward)
+
+async def collect_batch(queue: asyncio.Queue, max_size: int, max_wait: float) -> list:
     """
-    Periodically checks the URL queue and submits URLs in batches.
-    Submits every 10 URLs or flushes remaining URLs if they've been waiting for over 30 seconds.
+    Waits for the first item, then keeps collecting until the batch holds
+    max_size items or max_wait seconds have passed since the first one.
     """
-    last_flush_time = time.time()
-    while True:
-        await asyncio.sleep(5)  # Check every 5 seconds
-        if url_queue.qsize() >= 10:
-            batch = []
-            for _ in range(10):
-                batch.append(url_queue.get_nowait())
-            last_flush_time = time.time()
-            print(f"[Batch Submit] Submitting batch of 10 URLs")
-            tasks = [submit_url_to_server(url) for url in batch]
-            await asyncio.gather(*tasks)
-        elif not url_queue.empty() and (time.time() - last_flush_time) >= 30:
-            batch = []
-            while not url_queue.empty():
-                batch.append(url_queue.get_nowait())
-            last_flush_time = time.time()
-            print(f"[Batch Submit] Submitting batch of {len(batch)} URLs (flushed after waiting)")
-            tasks = [submit_url_to_server(url) for url in batch]
-            await asyncio.gather(*tasks)
-
-async def periodic_start_crawling():
+    batch = [await queue.get()]
+    deadline = asyncio.get_running_loop().time() + max_wait
+    while len(batch) < max_size:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def batch_submit_worker():
     """
-    Periodically triggers the start_crawling endpoint every 5 minutes.
+    Forwards URLs from the queue to the crawler as they arrive, flushing a batch
+    when it reaches SUBMIT_BATCH_SIZE URLs or SUBMIT_MAX_WAIT seconds after its first URL.
+    Batches go to Kafka or to the crawler's HTTP API depending on CRAWLER_HANDOFF.
+
+    A batch that still fails after the submitter's retries has its seen-set
+    claims released (so a restart or a later discovery can forward the URLs
+    again) and is queued again after SUBMIT_REQUEUE_DELAY seconds; such URLs
+    are marked as seen once they are delivered.
     """
+    submit = produce_urls if config.CRAWLER_HANDOFF == "kafka" else submit_batch_to_server
+    released = set()
     while True:
-        try:
-            async with httpx.AsyncClient() as client:
-                print("[Cron] Hitting start_crawling endpoint")
-                response = await client.get("http://localhost:8001/start_crawling")
-                if response.status_code == 200:
-                    print("[Cron] start_crawling triggered successfully")
-                else:
-                    print(f"[Cron] Failed to trigger start_crawling. Status: {response.status_code}")
-        except Exception as e:
-            print(f"[Cron] Error triggering start_crawling: {str(e)}")
-        await asyncio.sleep(300)  # Wait for 5 minutes
+        batch = await collect_batch(url_queue, config.SUBMIT_BATCH_SIZE, config.SUBMIT_MAX_WAIT)
+        if await submit(batch):
+            redelivered = [url for url in batch if url in released]
+            if redelivered:
+                await mark_seen(redelivered)
+                released.difference_update(redelivered)
+            continue
+        await release_urls(batch)
+        released.update(batch)
+        print(f"[Batch Submit] Re-queueing {len(batch)} URLs in {config.SUBMIT_REQUEUE_DELAY:.0f}s")
+        await asyncio.sleep(config.SUBMIT_REQUEUE_DELAY)
+        for url in batch:
+            url_queue.put_nowait(url)
 
 @app.on_event("startup")
 async def startup_event():
     """
-    Launch background tasks for batch URL submission and periodic start_crawling.
+    Launch the background task that forwards discovered URLs to the crawler.
     """
     asyncio.create_task(batch_submit_worker())
-    asyncio.create_task(periodic_start_crawling())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if crawler_client is not None:
+        await crawler_client.aclose()
+    await close_kafka_producer()
+    await close_redis()
 
 def run_server():
     """
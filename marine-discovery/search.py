@@ -0,0 +1,268 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import quote_plus, urlparse, parse_qs
+
+from bs4 import BeautifulSoup
+import httpx
+
+import config
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+}
+
+def _unwrap_redirect(href: str) -> str:
+    # The HTML endpoint links results through //duckduckgo.com/l/?uddg=<target>.
+    if "duckduckgo.com/l/" in href:
+        target = parse_qs(urlparse(href).query).get("uddg")
+        if target:
+            return target[0]
+    return href
+
+def extract_urls_from_results(html: str) -> list:
+    """
+    Extracts URLs from DuckDuckGo search results using BeautifulSoup.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    urls = []
+    for link in soup.select("a"):
+        href = _unwrap_redirect(link.get("href", ""))
+        if href.startswith("https://") and "duckduckgo" not in href:
+            urls.append(href)
+    return urls
+
+def build_search_url(query: str, template: str) -> str:
+    return template.format(query=quote_plus(query))
+
+class SearchBlocked(Exception):
+    """Raised by a backend when the search engine refuses to serve results."""
+
+class TokenBucket:
+    """
+    Global rate limiter shared by every search worker: `rate` tokens per second
+    with bursts of up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+class SearchBackend(ABC):
+    """
+    Fetches result URLs for a single query. Backends are async context
+    managers so they can hold pooled resources (HTTP connections, browsers).
+    """
+    name = "base"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def search(self, query: str) -> list:
+        ...
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+class HttpSearchBackend(SearchBackend):
+    """
+    Fetches the plain HTML results endpoint over a pooled keep-alive httpx
+    client; no browser involved.
+    """
+    name = "http"
+
+    def __init__(self, url_template: str = None, max_connections: int = None):
+        self.url_template = url_template or config.SEARCH_HTML_URL_TEMPLATE
+        self.max_connections = max_connections or config.SEARCH_CONCURRENCY
+        self.client: httpx.AsyncClient = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+
+    async def search(self, query: str) -> list:
+        response = await self.client.get(build_search_url(query, self.url_template))
+        # DuckDuckGo answers bot checks with 202/403/429 and a challenge page.
+        if response.status_code in (202, 403, 429):
+            raise SearchBlocked(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        if "anomaly-modal" in response.text or "challenge-form" in response.text:
+            raise SearchBlocked("challenge page")
+        return extract_urls_from_results(response.text)
+
+class PlaywrightSearchBackend(SearchBackend):
+    """
+    Renders the results page in headless Chromium, using a pool of pages
+    (one browser context each).
+    """
+    name = "playwright"
+
+    def __init__(self, pool_size: int = None, url_template: str = None, headless: bool = None):
+        self.pool_size = pool_size or config.SEARCH_CONCURRENCY
+        self.url_template = url_template or config.SEARCH_URL_TEMPLATE
+        self.headless = config.HEADLESS if headless is None else headless
+        self._playwright = None
+        self._browser = None
+        self._pages: asyncio.Queue = None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._pages = asyncio.Queue()
+        for _ in range(self.pool_size):
+            context = await self._browser.new_context(user_agent=HEADERS["User-Agent"])
+            self._pages.put_nowait(await context.new_page())
+
+    async def close(self):
+        if self._browser:
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    async def search(self, query: str) -> list:
+        page = await self._pages.get()
+        try:
+            await page.goto(build_search_url(query, self.url_template), timeout=60000)
+            await page.wait_for_selector("a", timeout=5000)
+            return extract_urls_from_results(await page.content())
+        finally:
+            self._pages.put_nowait(page)
+
+class FallbackSearchBackend(SearchBackend):
+    """
+    Uses the primary backend and only starts the fallback (typically the
+    browser) the first time the primary is blocked; from then on every
+    query goes to the fallback.
+    """
+    name = "auto"
+
+    def __init__(self, primary: SearchBackend, fallback_factory):
+        self.primary = primary
+        self.fallback_factory = fallback_factory
+        self.fallback: SearchBackend = None
+        self._fallback_lock = asyncio.Lock()
+
+    async def start(self):
+        await self.primary.start()
+
+    async def close(self):
+        await self.primary.close()
+        if self.fallback:
+            await self.fallback.close()
+
+    async def _get_fallback(self) -> SearchBackend:
+        async with self._fallback_lock:
+            if self.fallback is None:
+                print(f"[Dorking] {self.primary.name} backend blocked; starting fallback backend")
+                fallback = self.fallback_factory()
+                await fallback.start()
+                self.fallback = fallback
+        return self.fallback
+
+    async def search(self, query: str) -> list:
+        if self.fallback is None:
+            try:
+                return await self.primary.search(query)
+            except SearchBlocked as e:
+                print(f"[Dorking] Query '{query}' blocked on {self.primary.name} backend: {e}")
+        return await (await self._get_fallback()).search(query)
+
+def create_search_backend(name: str = None) -> SearchBackend:
+    name = name or config.SEARCH_BACKEND
+    if name == "http":
+        return HttpSearchBackend()
+    if name == "playwright":
+        return PlaywrightSearchBackend()
+    if name == "auto":
+        return FallbackSearchBackend(HttpSearchBackend(), PlaywrightSearchBackend)
+    raise ValueError(f"Unknown search backend '{name}'")
+
+class SearchExecutor:
+    """
+    Runs dork queries concurrently against a search backend behind a shared
+    token bucket, reporting each query's URLs as soon as they are available.
+
+        async with SearchExecutor() as executor:
+            results = await executor.run(queries, on_result=callback)
+    """
+    def __init__(self, backend: SearchBackend = None, concurrency: int = None, rate_limiter: TokenBucket = None):
+        self.backend = backend or create_search_backend()
+        self.concurrency = concurrency or config.SEARCH_CONCURRENCY
+        self.rate_limiter = rate_limiter or TokenBucket(config.SEARCH_RATE_PER_SEC, config.SEARCH_BURST)
+
+    async def __aenter__(self):
+        await self.backend.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.backend.close()
+
+    async def search(self, query: str) -> list:
+        await self.rate_limiter.acquire()
+        return await self.backend.search(query)
+
+    async def run(self, queries: list, on_result=None) -> dict:
+        """
+        Searches all queries (at most `concurrency` in flight) and returns a
+        dict mapping each query to its result URLs. If given,
+        `await on_result(query, urls)` is called as each query completes.
+        """
+        results = {}
+        pending: asyncio.Queue = asyncio.Queue()
+        for query in queries:
+            pending.put_nowait(query)
+
+        async def worker():
+            while True:
+                try:
+                    query = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                print(f"[Dorking] Searching for: {query}")
+                try:
+                    urls = await self.search(query)
+                except Exception as e:
+                    print(f"[Dorking] Error processing query '{query}': {str(e)}")
+                    urls = []
+                results[query] = urls
+                if on_result is not None:
+                    await on_result(query, urls)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(queries)))))
+        return results
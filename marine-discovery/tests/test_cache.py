@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import normalize_query  # noqa: E402
+
+def test_operator_phrase_stays_one_term():
+    assert normalize_query('intitle:"Foo Bar" movie') == 'intitle:"foo bar" movie'
+    assert normalize_query('movie  intitle:"Foo   Bar"') == 'intitle:"foo bar" movie'
+    assert normalize_query('intitle:"Foo Bar" movie') != normalize_query('intitle:"Foo" Bar movie')
+
+def test_excluded_phrase_keeps_its_operator():
+    assert normalize_query('movie -"Foo Bar"') == 'movie -"Foo Bar"'
+
+def test_plain_conjunction_is_order_and_case_insensitive():
+    assert normalize_query("Movie site:x.com") == normalize_query("site:X.com  movie")
+
+def test_binary_operators_keep_term_order():
+    assert normalize_query("a OR b -c") != normalize_query("a b or -c")
+    assert normalize_query("b OR a") != normalize_query("a OR b")